@@ -1,4 +1,5 @@
-from fastapi import HTTPException, Depends, status
+import os
+from fastapi import HTTPException, Depends, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from firebase_admin import auth
 import app.services.firebase # Ensures Firebase app is initialized
@@ -6,10 +7,15 @@ import app.services.firebase # Ensures Firebase app is initialized
 # This defines the security scheme (Bearer Token)
 security = HTTPBearer()
 
-async def verify_firebase_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
+# Firebase uids allowed into the /admin routes (comma-separated). Every patient
+# has a valid token, so the token alone isn't enough. Unset means nobody.
+STAFF_UIDS = {uid.strip() for uid in os.getenv("STAFF_UIDS", "").split(",") if uid.strip()}
+
+async def verify_firebase_token(request: Request, credentials: HTTPAuthorizationCredentials = Depends(security)):
     """
     Verifies the Firebase ID Token sent in the Authorization header.
     Returns the decoded token (user info) if valid, otherwise raises 401.
+    The uid is also stored on request.state for admission control.
     """
     token = credentials.credentials
     
@@ -20,6 +26,7 @@ async def verify_firebase_token(credentials: HTTPAuthorizationCredentials = Depe
         
         # 2. (Optional) You can return the full user object or just the uid
         # return decoded_token 
+        request.state.uid = decoded_token['uid']
         return decoded_token['uid']
         
     except auth.ExpiredIdTokenError:
@@ -35,3 +42,9 @@ async def verify_firebase_token(credentials: HTTPAuthorizationCredentials = Depe
             detail="Invalid authentication credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
+
+async def verify_staff(uid: str = Depends(verify_firebase_token)):
+    """verify_firebase_token, plus the uid must be on the STAFF_UIDS allowlist (403 otherwise)"""
+    if uid not in STAFF_UIDS:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Staff access only")
+    return uid
@@ -1,12 +1,33 @@
-from fastapi import FastAPI, Depends
+from fastapi import FastAPI, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
-from app.routers import triage, navigator, booking, records
-from app.services.firebase import get_queue, seed_queue
+from fastapi.responses import ORJSONResponse, Response
+from typing import List
+from app.routers import triage, navigator, booking, records, home, admin
+from app.services.firebase import get_queue, seed_queue, reset_clinic, DEFAULT_CLINIC_ID
 # Import the gatekeeper
-from app.dependencies import verify_firebase_token
+from app.dependencies import verify_firebase_token, verify_staff
+from app.services.jobs import start_workers, stop_workers
+from app.services.search import save_all_snapshots, drop_index
+from app.models.queue import QueueEntry, queue_payload
+from app.services.llm_output import llm_output_stats
+from anyio import to_thread
+from app.services.admission import admit, controller, AdmissionRejected, POLICIES, admission_stats, THREADPOOL_SIZE, STALE_MAX_BODY_BYTES
+from app.services.profiler import start_trace, finish_trace
 
 app = FastAPI(title="LyfLify API")
 
+# Background job workers (Health Pulse precomputation, etc.)
+@app.on_event("startup")
+async def startup_jobs():
+    # Sync route handlers run on this pool; admission keeps part of it free for the priority lane
+    to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+    await start_workers()
+
+@app.on_event("shutdown")
+async def shutdown_jobs():
+    await stop_workers()
+    save_all_snapshots() # Search index snapshots, so the next start skips the full rebuild
+
 # Allow Frontend to talk to Backend (CORS)
 app.add_middleware(
     CORSMiddleware,
@@ -16,6 +37,53 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# --- ADMISSION CONTROL ---
+# Lanes are attached per route (see app/services/admission.py). Shed polls get
+# the user's last good response for that URL when we have one, otherwise 429.
+
+@app.exception_handler(AdmissionRejected)
+async def handle_admission_rejected(request: Request, exc: AdmissionRejected):
+    stale = controller.recall(exc.lane, exc.cache_key) if exc.cache_key else None
+    if stale:
+        stored_at, body, media_type = stale
+        return Response(content=body, media_type=media_type, headers={"X-Served-Stale": "1"})
+    return ORJSONResponse(
+        status_code=429,
+        content={"detail": f"Server busy ({exc.reason}). Please retry shortly."},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+@app.middleware("http")
+async def remember_poll_responses(request: Request, call_next):
+    """Keeps the last good body of each sheddable GET so overload can serve it stale"""
+    response = await call_next(request)
+    lane = getattr(request.state, "admission_lane", None)
+    if request.method != "GET" or response.status_code != 200 or lane is None or not POLICIES[lane].sheddable:
+        return response
+    if int(response.headers.get("content-length") or 0) > STALE_MAX_BODY_BYTES:
+        return response # Too big to keep; stream it through untouched
+    body = b"".join([chunk async for chunk in response.body_iterator])
+    uid = getattr(request.state, "uid", None) or (request.client.host if request.client else "anonymous")
+    controller.remember((uid, str(request.url)), body, response.media_type or "application/json")
+    return Response(content=body, status_code=response.status_code, headers=dict(response.headers), media_type=response.media_type)
+
+# --- PROFILING ---
+# Registered last so it wraps everything else. Spans are always recorded; stack
+# sampling only runs for requests picked via /admin/profiling (see app/services/profiler.py).
+
+@app.middleware("http")
+async def profile_requests(request: Request, call_next):
+    if request.url.path.startswith("/admin/profiling"):
+        return await call_next(request)
+    trace, token = start_trace(request.method, request.url.path)
+    try:
+        response = await call_next(request)
+    except Exception:
+        finish_trace(trace, token, 500)
+        raise
+    finish_trace(trace, token, response.status_code)
+    return response
+
 # --- PROTECTED ROUTES ---
 # We add `dependencies=[Depends(verify_firebase_token)]` to lock these down.
 
@@ -47,6 +115,20 @@ app.include_router(
     dependencies=[Depends(verify_firebase_token)]
 )
 
+app.include_router(
+    home.router, 
+    prefix="/home", 
+    tags=["Home"],
+    dependencies=[Depends(verify_firebase_token)]
+)
+
+app.include_router(
+    admin.router, 
+    prefix="/admin", 
+    tags=["Admin"],
+    dependencies=[Depends(verify_staff)] # STAFF_UIDS only
+)
+
 # --- PUBLIC ROUTES ---
 # We leave these open for health checks or initial setup (optional)
 
@@ -56,40 +138,45 @@ def read_root():
 
 # Optional: You might want to protect this too, but for a demo, it's often easier to leave open
 # or protect it so random people don't reset your database.
-@app.get("/queue", dependencies=[Depends(verify_firebase_token)]) 
-def read_queue():
+@app.get("/queue", response_model=List[QueueEntry], response_class=ORJSONResponse, dependencies=[Depends(verify_firebase_token), Depends(admit("poll"))]) 
+def read_queue(clinic_id: str = DEFAULT_CLINIC_ID):
     """Get the live clinic queue (Protected)"""
-    return get_queue()
+    # Polled every few seconds: slotted entries minus null fields, written straight to bytes by orjson
+    return ORJSONResponse(queue_payload(get_queue(clinic_id)))
+
+@app.get("/llm-stats", dependencies=[Depends(verify_firebase_token)])
+def read_llm_stats():
+    """How often each LLM call site needed local repair or a re-ask (Protected)"""
+    return llm_output_stats()
+
+@app.get("/admission-stats", dependencies=[Depends(verify_firebase_token)])
+def read_admission_stats():
+    """In-flight requests and admitted/rejected/stale counts per lane (Protected)"""
+    return admission_stats()
 
 @app.post("/seed")
-def seed_database():
+def seed_database(clinic_id: str = DEFAULT_CLINIC_ID):
     """Reset the database (Public for easier demo setup, or protect if desired)"""
     dummy_data = [
         {"time": "08:15", "name": "Thabo Mbeki", "patient_id": "920211...", "score": "High (8/10)", "status": "Waiting", "urgent": True},
         {"time": "08:30", "name": "Gogo Dlamini", "patient_id": "540105...", "score": "Medium (4/10)", "status": "In Review", "urgent": False},
         {"time": "08:45", "name": "Sarah Jones", "patient_id": "880523...", "score": "Low (1/10)", "status": "Checked In", "urgent": False},
     ]
-    seed_queue(dummy_data)
+    seed_queue(dummy_data, clinic_id)
     return {"message": "Database seeded with demo data"}
 
 
 @app.post("/reset-demo")
-def reset_demo_state():
+def reset_demo_state(clinic_id: str = DEFAULT_CLINIC_ID):
     """
-    EMERGENCY BUTTON: Deletes all 'records' and 'queue' data 
+    EMERGENCY BUTTON: Deletes the clinic's 'records' and 'queue' data 
     and reseeds the initial demo patients.
     """
-    # 1. Delete Queue
-    queue_ref = db.collection('queue')
-    for doc in queue_ref.stream():
-        doc.reference.delete()
-
-    # 2. Delete Records
-    records_ref = db.collection('records')
-    for doc in records_ref.stream():
-        doc.reference.delete()
-
-    # 3. Seed Fresh Data
-    seed_database() # Call your existing seed function
+    # 1. Delete Queue, Records and Patient Registry for this clinic only
+    reset_clinic(clinic_id)
+    drop_index(clinic_id)
+
+    # 2. Seed Fresh Data
+    seed_database(clinic_id) # Call your existing seed function
     
     return {"status": "Clean Slate", "message": "Ready for live demo."}
\ No newline at end of file
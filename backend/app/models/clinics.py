@@ -0,0 +1,5 @@
+import os
+
+# Clinic every endpoint/script falls back to when no clinic_id is given.
+# Lives in the models layer so request models can default to it without importing Firestore.
+DEFAULT_CLINIC_ID = os.getenv("DEFAULT_CLINIC_ID", "main")
@@ -0,0 +1,90 @@
+from dataclasses import dataclass, field
+from typing import List, Optional, Union
+from app.services.timestamps import as_local
+
+# Slotted dataclasses for the high-volume polling endpoints.
+# They double as FastAPI response models (for the OpenAPI docs) and are
+# serialized straight to bytes by orjson, skipping jsonable_encoder.
+# Queue entries are polled by every open Dashboard, so unset fields are left
+# out of the payload rather than sent as null (see queue_payload).
+
+def iso_or_none(value) -> Optional[str]:
+    moment = as_local(value)
+    return moment.isoformat() if moment else None
+
+@dataclass(slots=True)
+class QueueEntry:
+    id: str
+    patient_id: str
+    status: str
+    score: Union[str, int] = "Standard"
+    urgent: bool = False
+    symptoms: str = ""
+    time: str = "--:--"
+    created_at: Optional[str] = None
+    scheduled_at: Optional[str] = None # ISO, from the typed Firestore timestamp
+    status_changed_at: Optional[str] = None
+    patient_name: Optional[str] = None # Seed data's 'name' is folded in here
+    doctor_id: Optional[str] = None
+    doctor_name: Optional[str] = None
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "QueueEntry":
+        return cls(
+            id=data.get("id", ""),
+            patient_id=data.get("patient_id", ""),
+            status=data.get("status", "Unknown"),
+            score=data.get("score", "Standard"),
+            urgent=bool(data.get("urgent", False)),
+            symptoms=data.get("symptoms", ""),
+            time=data.get("time", "--:--"),
+            created_at=data.get("created_at"),
+            scheduled_at=iso_or_none(data.get("scheduled_at")),
+            status_changed_at=iso_or_none(data.get("status_changed_at")),
+            patient_name=data.get("patient_name") or data.get("name"),
+            doctor_id=data.get("doctor_id"),
+            doctor_name=data.get("doctor_name"),
+        )
+
+    def to_payload(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__ if getattr(self, name) is not None}
+
+def queue_payload(docs: list) -> list:
+    """Queue docs as response rows, without the null fields (the clinic is already in the request)"""
+    return [QueueEntry.from_dict(d).to_payload() for d in docs]
+
+@dataclass(slots=True)
+class JourneyItem:
+    id: str
+    clinic_id: str
+    status: str
+    symptoms: str
+    estimated_time: str
+    advice: str
+    color_code: str
+    ticket_score: Union[str, int]
+    queue_position: int = 0
+
+@dataclass(slots=True)
+class Metric:
+    label: str
+    value: str
+    change: str
+    type: str
+
+@dataclass(slots=True)
+class TrafficPoint:
+    time: str
+    patients: int
+
+@dataclass(slots=True)
+class CategorySlice:
+    name: str
+    value: int
+    color: str
+
+@dataclass(slots=True)
+class ClinicAnalytics:
+    metrics: List[Metric] = field(default_factory=list)
+    hourly_traffic: List[TrafficPoint] = field(default_factory=list)
+    diagnosis_data: List[CategorySlice] = field(default_factory=list)
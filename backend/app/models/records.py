@@ -0,0 +1,95 @@
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import List, Optional
+from pydantic import BaseModel, field_validator, model_validator
+from app.models.clinics import DEFAULT_CLINIC_ID
+
+# Slotted record shape for /records/list (see app/models/queue.py)
+
+@dataclass(slots=True)
+class RecordEntry:
+    id: str
+    patient_id: str
+    date: str = ""
+    doctor: str = ""
+    diagnosis: str = ""
+    meds: List[str] = field(default_factory=list)
+    notes: str = ""
+    type: str = "Consultation"
+    created_at: Optional[str] = None
+    patient_name: Optional[str] = None
+    clinic_id: Optional[str] = None
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "RecordEntry":
+        return cls(
+            id=data.get("id", ""),
+            patient_id=data.get("patient_id", ""),
+            date=data.get("date", ""),
+            doctor=data.get("doctor", ""),
+            diagnosis=data.get("diagnosis", ""),
+            meds=list(data.get("meds") or []),
+            notes=data.get("notes", ""),
+            type=data.get("type", "Consultation"),
+            created_at=data.get("created_at"),
+            patient_name=data.get("patient_name"),
+            clinic_id=data.get("clinic_id"),
+        )
+
+# --- Record writes ---
+
+class CreateRecordRequest(BaseModel):
+    patient_id: str
+    patient_name: str  # <--- Essential for the Registry
+    doctor_name: str
+    diagnosis: str
+    meds: List[str]
+    notes: str
+    clinic_id: str = DEFAULT_CLINIC_ID
+
+class ImportRecordRow(CreateRecordRequest):
+    """One row of a bulk import: a CreateRecordRequest plus the visit date/type from the source file"""
+    date: Optional[str] = None # YYYY-MM-DD, defaults to the import day
+    type: str = "Consultation"
+    created_at: Optional[str] = None # ISO timestamp from an export; unparseable values are ignored
+
+    @model_validator(mode="before")
+    @classmethod
+    def accept_stored_names(cls, data):
+        # Exports use the stored field name 'doctor'; accept it so an export re-imports as-is
+        if isinstance(data, dict) and not data.get("doctor_name") and data.get("doctor"):
+            data = {**data, "doctor_name": data["doctor"]}
+        return data
+
+    @field_validator("meds", mode="before")
+    @classmethod
+    def split_meds(cls, value):
+        # CSV cells hold "Amlodipine 5mg (Daily); Paracetamol 500mg (PRN)"
+        if isinstance(value, str):
+            return [m.strip() for m in value.replace("|", ";").split(";") if m.strip()]
+        return value
+
+    @field_validator("date", mode="before")
+    @classmethod
+    def check_date(cls, value):
+        if value in (None, ""):
+            return None
+        datetime.strptime(str(value), "%Y-%m-%d") # Must sort as text, like every other record date
+        return str(value)
+
+    @field_validator("type", mode="before")
+    @classmethod
+    def default_type(cls, value):
+        return value or "Consultation"
+
+    @field_validator("created_at", mode="before")
+    @classmethod
+    def check_created_at(cls, value):
+        # History is sorted by created_at, so a bad one would misplace the record; fall back to the visit date
+        if value in (None, ""):
+            return None
+        try:
+            datetime.fromisoformat(str(value))
+        except ValueError:
+            return None
+        return str(value)
@@ -0,0 +1,35 @@
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel
+from typing import List, Optional
+from app.services.profiler import get_settings, update_settings, list_captures, get_capture, clear_captures
+
+router = APIRouter()
+
+class ProfilingSettingsRequest(BaseModel):
+    sample_rate: Optional[float] = None # 0.0 - 1.0 of all requests
+    routes: Optional[List[str]] = None # Path prefixes to always profile, e.g. ["/navigator/analytics"]
+    slow_ms: Optional[float] = None # Requests slower than this are always captured
+    interval_ms: Optional[float] = None # Stack sampling interval
+
+@router.get("/profiling")
+def read_profiling():
+    """Current profiler settings and the captured requests (newest first)"""
+    return {"settings": get_settings(), "captures": list_captures()}
+
+@router.post("/profiling")
+def configure_profiling(request: ProfilingSettingsRequest):
+    """Turn profiling on/off at runtime; omitted fields are left unchanged"""
+    return update_settings(request.sample_rate, request.routes, request.slow_ms, request.interval_ms)
+
+@router.get("/profiling/{capture_id}")
+def read_capture(capture_id: int):
+    """Full capture: span timeline, per-call breakdown and (if profiled) sampled stacks"""
+    capture = get_capture(capture_id)
+    if not capture:
+        raise HTTPException(status_code=404, detail="Capture not found (it may have rotated out)")
+    return capture
+
+@router.delete("/profiling")
+def clear_profiling():
+    clear_captures()
+    return {"status": "cleared"}
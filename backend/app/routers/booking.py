@@ -1,8 +1,9 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Depends, Request
 from pydantic import BaseModel
-from datetime import datetime, timedelta
-from app.services.firebase import add_to_queue, update_booking_by_doc_id, delete_booking, get_queue
-from app.services.firebase import db
+from datetime import datetime
+from app.services.firebase import add_to_queue, apply_booking_action, archive_terminal_bookings, get_archived_bookings, DEFAULT_CLINIC_ID
+from app.services.booking_state import InvalidTransition
+from app.services.admission import admit, enter_lane, controller
 from typing import Optional
 
 
@@ -13,14 +14,32 @@ class BookingRequest(BaseModel):
     patient_name: str
     triage_score: int | str
     symptoms: str
+    clinic_id: str = DEFAULT_CLINIC_ID
 
 class StatusUpdateRequest(BaseModel):
     doc_id: str
-    action: str # "approve", "cancel", "delete", "vitals"
+    action: str # "assign", "delay", "complete", "cancel", "delete"
     payload: Optional[dict] = None
+    clinic_id: str = DEFAULT_CLINIC_ID
 
-@router.post("/create")
-async def create_booking(request: BookingRequest):
+URGENT_SCORES = ["red", "10", "9", "orange", "7", "8"]
+
+async def admit_booking(http_request: Request):
+    """Urgent (red/orange) bookings always get in; the rest share the normal write lane"""
+    try:
+        body = await http_request.json()
+        is_urgent = str(body.get("triage_score")).lower() in URGENT_SCORES
+    except Exception:
+        is_urgent = False # Let FastAPI's own validation report a bad body
+    lane = "priority" if is_urgent else "write"
+    route_key = enter_lane(http_request, lane)
+    try:
+        yield
+    finally:
+        controller.leave(lane, route_key)
+
+@router.post("/create", dependencies=[Depends(admit_booking)])
+def create_booking(request: BookingRequest):
     # ... (Keep existing create logic) ...
     # 1. Logic to Standardize Score/Status
     score_input = str(request.triage_score).lower()
@@ -54,60 +73,53 @@ async def create_booking(request: BookingRequest):
         "time": "--:--" 
     }
 
-    add_to_queue(booking_data)
+    add_to_queue(booking_data, request.clinic_id)
     
     return {"status": "success", "booking_status": status}
 
-@router.post("/update")
-async def update_booking_status(request: StatusUpdateRequest):
+@router.post("/update", dependencies=[Depends(admit("priority"))])
+def update_booking_status(request: StatusUpdateRequest):
     """
-    Handles Doctor Approvals, Patient Cancellations, and Deletions
+    Handles Doctor Approvals, Patient Cancellations, and Deletions.
+    Allowed transitions live in app/services/booking_state.py; each action is
+    checked and written in one Firestore transaction.
     """
-    
-    # --- SAFETY CHECK: Prevent actions on Cancelled bookings ---
-    doc_ref = db.collection('queue').document(request.doc_id)
-    doc = doc_ref.get()
-    
-    if not doc.exists:
-        raise HTTPException(status_code=404, detail="Booking not found")
-    
-    current_status = doc.to_dict().get("status")
+    try:
+        result = apply_booking_action(request.doc_id, request.action, request.payload, request.clinic_id)
+    except InvalidTransition as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-    # If the booking is cancelled, we ONLY allow the 'delete' action.
-    # Any attempt to 'assign' or 'approve' will be rejected.
-    if current_status == "Cancelled" and request.action != "delete":
-        raise HTTPException(
-            status_code=400, 
-            detail="Cannot update a cancelled booking. Please delete it or create a new one."
-        )
-    # -----------------------------------------------------------
+    if result is None:
+        raise HTTPException(status_code=404, detail="Booking not found")
 
     if request.action == "assign":
-        # New Logic: Assign to specific doctor
-        success = update_booking_by_doc_id(request.doc_id, {
-            "status": "Waiting for Doctor",
-            "doctor_id": request.payload.get("doctor_id"), # You'll need to pass this
-            "doctor_name": request.payload.get("doctor_name"),
-            "time": (datetime.now() + timedelta(minutes=15)).strftime("%H:%M") 
-        })
         return {"status": "assigned"}
-    
-    # NEW: Updates status to 'Cancelled' (Does NOT delete yet)
     elif request.action == "cancel":
-        success = update_booking_by_doc_id(request.doc_id, {
-            "status": "Cancelled",
-            "time": "--:--" # Reset time
-        })
-        if not success:
-            raise HTTPException(status_code=404, detail="Booking not found")
         return {"status": "cancelled", "message": "Booking marked as cancelled"}
-
-    # NEW: Actually removes the record
     elif request.action == "delete":
-        try:
-            db.collection('queue').document(request.doc_id).delete()
-            return {"status": "deleted", "message": "Booking removed permanent"}
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=str(e))
-        
-    return {"status": "no_action"}
\ No newline at end of file
+        return {"status": "deleted", "message": "Booking removed from queue"}
+    elif request.action == "complete":
+        return {"status": "completed", "message": "Booking marked as done"}
+    elif request.action == "delay":
+        return {"status": "delayed"}
+    return {"status": "no_action"}
+
+@router.post("/archive", dependencies=[Depends(admit("priority"))])
+def archive_finished_bookings(clinic_id: str = DEFAULT_CLINIC_ID):
+    """
+    Moves every Cancelled/Done booking out of the live queue into the daily archive.
+    Safe to call repeatedly (e.g. from scripts/archive_queue.py on a cron).
+    """
+    archived = archive_terminal_bookings(clinic_id)
+    return {"status": "success", "archived": archived}
+
+@router.get("/archive/{day}", dependencies=[Depends(admit("poll"))])
+def list_archived_bookings(day: str, clinic_id: str = DEFAULT_CLINIC_ID):
+    """Archived bookings for one day (YYYY-MM-DD)"""
+    try:
+        datetime.strptime(day, "%Y-%m-%d")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Day must be in YYYY-MM-DD format")
+    return get_archived_bookings(day, clinic_id)
\ No newline at end of file
@@ -0,0 +1,108 @@
+import asyncio
+import os
+import time
+from fastapi import APIRouter, Depends
+from fastapi.responses import ORJSONResponse
+from dataclasses import dataclass, field
+from typing import List, Optional
+from app.services.firebase import get_patient_bookings, get_patient_records, seed_records, get_health_pulse, DEFAULT_CLINIC_ID
+from app.services.journey import build_journey
+from app.services.admission import admit
+from app.services.health_pulse import build_health_pulse, is_fallback_pulse
+from app.services.jobs import job_in_flight
+from app.models.queue import JourneyItem
+from app.models.records import RecordEntry
+
+router = APIRouter()
+
+# How long the bundle waits for a Health Pulse before answering without it.
+# Precomputed pulses are a single doc read; this only bites on first-ever generation.
+PULSE_TIMEOUT_SECONDS = float(os.getenv("HOME_PULSE_TIMEOUT", "1.5"))
+
+# Failed generations back off (30s, 60s, ... up to 10 min) instead of retrying on every 3s poll
+PULSE_RETRY_BASE_SECONDS = 30
+PULSE_RETRY_MAX_SECONDS = 600
+
+# In-flight on-demand generations, so repeated polls share one LLM call
+_pulse_tasks = {}
+_pulse_failures = {} # (clinic_id, patient_id) -> (retry_at monotonic, consecutive failures)
+
+@dataclass(slots=True)
+class HomeBundle:
+    journey: List[JourneyItem] = field(default_factory=list)
+    records: List[RecordEntry] = field(default_factory=list)
+    health_pulse: Optional[dict] = None
+    pending: List[str] = field(default_factory=list) # Sections still being generated; poll again
+    failed: List[str] = field(default_factory=list) # Sections that couldn't be generated; retried later with backoff
+
+def load_records(patient_id: str, clinic_id: str) -> list:
+    """Same auto-seed behaviour as /records/list for the demo"""
+    records = get_patient_records(patient_id, clinic_id)
+    if not records:
+        seed_records(patient_id, clinic_id)
+        records = get_patient_records(patient_id, clinic_id)
+    return records
+
+def record_pulse_outcome(key: tuple, task: asyncio.Future):
+    _pulse_tasks.pop(key, None)
+    failed = task.cancelled() or task.exception() is not None or is_fallback_pulse(task.result())
+    if not failed:
+        _pulse_failures.pop(key, None)
+        return
+    _, failures = _pulse_failures.get(key, (0, 0))
+    delay = min(PULSE_RETRY_BASE_SECONDS * 2 ** failures, PULSE_RETRY_MAX_SECONDS)
+    _pulse_failures[key] = (time.monotonic() + delay, failures + 1)
+
+@router.get("/bundle/{patient_id}", response_model=HomeBundle, response_class=ORJSONResponse, dependencies=[Depends(admit("poll"))])
+async def get_home_bundle(patient_id: str, clinic_id: str = DEFAULT_CLINIC_ID):
+    """
+    Everything the patient Home page needs in one authenticated call:
+    journey tracker, records and Health Pulse.
+    Queue and records are read once, concurrently; a slow Health Pulse is
+    returned as `pending` instead of holding back the journey tracker.
+    """
+    # 1. Independent Firestore reads in parallel (the clients are blocking, so use threads)
+    bookings, records, stored_pulse = await asyncio.gather(
+        asyncio.to_thread(get_patient_bookings, patient_id),
+        asyncio.to_thread(load_records, patient_id, clinic_id),
+        asyncio.to_thread(get_health_pulse, patient_id, clinic_id)
+    )
+
+    bundle = HomeBundle(
+        journey=build_journey(bookings),
+        records=[RecordEntry.from_dict(r) for r in records]
+    )
+    if stored_pulse:
+        bundle.health_pulse = stored_pulse["analysis"]
+        return ORJSONResponse(bundle)
+
+    # 2. No precomputed pulse yet. A background job may already be generating it;
+    # otherwise generate from the records we already have, unless a recent attempt failed.
+    # On timeout the generation keeps running in its thread and is stored for the next poll.
+    key = (clinic_id, patient_id)
+    if job_in_flight("health_pulse", f"{clinic_id}__{patient_id}"):
+        bundle.pending.append("health_pulse")
+        return ORJSONResponse(bundle)
+
+    pulse_task = _pulse_tasks.get(key)
+    if pulse_task is None:
+        retry_at, _ = _pulse_failures.get(key, (0, 0))
+        if time.monotonic() < retry_at:
+            bundle.failed.append("health_pulse")
+            return ORJSONResponse(bundle)
+        pulse_task = asyncio.ensure_future(asyncio.to_thread(build_health_pulse, patient_id, clinic_id, records))
+        _pulse_tasks[key] = pulse_task
+        pulse_task.add_done_callback(lambda task: record_pulse_outcome(key, task))
+    try:
+        analysis = await asyncio.wait_for(asyncio.shield(pulse_task), PULSE_TIMEOUT_SECONDS)
+        if is_fallback_pulse(analysis):
+            bundle.failed.append("health_pulse")
+        else:
+            bundle.health_pulse = analysis
+    except asyncio.TimeoutError:
+        bundle.pending.append("health_pulse")
+    except Exception as e:
+        print(f"Home bundle Health Pulse error for {patient_id}: {e}")
+        bundle.failed.append("health_pulse")
+
+    return ORJSONResponse(bundle)
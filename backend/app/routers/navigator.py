@@ -1,39 +1,35 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import ORJSONResponse
 from datetime import datetime, timedelta
-# Ensure we import update_booking_in_db to avoid NameError
-from app.services.firebase import get_queue, update_booking_in_db
+from app.services.firebase import get_queue, get_patient_bookings, apply_booking_action, iter_archived_bookings, DEFAULT_CLINIC_ID
+from app.services.firebase import get_todays_queue, get_next_patients
+from app.services.timestamps import created_time, scheduled_time, now_local
+from app.services.firebase import get_rollups, score_label, wait_percentile
 from app.services.llm import analyze_operational_metrics
+from app.services.journey import build_journey
+from app.services.admission import admit
+from app.models.queue import JourneyItem, ClinicAnalytics, Metric, TrafficPoint, CategorySlice, QueueEntry, queue_payload
 from collections import Counter
+from typing import List, Optional
 
 router = APIRouter()
 
 # --- 1. THE DEMO GOD ENDPOINT (Simulate Delay) ---
-@router.post("/delay")
-async def simulate_clinic_delay():
+@router.post("/delay", dependencies=[Depends(admit("priority"))])
+def simulate_clinic_delay(clinic_id: str = DEFAULT_CLINIC_ID):
     """
     DEMO FEATURE: Adds 15 minutes to all active appointments 
     and sets status to 'Delayed'.
     """
-    queue = get_queue()
+    queue = get_queue(clinic_id)
     count = 0
     
     for patient in queue:
         # Only update patients who have a valid time (ignore TBD/Pending)
-        if patient.get("time") and ":" in patient.get("time"):
+        if scheduled_time(patient) is not None:
             try:
-                # 1. Parse current time
-                current_time_str = patient["time"]
-                current_dt = datetime.strptime(current_time_str, "%H:%M")
-                
-                # 2. Add 15 Minutes
-                new_time = current_dt + timedelta(minutes=15)
-                new_time_str = new_time.strftime("%H:%M")
-                
-                # 3. Update Firestore
-                update_booking_in_db(patient["patient_id"], {
-                    "time": new_time_str, 
-                    "status": "Delayed" 
-                })
+                # Transactional +15 min; the state machine skips cancelled/finished bookings
+                apply_booking_action(patient["id"], "delay", {"minutes": 15}, clinic_id)
                 count += 1
             except Exception as e:
                 print(f"Skipping {patient.get('patient_id')}: {e}")
@@ -43,66 +39,35 @@ async def simulate_clinic_delay():
 
 # --- 2. PATIENT STATUS READER ---
 
-@router.get("/status/{patient_id}")
-async def get_patient_journey(patient_id: str):
-    queue = get_queue()
-    my_bookings = [p for p in queue if p["patient_id"] == patient_id]
+@router.get("/status/{patient_id}", response_model=List[JourneyItem], response_class=ORJSONResponse, dependencies=[Depends(admit("poll"))])
+def get_patient_journey(patient_id: str, clinic_id: Optional[str] = None):
+    # Indexed per-patient lookup (all clinics unless one is specified)
+    my_bookings = get_patient_bookings(patient_id, clinic_id)
     
-    # Sort safe logic
-    my_bookings.sort(key=lambda x: str(x.get("created_at", "")), reverse=True)
-    
-    results = []
-    
-    for entry in my_bookings:
-        status = entry.get("status", "Unknown")
-        score = entry.get("score", "Standard")
-        
-        # ... (keep existing color/advice logic) ...
-        # Default
-        color = "green"
-        advice = "Please arrive on time."
-        display_time = entry.get("time", "--:--")
-
-        if status == "Delayed":
-            color = "red"
-            advice = "⚠ CLINIC DELAYED. We apologize for the wait."
-        elif status == "Pending Approval":
-            color = "gray"
-            advice = "Pending approval. Please be patient."
-            display_time = "--:--"
-        elif entry.get("urgent") or "Critical" in score or status == "Emergency En Route":
-            color = "red"
-            advice = "Emergency Team Notified. Proceed immediately."
-        elif status in ["Confirmed", "Booked"]:
-            color = "teal"
-            advice = "Appointment set. Please read details and don't miss your next appointment."
-        elif status == "Cancelled":
-            color = "gray"
-            advice = "This appointment has been cancelled."
-        elif status == "Waiting":
-            color = "orange"
-            advice = "You are in the queue."
-
-        results.append({
-            "id": entry.get("id"), # <--- CRITICAL FIX: Pass the Firestore Doc ID
-            "status": status,
-            "symptoms": entry.get("symptoms", "General Checkup"),
-            "estimated_time": display_time,
-            "advice": advice,
-            "color_code": color,
-            "ticket_score": score,
-            "queue_position": 0 
-        })
+    return ORJSONResponse(build_journey(my_bookings))
+
+@router.get("/today", response_model=List[QueueEntry], response_class=ORJSONResponse, dependencies=[Depends(admit("poll"))])
+def get_today_queue(day: Optional[str] = None, clinic_id: str = DEFAULT_CLINIC_ID):
+    """Bookings made today (or on `day`, YYYY-MM-DD) in arrival order - an indexed range query"""
+    if day:
+        try:
+            datetime.strptime(day, "%Y-%m-%d")
+        except ValueError:
+            raise HTTPException(status_code=400, detail="day must be YYYY-MM-DD")
+    return ORJSONResponse(queue_payload(get_todays_queue(day, clinic_id)))
 
-    return results
+@router.get("/next", response_model=List[QueueEntry], response_class=ORJSONResponse, dependencies=[Depends(admit("poll"))])
+def get_next_in_line(n: int = 5, clinic_id: str = DEFAULT_CLINIC_ID):
+    """The next N active patients by scheduled start time"""
+    return ORJSONResponse(queue_payload(get_next_patients(max(1, min(n, 50)), clinic_id)))
 
-@router.get("/analytics")
-async def get_clinic_analytics():
+@router.get("/analytics", response_model=ClinicAnalytics, response_class=ORJSONResponse, dependencies=[Depends(admit("poll"))])
+def get_clinic_analytics(clinic_id: str = DEFAULT_CLINIC_ID):
     """
     Aggregates live data for the Clinic Analytics Dashboard.
     """
-    queue = get_queue()
-    now = datetime.now()
+    queue = get_queue(clinic_id)
+    now = now_local()
     
     # 1. Key Metrics
     total_patients = len(queue)
@@ -113,25 +78,23 @@ async def get_clinic_analytics():
     valid_times = 0
     
     # 2. Hourly Traffic (Group by Hour)
-    # Initialize 08:00 to 17:00 with 0
-    hours_map = {f"{h:02d}:00": 0 for h in range(8, 18)}
+    # Clinic hours (08:00 to 17:00) are always shown; after-hours arrivals widen the range
+    hour_counts = Counter()
 
     for p in queue:
-        created_at_str = p.get("created_at")
-        if created_at_str:
-            try:
-                # Handle ISO format calculation
-                created_dt = datetime.fromisoformat(created_at_str)
-                wait = (now - created_dt).total_seconds() / 60
-                total_wait_minutes += wait
-                valid_times += 1
-                
-                # Hourly bucket
-                hour_key = f"{created_dt.hour:02d}:00"
-                if hour_key in hours_map:
-                    hours_map[hour_key] += 1
-            except:
-                pass
+        # Typed created_ts when present; legacy ISO strings are parsed by the shim
+        created_dt = created_time(p)
+        if created_dt:
+            wait = (now - created_dt).total_seconds() / 60
+            total_wait_minutes += wait
+            valid_times += 1
+            
+            # Hourly bucket
+            hour_counts[created_dt.hour] += 1
+
+    first_hour = min([8, *hour_counts.keys()])
+    last_hour = max([17, *hour_counts.keys()])
+    hours_map = {f"{h:02d}:00": hour_counts[h] for h in range(first_hour, last_hour + 1)}
     
     avg_wait = int(total_wait_minutes / valid_times) if valid_times > 0 else 0
     
@@ -139,15 +102,13 @@ async def get_clinic_analytics():
     delayed_count = sum(1 for p in queue if p.get("status") == "Delayed")
     efficiency = max(0, 100 - (delayed_count * 5))
 
-    hourly_traffic = [{"time": k, "patients": v} for k, v in hours_map.items()]
+    hourly_traffic = [TrafficPoint(time=k, patients=v) for k, v in hours_map.items()]
 
     # 3. Categories (Pie Chart) - Based on Score Text
     category_counts = Counter()
     for p in queue:
-        score_str = p.get("score", "Routine")
         # Extract "High" from "High (8/10)"
-        label = score_str.split(" ")[0] if " " in score_str else score_str
-        category_counts[label] += 1
+        category_counts[score_label(p.get("score", "Routine"))] += 1
         
     # Map to Brand Colors
     color_map = {
@@ -160,29 +121,102 @@ async def get_clinic_analytics():
     
     diagnosis_data = []
     for label, count in category_counts.items():
-        diagnosis_data.append({
-            "name": label,
-            "value": count,
-            "color": color_map.get(label, "#cbd5e1")
-        })
+        diagnosis_data.append(CategorySlice(
+            name=label,
+            value=count,
+            color=color_map.get(label, "#cbd5e1")
+        ))
         
     if not diagnosis_data: 
-        diagnosis_data = [{"name": "No Data", "value": 1, "color": "#f1f5f9"}]
+        diagnosis_data = [CategorySlice(name="No Data", value=1, color="#f1f5f9")]
 
-    return {
-        "metrics": [
-            {"label": "Avg Wait Time", "value": f"{avg_wait}m", "change": "Live", "type": "time"},
-            {"label": "Active Queue", "value": str(total_patients), "change": "Live", "type": "users"},
-            {"label": "Critical Cases", "value": str(critical_cases), "change": "Live", "type": "alert"},
-            {"label": "Efficiency Score", "value": f"{efficiency}%", "change": "Live", "type": "activity"},
+    return ORJSONResponse(ClinicAnalytics(
+        metrics=[
+            Metric(label="Avg Wait Time", value=f"{avg_wait}m", change="Live", type="time"),
+            Metric(label="Active Queue", value=str(total_patients), change="Live", type="users"),
+            Metric(label="Critical Cases", value=str(critical_cases), change="Live", type="alert"),
+            Metric(label="Efficiency Score", value=f"{efficiency}%", change="Live", type="activity"),
         ],
-        "hourly_traffic": hourly_traffic,
-        "diagnosis_data": diagnosis_data
+        hourly_traffic=hourly_traffic,
+        diagnosis_data=diagnosis_data
+    ))
+
+
+@router.get("/wait-history", dependencies=[Depends(admit("poll"))])
+def get_wait_history(days: int = 7, clinic_id: str = DEFAULT_CLINIC_ID):
+    """
+    Daily wait-time history for finished bookings, read from the archive.
+    """
+    days = max(1, min(days, 90))
+    today = datetime.now()
+    start_day = (today - timedelta(days=days - 1)).strftime("%Y-%m-%d")
+    end_day = today.strftime("%Y-%m-%d")
+
+    per_day = {}
+    for entry in iter_archived_bookings(start_day, end_day, clinic_id):
+        day = per_day.setdefault(entry.get("archived_date"), {"patients": 0, "waits": [], "cancelled": 0})
+        day["patients"] += 1
+        if entry.get("final_status") == "Cancelled":
+            day["cancelled"] += 1
+        if entry.get("wait_minutes") is not None:
+            day["waits"].append(entry["wait_minutes"])
+
+    history = []
+    for offset in range(days):
+        key = (today - timedelta(days=days - 1 - offset)).strftime("%Y-%m-%d")
+        day = per_day.get(key, {"patients": 0, "waits": [], "cancelled": 0})
+        waits = day["waits"]
+        history.append({
+            "date": key,
+            "patients": day["patients"],
+            "cancelled": day["cancelled"],
+            "avg_wait": int(sum(waits) / len(waits)) if waits else 0
+        })
+    return history
+
+
+@router.get("/analytics/trend", dependencies=[Depends(admit("poll"))])
+def get_analytics_trend(days: int = 30, clinic_id: str = DEFAULT_CLINIC_ID):
+    """
+    Historical traffic for 30/90-day charts, served from the daily rollups
+    (one range query, one small doc per day).
+    """
+    days = max(1, min(days, 365))
+    today = datetime.now()
+    start_day = (today - timedelta(days=days - 1)).strftime("%Y-%m-%d")
+    rollups = {r["date"]: r for r in get_rollups(start_day, today.strftime("%Y-%m-%d"), clinic_id)}
+
+    daily = []
+    category_totals = Counter()
+    hour_totals = Counter()
+    for offset in range(days):
+        key = (today - timedelta(days=days - 1 - offset)).strftime("%Y-%m-%d")
+        r = rollups.get(key, {})
+        histogram = r.get("wait_histogram", {})
+        wait_count = r.get("wait_count", 0)
+        category_totals.update(r.get("categories", {}))
+        hour_totals.update(r.get("hourly", {}))
+        daily.append({
+            "date": key,
+            "arrivals": r.get("arrivals", 0),
+            "urgent": r.get("urgent", 0),
+            "delays": r.get("delays", 0),
+            "records": r.get("records", 0),
+            "avg_wait": int(r.get("wait_total_minutes", 0) / wait_count) if wait_count else 0,
+            "p50_wait": wait_percentile(histogram, 50),
+            "p90_wait": wait_percentile(histogram, 90),
+        })
+
+    return {
+        "days": days,
+        "daily": daily,
+        "category_mix": [{"name": k, "value": v} for k, v in category_totals.most_common()],
+        "hourly_profile": [{"time": f"{h}:00", "patients": hour_totals[h]} for h in sorted(hour_totals)]
     }
 
 
-@router.post("/analytics/insights")
-async def get_ai_insights(metrics: dict):
+@router.post("/analytics/insights", dependencies=[Depends(admit("summary"))])
+def get_ai_insights(metrics: dict):
     """
     Separate endpoint to get Llama 3 thoughts without blocking the main dashboard load.
     """
@@ -1,9 +1,17 @@
-from fastapi import APIRouter
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional
-from datetime import datetime
-from app.services.firebase import get_patient_records, seed_records, add_patient_record, get_unique_patients
-from app.services.llm import explain_prescription, analyze_patient_health
+from app.services.firebase import get_patient_records, seed_records, add_patient_record, get_unique_patients, DEFAULT_CLINIC_ID
+from app.services.llm import explain_prescription
+from app.services.health_pulse import read_health_pulse
+from app.services.jobs import enqueue_job
+from app.models.records import RecordEntry, CreateRecordRequest
+from app.services.record_rows import build_record_data, RowDecoder
+from app.services.record_transfer import export_ndjson, export_csv, RecordImporter
+from app.services.search import search_records
+from app.services.admission import admit, admit_stream, AdmissionSlot
 
 router = APIRouter()
 
@@ -12,71 +20,114 @@ class ExplainRequest(BaseModel):
     meds: List[str]
     notes: str
 
-@router.get("/list/{patient_id}")
-async def list_records(patient_id: str):
+@router.get("/list/{patient_id}", response_model=List[RecordEntry], response_class=ORJSONResponse, dependencies=[Depends(admit("poll"))])
+def list_records(patient_id: str, clinic_id: str = DEFAULT_CLINIC_ID):
     """Get all records. Auto-seeds if empty for the demo."""
-    records = get_patient_records(patient_id)
+    records = get_patient_records(patient_id, clinic_id)
     
     if not records:
-        seed_records(patient_id)
-        records = get_patient_records(patient_id)
+        seed_records(patient_id, clinic_id)
+        records = get_patient_records(patient_id, clinic_id)
         
-    return records
+    return ORJSONResponse([RecordEntry.from_dict(r) for r in records])
 
-@router.post("/explain")
-async def explain_record(request: ExplainRequest):
+@router.post("/explain", dependencies=[Depends(admit("summary"))])
+def explain_record(request: ExplainRequest):
     """Real-time AI explanation of the record"""
     explanation = explain_prescription(request.diagnosis, request.meds, request.notes)
     return {"explanation": explanation}
 
-# --- CORRECT DEFINITION (Only One Version) ---
-class CreateRecordRequest(BaseModel):
-    patient_id: str
-    patient_name: str  # <--- Essential for the Registry
-    doctor_name: str
-    diagnosis: str
-    meds: List[str]
-    notes: str
-
-@router.post("/create")
-async def create_new_record(request: CreateRecordRequest):
+@router.post("/create", dependencies=[Depends(admit("priority"))])
+def create_new_record(request: CreateRecordRequest):
     """Doctor submits a new record"""
+    record_data = build_record_data(request)
+    add_patient_record(record_data, request.clinic_id)
 
-    now = datetime.now()
-    
-    record_data = {
+    # Refresh the patient's Health Pulse in the background so Home never waits on the LLM
+    enqueue_job("health_pulse", f"{request.clinic_id}__{request.patient_id}", {
         "patient_id": request.patient_id,
-        "patient_name": request.patient_name, 
-        # CRITICAL: Use ISO format (YYYY-MM-DD) so 2025 > 2024
-        "date": datetime.now().strftime("%Y-%m-%d"),
-        "created_at": now.isoformat(),
-        "doctor": request.doctor_name,
-        "diagnosis": request.diagnosis,
-        "meds": request.meds,
-        "notes": request.notes,
-        "type": "Consultation"
-    }
-    
-    add_patient_record(record_data)
+        "clinic_id": request.clinic_id
+    })
     
     return {"status": "success", "message": "Record created"}
 
-@router.get("/all-patients")
-async def list_all_patients():
-    """Returns a unique list of patients who have records."""
-    return get_unique_patients()
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
 
-@router.get("/ai-summary/{patient_id}")
-async def get_health_pulse(patient_id: str):
+@router.get("/export")
+def export_records(format: str = "ndjson", after: Optional[str] = None, clinic_id: str = DEFAULT_CLINIC_ID,
+                   slot: AdmissionSlot = Depends(admit_stream("write"))):
     """
-    Generates a Llama 3 Health Pulse for the patient home screen.
+    Streams every record in the clinic as NDJSON or CSV, in ID order.
+    If the download breaks, call again with `after=<last id received>` to continue.
+    The write-lane slot is held until the last row is sent, not just until this returns.
     """
-    records = get_patient_records(patient_id)
-    
-    # If no records, seed them so the demo looks good
-    if not records:
-        seed_records(patient_id)
-        records = get_patient_records(patient_id)
-        
-    analysis = analyze_patient_health(records)
-    return analysis
\ No newline at end of file
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="format must be 'ndjson' or 'csv'")
+    rows = export_ndjson(clinic_id, after) if format == "ndjson" else export_csv(clinic_id, after)
+    return StreamingResponse(slot.stream(rows), media_type=EXPORT_FORMATS[format], headers={
+        "Content-Disposition": f'attachment; filename="records-{clinic_id}.{format}"'
+    })
+
+@router.post("/import", dependencies=[Depends(admit("write"))])
+async def import_records(request: Request, format: str = "ndjson", clinic_id: str = DEFAULT_CLINIC_ID, start_line: int = 1):
+    """
+    Bulk import from an NDJSON or CSV request body (CreateRecordRequest fields,
+    plus optional `date` and `type`). Rows are validated individually and written
+    in batches; the patient registry is updated in the same commits.
+    If an import stops part-way, re-send the same file with
+    `start_line=<committed_through_line + 1>` to continue.
+    """
+    try:
+        decoder = RowDecoder(format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if start_line < 1:
+        raise HTTPException(status_code=400, detail="start_line must be 1 or more")
+    importer = RecordImporter(clinic_id, start_line=start_line)
+    stale_pulses = set()
+
+    async def flush():
+        # The body isn't read any further until this chunk is written
+        stale_pulses.update(await asyncio.to_thread(importer.flush))
+
+    try:
+        async for chunk in request.stream():
+            for line_no, row, error in decoder.feed(chunk):
+                importer.add(line_no, row, error)
+                if importer.full():
+                    await flush()
+        for line_no, row, error in decoder.close():
+            importer.add(line_no, row, error)
+            if importer.full():
+                await flush()
+        await flush()
+    except Exception as e:
+        print(f"Import error ({clinic_id}): {e}")
+        return ORJSONResponse(status_code=500, content={**importer.report(), "status": "partial", "error": str(e)})
+
+    # Patients who already had a Health Pulse get it recomputed with the imported history
+    for patient_id in stale_pulses:
+        enqueue_job("health_pulse", f"{clinic_id}__{patient_id}", {"patient_id": patient_id, "clinic_id": clinic_id})
+
+    return {**importer.report(), "status": "success"}
+
+@router.get("/search", dependencies=[Depends(admit("poll"))])
+def search_patient_records(q: str, clinic_id: str = DEFAULT_CLINIC_ID, limit: int = 20):
+    """
+    Ranked full-text search over diagnosis, meds, notes and patient name.
+    Words are matched as prefixes (e.g. "amox 500" finds Amoxicillin 500mg).
+    """
+    return search_records(q, clinic_id, max(1, min(limit, 100)))
+
+@router.get("/all-patients", dependencies=[Depends(admit("poll"))])
+def list_all_patients(clinic_id: str = DEFAULT_CLINIC_ID):
+    """Returns a unique list of patients who have records at this clinic."""
+    return get_unique_patients(clinic_id)
+
+@router.get("/ai-summary/{patient_id}", dependencies=[Depends(admit("summary"))])
+def get_health_pulse(patient_id: str, clinic_id: str = DEFAULT_CLINIC_ID):
+    """
+    Llama 3 Health Pulse for the patient home screen.
+    Served from the background-precomputed result; generated on demand only the first time.
+    """
+    return read_health_pulse(patient_id, clinic_id)
\ No newline at end of file
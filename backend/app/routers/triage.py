@@ -1,22 +1,37 @@
-from fastapi import APIRouter
+import time
+from fastapi import APIRouter, Depends
 from app.models.triage import TriageRequest, TriageResponse
 from app.services.llm import get_llama_chat_response 
+from app.services.admission import admit
+from app.services.triage_cache import lookup_triage_reply, store_triage_reply, triage_cache_stats
 
 router = APIRouter()
 
-@router.post("/assess", response_model=TriageResponse)
-async def assess_patient(request: TriageRequest):
+@router.post("/assess", response_model=TriageResponse, dependencies=[Depends(admit("llm"))])
+def assess_patient(request: TriageRequest):
     # Log the interaction for debugging
     print(f"Chat from {request.patient_name}: {len(request.history)} messages")
     
+    # Near-identical opening messages reuse an earlier reply (red flags always skip this)
+    cached = lookup_triage_reply(request.history, request.patient_name, request.age, request.gender)
+    if cached:
+        return TriageResponse(**cached)
+
     # Call the new Conversational Service (Nurse Nandiphiwe)
     # We pass the age and gender so the AI can be context-aware
+    started = time.perf_counter()
     ai_data = get_llama_chat_response(
         patient_name=request.patient_name, 
         history=request.history,
         age=request.age,
         gender=request.gender
     )
+    store_triage_reply(request.history, request.patient_name, ai_data, time.perf_counter() - started, request.age, request.gender)
     
     # Convert the dict back into the Pydantic model
-    return TriageResponse(**ai_data)
\ No newline at end of file
+    return TriageResponse(**ai_data)
+
+@router.get("/cache-stats")
+async def get_triage_cache_stats():
+    """Hit rate and estimated LLM time saved by the opening-turn cache"""
+    return triage_cache_stats()
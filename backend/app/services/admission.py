@@ -0,0 +1,227 @@
+import math
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+from fastapi import Request
+from starlette.concurrency import iterate_in_threadpool
+
+# --- ADMISSION CONTROL & LOAD SHEDDING ---
+# Every protected route is assigned a lane. Lanes set per-route concurrency
+# limits and a per-user token bucket keyed on the verified Firebase uid.
+#   priority : urgent bookings and staff actions, always admitted
+#   write    : ordinary writes (non-urgent bookings)
+#   llm      : triage chat, which is LLM-bound and capped but never shed
+#   poll     : 3-second polling reads, which are shed first
+#   summary  : AI summaries/explanations, shed alongside polls
+# Under overload (too many requests in flight overall), sheddable lanes are
+# rejected immediately. They are answered with the user's last good response
+# for that URL if we have one, otherwise 429 + Retry-After.
+#
+# Lane-gated handlers are plain `def`, so each admitted request holds one
+# threadpool thread while it waits on Firestore/Groq. Non-priority lanes
+# together may only hold SHARED_INFLIGHT of the THREADPOOL_SIZE threads; the
+# rest stay free so an urgent booking never queues behind polls and chats.
+
+@dataclass
+class LanePolicy:
+    concurrency: Optional[int] # Max in-flight per route (None = unlimited)
+    rate: Optional[float] # Tokens per second per user (None = unlimited)
+    burst: int = 1
+    sheddable: bool = False
+
+POLICIES = {
+    "priority": LanePolicy(concurrency=None, rate=None),
+    "write": LanePolicy(concurrency=16, rate=1.0, burst=10),
+    "llm": LanePolicy(concurrency=int(os.getenv("LLM_CONCURRENCY", "8")), rate=0.5, burst=5),
+    "poll": LanePolicy(concurrency=24, rate=2.0, burst=10, sheddable=True),
+    "summary": LanePolicy(concurrency=4, rate=0.2, burst=3, sheddable=True),
+}
+
+# Sized onto anyio's default thread limiter at startup (main.py)
+THREADPOOL_SIZE = int(os.getenv("THREADPOOL_SIZE", "40"))
+PRIORITY_RESERVE_THREADS = int(os.getenv("PRIORITY_RESERVE_THREADS", "8"))
+SHARED_INFLIGHT = max(THREADPOOL_SIZE - PRIORITY_RESERVE_THREADS, 1) # Non-priority requests in flight at once
+
+# Past this many non-priority requests in flight, sheddable lanes are refused
+# (below SHARED_INFLIGHT, so polls are shed before chats and writes are)
+OVERLOAD_INFLIGHT = int(os.getenv("OVERLOAD_INFLIGHT", "24"))
+
+STALE_CACHE_SIZE = 1000
+STALE_CACHE_MAX_BYTES = int(os.getenv("STALE_CACHE_MAX_BYTES", str(32 * 1024 * 1024))) # All kept bodies together
+STALE_MAX_BODY_BYTES = int(os.getenv("STALE_MAX_BODY_BYTES", str(512 * 1024))) # Bigger bodies aren't kept
+STALE_MAX_AGE_SECONDS = 120
+
+class AdmissionRejected(Exception):
+    """Raised by the admission dependency; turned into a stale response or a 429 in main.py"""
+    def __init__(self, lane: str, reason: str, retry_after: int, cache_key: Optional[tuple] = None):
+        self.lane = lane
+        self.reason = reason
+        self.retry_after = retry_after
+        self.cache_key = cache_key
+
+class AdmissionController:
+    """Single event loop, so plain counters are safe without locks"""
+
+    def __init__(self):
+        self.in_flight = 0
+        self.shared_in_flight = 0 # Non-priority lanes only
+        self.route_in_flight = {}
+        self.buckets = {} # (uid, lane) -> [tokens, last_refill]
+        self.stats = {lane: {"admitted": 0, "rejected": 0, "stale": 0} for lane in POLICIES}
+        self.stale = OrderedDict() # (uid, url) -> (stored_at, body, media_type)
+        self.stale_bytes = 0
+
+    def take_token(self, uid: str, lane: str, policy: LanePolicy) -> float:
+        """Returns 0 if a token was taken, otherwise seconds until one is available"""
+        now = time.monotonic()
+        tokens, last = self.buckets.get((uid, lane), (policy.burst, now))
+        tokens = min(policy.burst, tokens + (now - last) * policy.rate)
+        if tokens >= 1:
+            self.buckets[(uid, lane)] = (tokens - 1, now)
+            return 0.0
+        self.buckets[(uid, lane)] = (tokens, now)
+        return (1 - tokens) / policy.rate
+
+    def enter(self, lane: str, route_key: str, uid: str, cache_key: tuple):
+        policy = POLICIES[lane]
+        if lane != "priority":
+            if policy.sheddable and self.shared_in_flight >= OVERLOAD_INFLIGHT:
+                self.reject(lane, "overloaded", 2, cache_key)
+            if self.shared_in_flight >= SHARED_INFLIGHT:
+                self.reject(lane, "server busy", 1, cache_key)
+            if policy.concurrency is not None and self.route_in_flight.get(route_key, 0) >= policy.concurrency:
+                self.reject(lane, "route busy", 1, cache_key)
+            if policy.rate is not None:
+                wait_seconds = self.take_token(uid, lane, policy)
+                if wait_seconds:
+                    self.reject(lane, "rate limited", math.ceil(wait_seconds), cache_key)
+        self.in_flight += 1
+        if lane != "priority":
+            self.shared_in_flight += 1
+        self.route_in_flight[route_key] = self.route_in_flight.get(route_key, 0) + 1
+        self.stats[lane]["admitted"] += 1
+
+    def leave(self, lane: str, route_key: str):
+        self.in_flight -= 1
+        if lane != "priority":
+            self.shared_in_flight -= 1
+        self.route_in_flight[route_key] -= 1
+
+    def reject(self, lane: str, reason: str, retry_after: int, cache_key: tuple):
+        self.stats[lane]["rejected"] += 1
+        raise AdmissionRejected(lane, reason, retry_after, cache_key if POLICIES[lane].sheddable else None)
+
+    # --- Stale responses for shed polls ---
+
+    def remember(self, cache_key: tuple, body: bytes, media_type: str):
+        self.forget(cache_key)
+        if len(body) > STALE_MAX_BODY_BYTES:
+            return
+        self.stale[cache_key] = (time.monotonic(), body, media_type)
+        self.stale_bytes += len(body)
+        while len(self.stale) > STALE_CACHE_SIZE or self.stale_bytes > STALE_CACHE_MAX_BYTES:
+            _, (_, evicted, _) = self.stale.popitem(last=False)
+            self.stale_bytes -= len(evicted)
+
+    def forget(self, cache_key: tuple):
+        entry = self.stale.pop(cache_key, None)
+        if entry is not None:
+            self.stale_bytes -= len(entry[1])
+
+    def recall(self, lane: str, cache_key: tuple):
+        entry = self.stale.get(cache_key)
+        if entry is None or time.monotonic() - entry[0] > STALE_MAX_AGE_SECONDS:
+            return None
+        self.stats[lane]["stale"] += 1
+        return entry
+
+    def report(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "shared_in_flight": self.shared_in_flight,
+            "shared_limit": SHARED_INFLIGHT,
+            "overload_threshold": OVERLOAD_INFLIGHT,
+            "routes_in_flight": {k: v for k, v in self.route_in_flight.items() if v},
+            "stale_cache": {"entries": len(self.stale), "bytes": self.stale_bytes},
+            "lanes": self.stats,
+        }
+
+controller = AdmissionController()
+
+def request_identity(request: Request) -> tuple:
+    """(uid, route key, stale-cache key) for a request; uid is set by verify_firebase_token"""
+    uid = getattr(request.state, "uid", None) or (request.client.host if request.client else "anonymous")
+    route = request.scope.get("route")
+    route_key = route.path if route is not None else request.url.path
+    return uid, route_key, (uid, str(request.url))
+
+def enter_lane(request: Request, lane: str) -> str:
+    """Admits the request into `lane` or raises AdmissionRejected; returns the key to release"""
+    uid, route_key, cache_key = request_identity(request)
+    controller.enter(lane, route_key, uid, cache_key)
+    request.state.admission_lane = lane
+    return route_key
+
+def admit(lane: str):
+    """Route dependency, e.g. Depends(admit("poll")); holds the slot until the endpoint finishes"""
+    async def dependency(request: Request):
+        route_key = enter_lane(request, lane)
+        try:
+            yield
+        finally:
+            controller.leave(lane, route_key)
+    return dependency
+
+class AdmissionSlot:
+    """
+    A held admission slot that a streaming response can take over.
+    The endpoint returns before the body is sent, so the slot must outlive it.
+    """
+
+    def __init__(self, lane: str, route_key: str):
+        self.lane = lane
+        self.route_key = route_key
+        self.held = True
+        self.handed_off = False
+
+    def release(self):
+        if self.held:
+            self.held = False
+            controller.leave(self.lane, self.route_key)
+
+    def stream(self, iterator):
+        """Wraps a response body so the slot is released once it is fully sent or the client goes away"""
+        self.handed_off = True
+
+        async def body():
+            try:
+                if hasattr(iterator, "__aiter__"):
+                    async for chunk in iterator:
+                        yield chunk
+                else:
+                    # Sync generators run in the threadpool; release() still runs here, on the event loop
+                    async for chunk in iterate_in_threadpool(iterator):
+                        yield chunk
+            finally:
+                self.release()
+        return body()
+
+def admit_stream(lane: str):
+    """
+    Like admit(), for endpoints that return a StreamingResponse: the dependency
+    yields an AdmissionSlot and the endpoint passes its body through slot.stream().
+    If the endpoint fails before handing the body over, the slot is released here.
+    """
+    async def dependency(request: Request):
+        slot = AdmissionSlot(lane, enter_lane(request, lane))
+        try:
+            yield slot
+        finally:
+            if not slot.handed_off:
+                slot.release()
+    return dependency
+
+def admission_stats() -> dict:
+    return controller.report()
@@ -0,0 +1,115 @@
+from datetime import datetime, timedelta
+from app.services.timestamps import as_local, now_local, scheduled_time, schedule_fields
+
+# --- BOOKING STATE MACHINE ---
+# The single place that decides which staff/patient action is allowed from
+# which booking status, and what the booking looks like afterwards.
+#
+#   Pending Approval ──assign──> Waiting for Doctor ──complete──> Done
+#   Emergency En Route ─assign─┘        │
+#        any active ──delay──> Delayed ─┘ (assign / complete still allowed)
+#        any active ──cancel──> Cancelled
+#        any status ──delete──> (archived, removed from the live queue)
+
+ACTIVE_STATUSES = [
+    "Pending Approval", "Emergency En Route", "Waiting for Doctor",
+    "Waiting", "In Review", "Checked In", "Confirmed", "Booked", "Delayed"
+]
+TERMINAL_STATUSES = ["Cancelled", "Done"]
+
+# action -> statuses it may be applied from
+TRANSITIONS = {
+    "assign": ACTIVE_STATUSES,
+    "delay": [s for s in ACTIVE_STATUSES if s not in ["Pending Approval", "Emergency En Route"]],
+    "complete": ACTIVE_STATUSES,
+    "cancel": ACTIVE_STATUSES,
+    "delete": ACTIVE_STATUSES + TERMINAL_STATUSES,
+}
+
+# Actions that take the booking out of the live queue instead of updating it
+ARCHIVE_ACTIONS = ["delete"]
+
+DEFAULT_DELAY_MINUTES = 15
+MAX_DELAY_MINUTES = 24 * 60
+
+class InvalidTransition(Exception):
+    """Raised when an action isn't allowed from the booking's current status"""
+    pass
+
+def delay_minutes(value) -> int:
+    """The 'minutes' of a delay payload as a whole number between 1 and MAX_DELAY_MINUTES"""
+    if value is None:
+        return DEFAULT_DELAY_MINUTES
+    try:
+        if isinstance(value, bool) or float(value) != int(float(value)):
+            raise ValueError
+        minutes = int(float(value))
+    except (TypeError, ValueError, OverflowError):
+        raise InvalidTransition(f"Delay minutes must be a whole number, got {value!r}")
+    if not 1 <= minutes <= MAX_DELAY_MINUTES:
+        raise InvalidTransition(f"Delay minutes must be between 1 and {MAX_DELAY_MINUTES}, got {minutes}")
+    return minutes
+
+def plan_transition(current: dict, action: str, payload: dict = None, now: datetime = None) -> dict:
+    """
+    Returns the field updates for applying `action` to a booking in state `current`.
+    Pure function: the caller performs the write (inside a transaction).
+    Every update stamps status_changed_at; times are written as typed scheduled_at plus legacy "HH:MM".
+    """
+    payload = payload or {}
+    now = as_local(now) or now_local()
+    status = current.get("status", "Unknown")
+
+    if action not in TRANSITIONS:
+        raise InvalidTransition(f"Unknown action '{action}'")
+    if status not in TRANSITIONS[action]:
+        if status == "Cancelled":
+            raise InvalidTransition("Cannot update a cancelled booking. Please delete it or create a new one.")
+        raise InvalidTransition(f"Cannot '{action}' a booking that is '{status}'")
+
+    if action == "assign":
+        return {
+            "status": "Waiting for Doctor",
+            "status_changed_at": now,
+            "doctor_id": payload.get("doctor_id"),
+            "doctor_name": payload.get("doctor_name"),
+            **schedule_fields(now + timedelta(minutes=15))
+        }
+    if action == "delay":
+        minutes = delay_minutes(payload.get("minutes"))
+        current_dt = scheduled_time(current)
+        if current_dt is None:
+            raise InvalidTransition("Booking has no scheduled time to delay")
+        return {
+            "status": "Delayed",
+            "status_changed_at": now,
+            **schedule_fields(current_dt + timedelta(minutes=minutes)) # Full datetime, so 23:50 + 15 lands on the next day
+        }
+    if action == "complete":
+        return {"status": "Done", "status_changed_at": now}
+    if action == "cancel":
+        return {"status": "Cancelled", "status_changed_at": now, **schedule_fields(None)} # Reset time
+    return {}
+
+def apply_transition(transaction, doc_ref, action: str, payload: dict = None, now: datetime = None, archive=None):
+    """
+    Reads the booking and writes the planned transition through `transaction`, so
+    the status check and the write commit together (Firestore retries the whole
+    function if the booking changed in between).
+    For ARCHIVE_ACTIONS, archive(transaction, current, now) writes the archived
+    copy and returns it, and the live booking is deleted.
+    Returns (booking_before, updates), or None if the booking doesn't exist.
+    """
+    snap = doc_ref.get(transaction=transaction)
+    if not snap.exists:
+        return None
+    current = snap.to_dict()
+    updates = plan_transition(current, action, payload, now)
+
+    if action in ARCHIVE_ACTIONS:
+        entry = archive(transaction, current, now) if archive else updates
+        transaction.delete(doc_ref)
+        return current, entry
+
+    transaction.update(doc_ref, updates)
+    return current, updates
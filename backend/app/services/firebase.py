@@ -2,7 +2,12 @@ import firebase_admin
 from firebase_admin import credentials, firestore
 import os
 import json
+from datetime import datetime, timedelta
 from functools import lru_cache 
+from app.services.booking_state import apply_transition, ARCHIVE_ACTIONS, TERMINAL_STATUSES, ACTIVE_STATUSES
+from app.services.timestamps import typed_fields, created_time, status_changed_time, as_local, now_local, day_bounds
+from app.services.profiler import instrument_module
+from app.models.clinics import DEFAULT_CLINIC_ID
 
 # --- 1. EXISTING AUTH SETUP ---
 firebase_creds = os.getenv("FIREBASE_CREDENTIALS")
@@ -47,71 +52,224 @@ def get_system_prompt(prompt_id: str) -> str:
     }
     return defaults.get(prompt_id, "You are a helpful assistant.")
 
-# --- 3. QUEUE FUNCTIONS ---
+# --- 3. CLINIC PARTITIONING ---
+# Every clinic owns its own subcollections under clinics/{clinic_id}:
+#   clinics/{clinic_id}/queue     -> live bookings
+#   clinics/{clinic_id}/records   -> medical records
+#   clinics/{clinic_id}/patients  -> patient registry (one doc per patient_id)
+# A dashboard therefore only ever reads its own clinic's documents.
+# DEFAULT_CLINIC_ID is defined in app/models/clinics.py and re-exported here.
 
-def get_queue():
-    """Fetches all patients from Firestore"""
-    users_ref = db.collection('queue')
-    docs = users_ref.stream()
+def clinic_ref(clinic_id: str = DEFAULT_CLINIC_ID):
+    """Root document for a clinic partition"""
+    return db.collection('clinics').document(clinic_id or DEFAULT_CLINIC_ID)
+
+def queue_ref(clinic_id: str = DEFAULT_CLINIC_ID):
+    return clinic_ref(clinic_id).collection('queue')
+
+def records_ref(clinic_id: str = DEFAULT_CLINIC_ID):
+    return clinic_ref(clinic_id).collection('records')
+
+def patients_ref(clinic_id: str = DEFAULT_CLINIC_ID):
+    return clinic_ref(clinic_id).collection('patients')
+
+# --- 4. QUEUE FUNCTIONS ---
+
+def get_queue(clinic_id: str = DEFAULT_CLINIC_ID):
+    """Fetches all patients in a clinic's queue"""
+    docs = queue_ref(clinic_id).stream()
+    return [{**doc.to_dict(), "id": doc.id} for doc in docs]
+
+def get_patient_bookings(patient_id, clinic_id: str = None):
+    """
+    Fetches a single patient's bookings.
+    Without a clinic_id we use a collection group query so the patient sees
+    their bookings at every clinic (requires the patient_id group index).
+    """
+    if clinic_id:
+        query = queue_ref(clinic_id).where('patient_id', '==', patient_id)
+    else:
+        query = db.collection_group('queue').where('patient_id', '==', patient_id)
+    return [{**doc.to_dict(), "id": doc.id} for doc in query.stream()]
+
+def ensure_queue_timestamps(clinic_id: str = DEFAULT_CLINIC_ID):
+    """
+    The typed-field queries below can't see entries written before the typed
+    timestamps existed. Backfills them once per clinic per process, so a
+    missed scripts/migrate_timestamps.py run can't hide patients.
+    """
+    if clinic_id in _migrated_clinics:
+        return
+    migrated = migrate_queue_timestamps(clinic_id)
+    if migrated:
+        print(f"Backfilled typed timestamps on {migrated} queue entries in {clinic_id}")
+    _migrated_clinics.add(clinic_id)
+
+def get_todays_queue(day: str = None, clinic_id: str = DEFAULT_CLINIC_ID):
+    """Bookings made on `day` (default today) in arrival order, as one range query on created_ts"""
+    ensure_queue_timestamps(clinic_id)
+    start, end = day_bounds(day or now_local().strftime("%Y-%m-%d"))
+    docs = (queue_ref(clinic_id)
+            .where('created_ts', '>=', start)
+            .where('created_ts', '<', end)
+            .order_by('created_ts')
+            .stream())
     return [{**doc.to_dict(), "id": doc.id} for doc in docs]
 
-def add_to_queue(booking_data):
-    """Adds a new patient to Firestore"""
-    update_time, ref = db.collection('queue').add(booking_data)
+def get_next_patients(limit: int = 5, clinic_id: str = DEFAULT_CLINIC_ID):
+    """
+    The next `limit` active, scheduled bookings by scheduled start. Overdue
+    bookings come first, since they are still waiting; unscheduled ones are left out.
+    Needs the (status, scheduled_at) composite index in firestore.indexes.json.
+    """
+    ensure_queue_timestamps(clinic_id)
+    docs = (queue_ref(clinic_id)
+            .where('status', 'in', ACTIVE_STATUSES)
+            .where('scheduled_at', '!=', None)
+            .order_by('scheduled_at')
+            .limit(limit)
+            .stream())
+    return [{**doc.to_dict(), "id": doc.id} for doc in docs]
+
+def add_to_queue(booking_data, clinic_id: str = DEFAULT_CLINIC_ID):
+    """Adds a new patient to a clinic's queue (typed timestamps are filled in from the legacy fields)"""
+    booking_data = {**booking_data, **typed_fields(booking_data, new_booking=True), "clinic_id": clinic_id}
+    update_time, ref = queue_ref(clinic_id).add(booking_data)
+    rollup_arrival(booking_data, clinic_id)
     return {**booking_data, "id": ref.id}
 
-def update_booking_by_doc_id(doc_id, updates):
+def update_booking_by_doc_id(doc_id, updates, clinic_id: str = DEFAULT_CLINIC_ID):
     """Updates a document directly by its Firestore ID"""
     try:
-        doc_ref = db.collection('queue').document(doc_id)
+        doc_ref = queue_ref(clinic_id).document(doc_id)
         doc_ref.update(updates)
         return True
     except Exception as e:
         print(f"Error updating doc {doc_id}: {e}")
         return False
 
-def update_booking_in_db(patient_id, updates):
+def update_booking_in_db(patient_id, updates, clinic_id: str = DEFAULT_CLINIC_ID):
     """Finds a patient by ID and updates their status/time"""
-    docs = db.collection('queue').where('patient_id', '==', patient_id).stream()
+    docs = queue_ref(clinic_id).where('patient_id', '==', patient_id).stream()
     for doc in docs:
         doc.reference.update(updates)
         return True 
     return False
 
-def delete_booking(patient_id):
+def delete_booking(patient_id, clinic_id: str = DEFAULT_CLINIC_ID):
     """Finds a patient by ID and deletes the record"""
-    docs = db.collection('queue').where('patient_id', '==', patient_id).stream()
+    docs = queue_ref(clinic_id).where('patient_id', '==', patient_id).stream()
     for doc in docs:
         doc.reference.delete()
         return True
     return False
 
-def seed_queue(data):
+def seed_queue(data, clinic_id: str = DEFAULT_CLINIC_ID):
     """Resets the DB for demos"""
-    collection = db.collection('queue')
+    collection = queue_ref(clinic_id)
     for doc in collection.stream():
         doc.reference.delete()
     for item in data:
-        collection.add(item)
+        collection.add({**item, **typed_fields(item, new_booking=True), "clinic_id": clinic_id})
     return True
 
-# --- 4. RECORD FUNCTIONS ---
+def apply_booking_action(doc_id, action: str, payload: dict = None, clinic_id: str = DEFAULT_CLINIC_ID):
+    """
+    Applies a state-machine action to one booking as a single transaction:
+    the status check and the write commit together, so two conflicting
+    actions (e.g. cancel vs assign) can never both succeed.
+    Returns (booking_before, updates), or None if the booking doesn't exist.
+    Raises InvalidTransition if the action isn't allowed from the current status.
+    """
+    doc_ref = queue_ref(clinic_id).document(doc_id)
 
-def add_patient_record(data):
-    """Saves a new medical record"""
-    db.collection('records').add(data)
+    def archive(transaction, current, now):
+        entry = build_archive_entry(current, action, now)
+        day_ref = archive_day_ref(entry["archived_date"], clinic_id)
+        transaction.set(day_ref.collection('bookings').document(doc_id), entry)
+        transaction.set(day_ref, {"date": entry["archived_date"], "clinic_id": clinic_id, "count": firestore.Increment(1)}, merge=True)
+        return entry
+
+    @firestore.transactional
+    def run(transaction):
+        return apply_transition(transaction, doc_ref, action, payload, now_local(), archive)
+
+    result = run(db.transaction())
+    if result is None:
+        return None
+
+    # Rollups are derived data; update them once the transaction has committed
+    current, updates = result
+    if action in ARCHIVE_ACTIONS:
+        rollup_finished(updates, clinic_id)
+    elif action == "delay":
+        rollup_delay(current, clinic_id)
+    return current, updates
+
+TIMESTAMP_BATCH_SIZE = 400 # Firestore caps a batch at 500 writes
+_migrated_clinics = set() # Clinics whose queue has been backfilled by this process
+
+def migrate_queue_timestamps(clinic_id: str = DEFAULT_CLINIC_ID):
+    """
+    Backfills created_ts / scheduled_at / status_changed_at on queue entries
+    written before the typed fields existed. Idempotent; returns how many were updated.
+    """
+    batch = db.batch()
+    pending = 0
+    migrated = 0
+    for doc in queue_ref(clinic_id).stream():
+        data = doc.to_dict()
+        if data.get("created_ts") is not None:
+            continue
+        batch.update(doc.reference, typed_fields(data))
+        pending += 1
+        migrated += 1
+        if pending == TIMESTAMP_BATCH_SIZE:
+            batch.commit()
+            batch = db.batch()
+            pending = 0
+    if pending:
+        batch.commit()
+    return migrated
+
+def reset_clinic(clinic_id: str = DEFAULT_CLINIC_ID):
+    """Deletes a clinic's queue, records, registry and archive (demo reset)"""
+    for collection in (queue_ref(clinic_id), records_ref(clinic_id), patients_ref(clinic_id),
+                       clinic_ref(clinic_id).collection('health_pulse')):
+        for doc in collection.stream():
+            doc.reference.delete()
+    for day_doc in clinic_ref(clinic_id).collection('archive').stream():
+        for doc in day_doc.reference.collection('bookings').stream():
+            doc.reference.delete()
+        day_doc.reference.delete()
     return True
 
-def get_patient_records(patient_id):
+# --- 5. RECORD FUNCTIONS ---
+
+# Extra callbacks run after every record write: fn(record_id, data, clinic_id).
+# Used by in-process derived data (e.g. the search index) that can't be imported here.
+record_listeners = []
+
+def add_patient_record(data, clinic_id: str = DEFAULT_CLINIC_ID):
+    """Saves a new medical record, keeps the patient registry current and returns the new doc ID"""
+    # created_at is the search index's catch-up cursor, so every record must carry one
+    data = {"created_at": datetime.now().isoformat(), **data, "clinic_id": clinic_id}
+    update_time, ref = records_ref(clinic_id).add(data)
+    upsert_patient_registry(data, clinic_id)
+    rollup_record(data, clinic_id)
+    for listener in record_listeners:
+        listener(ref.id, data, clinic_id)
+    return ref.id
+
+def get_patient_records(patient_id, clinic_id: str = DEFAULT_CLINIC_ID):
     """Fetches medical history for a patient"""
-    docs = db.collection('records').where('patient_id', '==', patient_id).stream()
+    docs = records_ref(clinic_id).where('patient_id', '==', patient_id).stream()
     records = [{**doc.to_dict(), "id": doc.id} for doc in docs]
     records.sort(key=lambda x: x.get('created_at', x.get('date', '')), reverse=True)
     return records
 
-def seed_records(patient_id):
+def seed_records(patient_id, clinic_id: str = DEFAULT_CLINIC_ID):
     """Seeds dummy records for the demo user if none exist"""
-    records_ref = db.collection('records')
     dummy_data = [
         {
             "patient_id": patient_id,
@@ -132,34 +290,378 @@ def seed_records(patient_id):
             "type": "Check-up"
         }
     ]
-    for data in dummy_data:
-        records_ref.add(data)
+    # Newest visit gets the newest created_at, so the history sorts the same way as by date
+    now = datetime.now()
+    for i, data in enumerate(dummy_data):
+        add_patient_record({**data, "created_at": (now - timedelta(seconds=i)).isoformat()}, clinic_id)
     return True
 
-def get_unique_patients():
-    docs = db.collection('records').stream()
+EXPORT_PAGE_SIZE = 500
+IMPORT_BATCH_SIZE = 150 # Up to 3 writes per record (record, registry, rollup); Firestore caps a batch at 500
+
+def iter_records(clinic_id: str = DEFAULT_CLINIC_ID, after: str = None, page_size: int = EXPORT_PAGE_SIZE):
+    """
+    Streams every record in the clinic in document-ID order, one page in memory at a time.
+    Pass the last ID you received as `after` to resume an interrupted export.
+    """
+    query = records_ref(clinic_id).order_by('__name__').limit(page_size)
+    page = query.start_after({'__name__': records_ref(clinic_id).document(after)}) if after else query
+    while True:
+        docs = list(page.stream())
+        for doc in docs:
+            yield {**doc.to_dict(), "id": doc.id}
+        if len(docs) < page_size:
+            return
+        page = query.start_after(docs[-1])
+
+def import_records_batch(records: list, clinic_id: str = DEFAULT_CLINIC_ID):
+    """
+    Bulk version of add_patient_record for up to IMPORT_BATCH_SIZE records.
+    Records, registry entries and rollup counters go out in a single batch commit.
+    Returns (new record IDs, patients that were already registered).
+    """
+    batch = db.batch()
+    written = []
     registry = {}
-    for doc in docs:
+    records_per_day = {}
+    for data in records:
+        data = {**data, "clinic_id": clinic_id}
+        ref = records_ref(clinic_id).document()
+        batch.set(ref, data)
+        written.append((ref.id, data))
+
+        pid = data.get("patient_id")
+        if pid:
+            entry = build_registry_entry(data)
+            if registry_entry_should_update(registry.get(pid), entry["patient_name"], entry["last_visit"]):
+                registry[pid] = entry
+        day = str(data.get("date") or datetime.now().strftime("%Y-%m-%d"))
+        records_per_day[day] = records_per_day.get(day, 0) + 1
+
+    # One read for every patient in the chunk, then the usual precedence rules
+    known_patients = []
+    for snapshot in db.get_all([patients_ref(clinic_id).document(pid) for pid in registry]):
+        current = snapshot.to_dict() if snapshot.exists else None
+        if current is not None:
+            known_patients.append(snapshot.id)
+        entry = registry[snapshot.id]
+        if registry_entry_should_update(current, entry["patient_name"], entry["last_visit"]):
+            batch.set(snapshot.reference, entry)
+
+    for day, count in records_per_day.items():
+        batch.set(rollups_ref(clinic_id).document(day), {
+            "date": day,
+            "clinic_id": clinic_id,
+            "records": firestore.Increment(count)
+        }, merge=True)
+
+    batch.commit()
+    for record_id, data in written:
+        for listener in record_listeners:
+            listener(record_id, data, clinic_id)
+    return [record_id for record_id, _ in written], known_patients
+
+# --- 6. PATIENT REGISTRY ---
+# One small doc per patient, maintained on every record write, so the
+# Patients page reads O(patients) instead of streaming every record.
+
+def registry_entry_should_update(current, name, date):
+    """Same precedence rules the registry has always used: real names win, then newest visit"""
+    if current is None:
+        return True
+    if (current.get('patient_name') in ["Unknown", "----"]) and (name not in ["Unknown", "----"]):
+        return True
+    return date > current.get('last_visit', "0000-00-00")
+
+def build_registry_entry(data):
+    return {
+        "patient_id": data.get("patient_id"),
+        "patient_name": data.get("patient_name", "Unknown"),
+        "last_visit": data.get("date", "0000-00-00"),
+        "last_diagnosis": data.get("diagnosis"),
+        "last_doctor": data.get("doctor")
+    }
+
+def upsert_patient_registry(data, clinic_id: str = DEFAULT_CLINIC_ID):
+    """Folds a single record into the clinic's patient registry"""
+    pid = data.get("patient_id")
+    if not pid:
+        return False
+    doc_ref = patients_ref(clinic_id).document(pid)
+    snapshot = doc_ref.get()
+    current = snapshot.to_dict() if snapshot.exists else None
+    entry = build_registry_entry(data)
+    if registry_entry_should_update(current, entry["patient_name"], entry["last_visit"]):
+        doc_ref.set(entry)
+        return True
+    return False
+
+def rebuild_patient_registry(clinic_id: str = DEFAULT_CLINIC_ID):
+    """Recomputes the registry from the clinic's records (migrations / repairs)"""
+    registry = {}
+    for doc in records_ref(clinic_id).stream():
         data = doc.to_dict()
         pid = data.get("patient_id")
         if not pid: continue
-        name = data.get("patient_name", "Unknown")
-        date = data.get("date", "0000-00-00")
-        should_update = False
-        if pid not in registry:
-            should_update = True
-        else:
-            current = registry[pid]
-            if (current['patient_name'] in ["Unknown", "----"]) and (name not in ["Unknown", "----"]):
-                should_update = True
-            elif date > current['last_visit']:
-                should_update = True
-        if should_update:
-            registry[pid] = {
-                "patient_id": pid,
-                "patient_name": name,
-                "last_visit": date,
-                "last_diagnosis": data.get("diagnosis"),
-                "last_doctor": data.get("doctor")
-            }
-    return sorted(list(registry.values()), key=lambda x: x['patient_name'])
\ No newline at end of file
+        entry = build_registry_entry(data)
+        if registry_entry_should_update(registry.get(pid), entry["patient_name"], entry["last_visit"]):
+            registry[pid] = entry
+
+    batch = db.batch()
+    pending = 0
+    for pid, entry in registry.items():
+        batch.set(patients_ref(clinic_id).document(pid), entry)
+        pending += 1
+        if pending == 400: # Firestore caps a batch at 500 writes
+            batch.commit()
+            batch = db.batch()
+            pending = 0
+    if pending:
+        batch.commit()
+    return len(registry)
+
+def get_unique_patients(clinic_id: str = DEFAULT_CLINIC_ID):
+    """Returns the clinic's patient registry, sorted by name"""
+    docs = patients_ref(clinic_id).order_by('patient_name').stream()
+    return [doc.to_dict() for doc in docs]
+
+# --- 7. BOOKING ARCHIVE (COLD STORAGE) ---
+# Finished bookings are moved out of the live queue so the collection every
+# dashboard poll scans only holds active patients. The archive is partitioned
+# by day: clinics/{clinic_id}/archive/{YYYY-MM-DD}/bookings/{doc_id}
+
+ARCHIVE_BATCH_SIZE = 160 # Up to 3 writes per booking (archive + delete + day header); Firestore caps a batch at 500
+
+def archive_day_ref(day: str, clinic_id: str = DEFAULT_CLINIC_ID):
+    return clinic_ref(clinic_id).collection('archive').document(day)
+
+def booking_day(data) -> str:
+    """Partition key: the day the booking was created (falls back to today)"""
+    return (created_time(data) or now_local()).strftime("%Y-%m-%d")
+
+def build_archive_entry(data, reason: str, now: datetime):
+    now = as_local(now)
+    entry = {
+        **data,
+        "final_status": data.get("status"),
+        "archived_reason": reason,
+        "archived_at": now.isoformat(),
+        "archived_date": booking_day(data),
+        "wait_minutes": None
+    }
+    # A finished booking waited until its last status change (Done/Cancelled), not until
+    # whenever the sweep ran. A live booking removed directly leaves the queue now.
+    created_dt = created_time(data)
+    ended_dt = status_changed_time(data) if data.get("status") in TERMINAL_STATUSES else now
+    if created_dt is not None and ended_dt is not None:
+        entry["wait_minutes"] = round((ended_dt - created_dt).total_seconds() / 60, 1)
+    return entry
+
+def archive_bookings(snapshots, reason: str, clinic_id: str = DEFAULT_CLINIC_ID):
+    """
+    Moves queue snapshots into the archive with batched writes.
+    Each booking's copy and delete share a batch, so a booking is never in both places.
+    """
+    now = now_local()
+    batch = db.batch()
+    pending = 0
+    per_day = {}
+    entries = []
+
+    def commit():
+        # Day headers keep a running count so the archive can be listed cheaply;
+        # they commit with the bookings they count
+        for day, count in per_day.items():
+            batch.set(archive_day_ref(day, clinic_id), {
+                "date": day,
+                "clinic_id": clinic_id,
+                "count": firestore.Increment(count)
+            }, merge=True)
+        batch.commit()
+        per_day.clear()
+
+    for snap in snapshots:
+        entry = build_archive_entry(snap.to_dict(), reason, now)
+        entries.append(entry)
+        day = entry["archived_date"]
+        batch.set(archive_day_ref(day, clinic_id).collection('bookings').document(snap.id), entry)
+        batch.delete(snap.reference)
+        per_day[day] = per_day.get(day, 0) + 1
+        pending += 1
+        if pending == ARCHIVE_BATCH_SIZE:
+            commit()
+            batch = db.batch()
+            pending = 0
+    if pending:
+        commit()
+
+    for entry in entries:
+        rollup_finished(entry, clinic_id)
+    return len(entries)
+
+def archive_terminal_bookings(clinic_id: str = DEFAULT_CLINIC_ID):
+    """Sweeps every finished booking out of the live queue"""
+    docs = queue_ref(clinic_id).where('status', 'in', TERMINAL_STATUSES).stream()
+    return archive_bookings(docs, "sweep", clinic_id)
+
+def get_archived_bookings(day: str, clinic_id: str = DEFAULT_CLINIC_ID):
+    """Fetches all archived bookings for one day"""
+    docs = archive_day_ref(day, clinic_id).collection('bookings').stream()
+    return [{**doc.to_dict(), "id": doc.id} for doc in docs]
+
+def iter_archived_bookings(start_day: str, end_day: str, clinic_id: str = DEFAULT_CLINIC_ID):
+    """Yields archived bookings day by day (inclusive range of YYYY-MM-DD strings)"""
+    day = datetime.strptime(start_day, "%Y-%m-%d")
+    last = datetime.strptime(end_day, "%Y-%m-%d")
+    while day <= last:
+        for entry in get_archived_bookings(day.strftime("%Y-%m-%d"), clinic_id):
+            yield entry
+        day += timedelta(days=1)
+
+# --- 8. DAILY ANALYTICS ROLLUPS ---
+# One compact doc per clinic per day, bumped with atomic increments as the
+# queue changes: clinics/{clinic_id}/rollups/{YYYY-MM-DD}
+# Trend charts then read N small docs with a single range query.
+
+# Upper edges (minutes) of the wait-time histogram; the last bucket is open-ended
+WAIT_BUCKETS = [5, 10, 15, 20, 30, 45, 60, 90, 120, 180, 240]
+
+def rollups_ref(clinic_id: str = DEFAULT_CLINIC_ID):
+    return clinic_ref(clinic_id).collection('rollups')
+
+def score_label(score) -> str:
+    """'High (8/10)' -> 'High'"""
+    score_str = str(score or "Routine")
+    return score_str.split(" ")[0] if " " in score_str else score_str
+
+def wait_bucket(minutes: float) -> str:
+    for edge in WAIT_BUCKETS:
+        if minutes < edge:
+            return f"lt_{edge}"
+    return f"gte_{WAIT_BUCKETS[-1]}"
+
+def bump_rollup(day: str, counters: dict, clinic_id: str = DEFAULT_CLINIC_ID):
+    """Applies nested counter increments to a day's rollup doc (creates it if needed)"""
+    def as_increments(values):
+        return {k: as_increments(v) if isinstance(v, dict) else firestore.Increment(v) for k, v in values.items()}
+    try:
+        rollups_ref(clinic_id).document(day).set({
+            "date": day,
+            "clinic_id": clinic_id,
+            **as_increments(counters)
+        }, merge=True)
+    except Exception as e:
+        # Rollups are best-effort; never fail the write that triggered them
+        print(f"Rollup error ({clinic_id}/{day}): {e}")
+
+def rollup_arrival(booking_data, clinic_id: str = DEFAULT_CLINIC_ID):
+    created_dt = created_time(booking_data) or now_local()
+    counters = {
+        "arrivals": 1,
+        "categories": {score_label(booking_data.get("score")): 1},
+        "hourly": {created_dt.strftime("%H"): 1}
+    }
+    if booking_data.get("urgent"):
+        counters["urgent"] = 1
+    bump_rollup(booking_day(booking_data), counters, clinic_id)
+
+def rollup_delay(booking_data, clinic_id: str = DEFAULT_CLINIC_ID):
+    bump_rollup(booking_day(booking_data), {"delays": 1}, clinic_id)
+
+def rollup_finished(archive_entry, clinic_id: str = DEFAULT_CLINIC_ID):
+    counters = {"finished": {str(archive_entry.get("final_status") or "Unknown"): 1}}
+    if archive_entry.get("wait_minutes") is not None:
+        counters["wait_histogram"] = {wait_bucket(archive_entry["wait_minutes"]): 1}
+        counters["wait_total_minutes"] = archive_entry["wait_minutes"]
+        counters["wait_count"] = 1
+    bump_rollup(archive_entry["archived_date"], counters, clinic_id)
+
+def rollup_record(record_data, clinic_id: str = DEFAULT_CLINIC_ID):
+    day = str(record_data.get("date") or datetime.now().strftime("%Y-%m-%d"))
+    bump_rollup(day, {"records": 1}, clinic_id)
+
+def wait_percentile(histogram: dict, pct: float):
+    """Estimates a percentile (upper bucket edge) from a rollup's wait histogram"""
+    total = sum(histogram.values()) if histogram else 0
+    if total == 0:
+        return None
+    target = total * pct / 100
+    running = 0
+    for edge in WAIT_BUCKETS:
+        running += histogram.get(f"lt_{edge}", 0)
+        if running >= target:
+            return edge
+    return WAIT_BUCKETS[-1]
+
+def get_rollups(start_day: str, end_day: str, clinic_id: str = DEFAULT_CLINIC_ID):
+    """Fetches a date range of rollup docs in one query (inclusive, YYYY-MM-DD)"""
+    docs = (rollups_ref(clinic_id)
+            .where('date', '>=', start_day)
+            .where('date', '<=', end_day)
+            .order_by('date')
+            .stream())
+    return [doc.to_dict() for doc in docs]
+
+def rebuild_rollup(day: str, clinic_id: str = DEFAULT_CLINIC_ID):
+    """Recomputes one day's rollup from the archive, live queue and records (backfills / repairs)"""
+    rollups_ref(clinic_id).document(day).delete()
+    bookings = get_archived_bookings(day, clinic_id)
+    bookings += [b for b in get_queue(clinic_id) if booking_day(b) == day]
+    for booking in bookings:
+        rollup_arrival(booking, clinic_id)
+        if booking.get("status") == "Delayed" or booking.get("final_status") == "Delayed":
+            rollup_delay(booking, clinic_id)
+        if booking.get("archived_date"):
+            rollup_finished(booking, clinic_id)
+    for _ in records_ref(clinic_id).where('date', '==', day).stream():
+        rollup_record({"date": day}, clinic_id)
+    return len(bookings)
+
+# --- 9. BACKGROUND JOBS & PRECOMPUTED RESULTS ---
+# Job state is persisted so a restart re-queues unfinished work.
+# Jobs use deterministic IDs, so repeat triggers for the same patient coalesce.
+
+def jobs_ref():
+    return db.collection('jobs')
+
+def save_job(job_id: str, data: dict):
+    jobs_ref().document(job_id).set({**data, "updated_at": datetime.now().isoformat()}, merge=True)
+    return True
+
+def get_job(job_id: str):
+    doc = jobs_ref().document(job_id).get()
+    return {**doc.to_dict(), "id": doc.id} if doc.exists else None
+
+def get_unfinished_jobs():
+    """Jobs that were pending or mid-run when the server last stopped"""
+    docs = jobs_ref().where('status', 'in', ["pending", "running"]).stream()
+    return [{**doc.to_dict(), "id": doc.id} for doc in docs]
+
+def health_pulse_ref(clinic_id: str = DEFAULT_CLINIC_ID):
+    return clinic_ref(clinic_id).collection('health_pulse')
+
+def save_health_pulse(patient_id, analysis: dict, record_count: int, clinic_id: str = DEFAULT_CLINIC_ID):
+    health_pulse_ref(clinic_id).document(patient_id).set({
+        "analysis": analysis,
+        "record_count": record_count,
+        "generated_at": datetime.now().isoformat()
+    })
+    return True
+
+def get_health_pulse(patient_id, clinic_id: str = DEFAULT_CLINIC_ID):
+    """Returns the stored Health Pulse doc, or None if it was never generated"""
+    doc = health_pulse_ref(clinic_id).document(patient_id).get()
+    return doc.to_dict() if doc.exists else None
+
+# Functions that talk to Firestore record a span on the current request (see app/services/profiler.py).
+# Add new I/O functions here; refs and pure helpers are left out on purpose.
+instrument_module(globals(), "firestore", [
+    "get_queue", "get_patient_bookings", "ensure_queue_timestamps", "get_todays_queue", "get_next_patients",
+    "add_to_queue", "update_booking_by_doc_id", "update_booking_in_db", "delete_booking", "seed_queue",
+    "apply_booking_action", "migrate_queue_timestamps", "reset_clinic",
+    "add_patient_record", "get_patient_records", "seed_records", "import_records_batch",
+    "upsert_patient_registry", "rebuild_patient_registry", "get_unique_patients",
+    "archive_bookings", "archive_terminal_bookings", "get_archived_bookings",
+    "bump_rollup", "get_rollups", "rebuild_rollup",
+    "save_job", "get_job", "get_unfinished_jobs", "save_health_pulse", "get_health_pulse",
+])
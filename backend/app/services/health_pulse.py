@@ -0,0 +1,44 @@
+from app.services.firebase import get_patient_records, seed_records, get_health_pulse, save_health_pulse, DEFAULT_CLINIC_ID
+from app.services.llm import analyze_patient_health
+
+def is_fallback_pulse(analysis) -> bool:
+    """analyze_patient_health returns an "Unknown" placeholder instead of raising when the LLM fails"""
+    return analysis is None or analysis.get("status") == "Unknown"
+
+def build_health_pulse(patient_id: str, clinic_id: str = DEFAULT_CLINIC_ID, records: list = None) -> dict:
+    """
+    Runs the Llama 3 Health Pulse for a patient and stores the result.
+    Pass `records` when the caller has already fetched them.
+    """
+    if records is None:
+        records = get_patient_records(patient_id, clinic_id)
+
+    analysis = analyze_patient_health(records)
+
+    # Only persist real answers; the LLM fallback shouldn't stick around as "precomputed"
+    if not is_fallback_pulse(analysis):
+        save_health_pulse(patient_id, analysis, len(records), clinic_id)
+    return analysis
+
+def read_health_pulse(patient_id: str, clinic_id: str = DEFAULT_CLINIC_ID, records: list = None) -> dict:
+    """
+    Serves the precomputed Health Pulse, generating it on demand only if none exists yet.
+    """
+    stored = get_health_pulse(patient_id, clinic_id)
+    if stored:
+        return stored["analysis"]
+
+    if records is None:
+        records = get_patient_records(patient_id, clinic_id)
+    # If no records, seed them so the demo looks good
+    if not records:
+        seed_records(patient_id, clinic_id)
+        records = get_patient_records(patient_id, clinic_id)
+
+    return build_health_pulse(patient_id, clinic_id, records)
+
+def refresh_health_pulse(payload: dict):
+    """Job handler: raises on the LLM fallback so the job queue retries instead of marking it done"""
+    analysis = build_health_pulse(payload["patient_id"], payload["clinic_id"])
+    if is_fallback_pulse(analysis):
+        raise RuntimeError("Health Pulse generation failed; the stored pulse was left as it was")
@@ -0,0 +1,158 @@
+import asyncio
+import os
+from datetime import datetime
+from app.services.firebase import save_job, get_unfinished_jobs
+from app.services.health_pulse import refresh_health_pulse
+
+# --- BACKGROUND JOB QUEUE ---
+# A small asyncio worker pool for work that shouldn't sit on a request's
+# critical path (e.g. regenerating a Health Pulse after a new record).
+# Handlers are plain sync functions; they run in threads so the blocking
+# Firestore/Groq clients don't stall the event loop.
+
+JOB_CONCURRENCY = int(os.getenv("JOB_CONCURRENCY", "2"))
+MAX_ATTEMPTS = 3
+RETRY_BASE_SECONDS = 10 # Failed attempts wait 10s, then 20s, so a brief Groq outage can pass
+
+# Handlers raise on failure (including LLM fallbacks) so the retry path runs
+JOB_HANDLERS = {
+    "health_pulse": refresh_health_pulse,
+}
+
+_queue = None
+_loop = None # The event loop the workers run on; sync route handlers enqueue from threadpool threads
+_workers = []
+_queued_ids = set() # Coalesces repeat triggers while a job is still waiting
+_running_ids = set() # A job never runs on two workers at once
+_rerun = {} # job_id -> latest payload, for triggers that arrived mid-run (one re-run, not one per trigger)
+
+def make_job_id(kind: str, key: str) -> str:
+    return f"{kind}__{key}".replace("/", "_")
+
+def enqueue_job(kind: str, key: str, payload: dict) -> str:
+    """
+    Persists a job and hands it to the worker pool.
+    If the pool isn't running (e.g. in a script) the job stays 'pending'
+    and is picked up on the next server start.
+    """
+    job_id = make_job_id(kind, key)
+    save_job(job_id, {
+        "kind": kind,
+        "payload": payload,
+        "status": "pending",
+        "attempts": 0,
+        "error": None,
+        "created_at": datetime.now().isoformat()
+    })
+    _dispatch_threadsafe(job_id, kind, payload, 0)
+    return job_id
+
+def job_in_flight(kind: str, key: str) -> bool:
+    """True while the job is waiting in the queue or running"""
+    job_id = make_job_id(kind, key)
+    return job_id in _queued_ids or job_id in _running_ids
+
+def _dispatch_threadsafe(job_id: str, kind: str, payload: dict, attempts: int):
+    """The queue and the coalescing sets belong to the event loop; other threads hand off to it"""
+    loop = _loop
+    if loop is None:
+        return
+    try:
+        on_loop = asyncio.get_running_loop() is loop
+    except RuntimeError:
+        on_loop = False
+    if on_loop:
+        _dispatch(job_id, kind, payload, attempts)
+    else:
+        loop.call_soon_threadsafe(_dispatch, job_id, kind, payload, attempts)
+
+def _dispatch(job_id: str, kind: str, payload: dict, attempts: int):
+    if _queue is None or job_id in _queued_ids:
+        return
+    if job_id in _running_ids:
+        # Re-run once after the current run, so the result reflects the newest data
+        _rerun[job_id] = payload
+        return
+    _queued_ids.add(job_id)
+    _queue.put_nowait((job_id, kind, payload, attempts))
+
+def _retry_later(job_id: str, kind: str, payload: dict, attempts: int):
+    """Re-queues a failed job after a backoff; it counts as queued meanwhile, so new triggers coalesce into it"""
+    queue = _queue
+    if queue is None:
+        return
+    _queued_ids.add(job_id)
+
+    def requeue():
+        if _queue is queue:
+            queue.put_nowait((job_id, kind, payload, attempts))
+    _loop.call_later(RETRY_BASE_SECONDS * 2 ** (attempts - 1), requeue)
+
+async def _run_job(job_id: str, kind: str, payload: dict, attempts: int):
+    """Returns the attempt count to retry with, or None when the job is finished"""
+    handler = JOB_HANDLERS.get(kind)
+    if handler is None:
+        save_job(job_id, {"status": "failed", "error": f"Unknown job kind: {kind}"})
+        return None
+
+    attempts += 1
+    save_job(job_id, {"status": "running", "attempts": attempts})
+    try:
+        await asyncio.to_thread(handler, payload)
+        save_job(job_id, {"status": "done", "error": None})
+    except Exception as e:
+        print(f"Job {job_id} failed (attempt {attempts}): {e}")
+        if attempts < MAX_ATTEMPTS:
+            save_job(job_id, {"status": "pending", "error": str(e)})
+            return attempts
+        save_job(job_id, {"status": "failed", "error": str(e)})
+    return None
+
+async def _worker():
+    while True:
+        job_id, kind, payload, attempts = await _queue.get()
+        _queued_ids.discard(job_id)
+        _running_ids.add(job_id)
+        retry_attempts = None
+        try:
+            retry_attempts = await _run_job(job_id, kind, payload, attempts)
+        except Exception as e:
+            print(f"Job worker error on {job_id}: {e}")
+        finally:
+            _running_ids.discard(job_id)
+            if job_id in _rerun:
+                # A newer trigger supersedes any retry of the run that just ended
+                _dispatch(job_id, kind, _rerun.pop(job_id), 0)
+            elif retry_attempts is not None:
+                _retry_later(job_id, kind, payload, retry_attempts)
+            _queue.task_done()
+
+async def start_workers():
+    """Starts the worker pool and re-queues jobs left over from the last run"""
+    global _queue, _loop
+    _queue = asyncio.Queue()
+    _loop = asyncio.get_running_loop()
+    for _ in range(JOB_CONCURRENCY):
+        _workers.append(asyncio.create_task(_worker()))
+
+    try:
+        leftovers = await asyncio.to_thread(get_unfinished_jobs)
+    except Exception as e:
+        print(f"Could not load unfinished jobs: {e}")
+        leftovers = []
+    for job in leftovers:
+        _dispatch(job["id"], job.get("kind"), job.get("payload", {}), job.get("attempts", 0))
+    print(f"Job queue online: {JOB_CONCURRENCY} workers, {len(leftovers)} jobs resumed")
+
+async def stop_workers():
+    """Cancels the workers; unfinished jobs stay persisted and resume on next start"""
+    global _queue, _loop
+    for task in _workers:
+        task.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
+    _queued_ids.clear()
+    _running_ids.clear()
+    _rerun.clear()
+    _queue = None
+    _loop = None
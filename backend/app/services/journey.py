@@ -0,0 +1,64 @@
+from datetime import datetime
+from typing import List
+from app.models.queue import JourneyItem
+from app.services.firebase import DEFAULT_CLINIC_ID
+from app.services.timestamps import created_time, scheduled_time, clock_label
+
+EPOCH = datetime.fromtimestamp(0).astimezone()
+
+def build_journey(my_bookings: list) -> List[JourneyItem]:
+    """
+    Turns a patient's raw bookings into Journey Tracker cards (newest first).
+    Shared by /navigator/status and the Home bundle.
+    """
+    # Newest first; typed created_ts when present, parsed created_at otherwise
+    my_bookings.sort(key=lambda x: created_time(x) or EPOCH, reverse=True)
+    
+    results = []
+    
+    for entry in my_bookings:
+        status = entry.get("status", "Unknown")
+        score = entry.get("score", "Standard")
+        
+        # ... (keep existing color/advice logic) ...
+        # Default
+        color = "green"
+        advice = "Please arrive on time."
+        display_time = clock_label(scheduled_time(entry))
+
+        if status == "Delayed":
+            color = "red"
+            advice = "⚠ CLINIC DELAYED. We apologize for the wait."
+        elif status == "Pending Approval":
+            color = "gray"
+            advice = "Pending approval. Please be patient."
+            display_time = "--:--"
+        elif entry.get("urgent") or "Critical" in str(score) or status == "Emergency En Route":
+            color = "red"
+            advice = "Emergency Team Notified. Proceed immediately."
+        elif status in ["Confirmed", "Booked"]:
+            color = "teal"
+            advice = "Appointment set. Please read details and don't miss your next appointment."
+        elif status == "Cancelled":
+            color = "gray"
+            advice = "This appointment has been cancelled."
+        elif status == "Done":
+            color = "teal"
+            advice = "Visit complete. Check My Records for your prescription."
+        elif status == "Waiting":
+            color = "orange"
+            advice = "You are in the queue."
+
+        results.append(JourneyItem(
+            id=entry.get("id"), # <--- CRITICAL FIX: Pass the Firestore Doc ID
+            clinic_id=entry.get("clinic_id", DEFAULT_CLINIC_ID),
+            status=status,
+            symptoms=entry.get("symptoms", "General Checkup"),
+            estimated_time=display_time,
+            advice=advice,
+            color_code=color,
+            ticket_score=score,
+            queue_position=0 
+        ))
+
+    return results
@@ -3,6 +3,12 @@ import json
 from groq import Groq
 from dotenv import load_dotenv
 from app.services.firebase import get_system_prompt # Import new function
+from app.services.profiler import instrument_module, traced
+from app.services.triage_prompt import format_triage_messages
+from app.services.llm_output import (
+    parse_structured, parse_structured_list, clean_text,
+    TRIAGE_SCHEMA, HEALTH_SUMMARY_SCHEMA, INSIGHT_SCHEMA
+)
 
 load_dotenv(".env.groq")
 
@@ -10,56 +16,76 @@ load_dotenv(".env.groq")
 client = Groq(
     api_key=os.environ.get("GROQ_API_KEY"),
 )
+# Time each Groq round trip separately from the helper that made it
+client.chat.completions.create = traced(client.chat.completions.create, "groq")
+
+TRIAGE_MODEL = "llama-3.1-8b-instant"
+
+TRIAGE_FALLBACK = {
+    "reply_message": "Eish, my connection is a bit slow. Please tell me your symptoms again.",
+    "show_booking": False
+}
+
+def make_reask(messages: list, bad_reply: str, **create_kwargs):
+    """Last-resort retry for the output layer: shows the model its bad reply and asks again"""
+    def reask(hint: str) -> str:
+        completion = client.chat.completions.create(
+            messages=messages + [
+                {"role": "assistant", "content": bad_reply or ""},
+                {"role": "user", "content": hint}
+            ],
+            **create_kwargs
+        )
+        return completion.choices[0].message.content
+    return reask
+
+def triage_post_fix(raw: dict, result: dict) -> dict:
+    """A red assessment that forgot `show_booking` should still offer the booking"""
+    if result.get("color_code") == "red" and "show_booking" not in raw:
+        result["show_booking"] = True
+    return result
+
+def build_triage_messages(patient_name: str, history: list, age: int = None, gender: str = None, prompt_template: str = None) -> list:
+    """
+    Builds the chat messages for the Nurse Nandiphiwe persona.
+    `prompt_template` overrides the Firestore 'triage_nurse' prompt.
+    """
+    raw_template = prompt_template if prompt_template is not None else get_system_prompt("triage_nurse")
+    return format_triage_messages(raw_template, patient_name, history, age, gender)
+
+def run_triage_completion(messages: list) -> tuple:
+    """Raw triage completion: returns (content string, usage dict). Raises on API errors."""
+    completion = client.chat.completions.create(
+        messages=messages,
+        model=TRIAGE_MODEL,
+        temperature=0.1, 
+        max_tokens=256,
+        response_format={"type": "json_object"}
+    )
+    usage = getattr(completion, "usage", None)
+    return completion.choices[0].message.content, {
+        "prompt_tokens": getattr(usage, "prompt_tokens", None),
+        "completion_tokens": getattr(usage, "completion_tokens", None)
+    }
 
 def get_llama_chat_response(patient_name: str, history: list, age: int = None, gender: str = None) -> dict:
     """
     Conversational Triage Engine (Nurse Nandiphiwe Persona).
     Uses prompts stored in Firestore for real-time updates.
     """
-    
-    # 1. Fetch the raw template from Firestore
-    raw_template = get_system_prompt("triage_nurse")
-    
-    # 2. Construct context variables
-    context_str = f"You are speaking to {patient_name}"
-    if age:
-        context_str += f", who is {age} years old"
-    else:
-        context_str += " (Age unknown)"
-        
-    if gender:
-        context_str += f" ({gender})"
-    context_str += "."
-
-    # 3. Inject variables into the template
-    try:
-        # We replace the placeholder in the Firestore string with actual data
-        system_prompt = raw_template.replace("{context_str}", context_str)
-    except Exception as e:
-        print(f"Prompt formatting error: {e}")
-        system_prompt = raw_template
-
-    # 4. Build messages
-    messages = [{"role": "system", "content": system_prompt}]
-    for msg in history:
-        messages.append({"role": msg.role, "content": msg.content})
+    messages = build_triage_messages(patient_name, history, age, gender)
 
     try:
-        completion = client.chat.completions.create(
-            messages=messages,
-            model="llama-3.1-8b-instant",
-            temperature=0.1, 
-            max_tokens=256,
-            response_format={"type": "json_object"}
-        )
-        return json.loads(completion.choices[0].message.content)
-
+        content, usage = run_triage_completion(messages)
     except Exception as e:
         print(f"LLM Error: {e}")
-        return {
-            "reply_message": "Eish, my connection is a bit slow. Please tell me your symptoms again.",
-            "show_booking": False
-        }
+        return dict(TRIAGE_FALLBACK)
+
+    # Validate/repair locally; only re-ask the model if the reply is unrecoverable
+    reask = make_reask(messages, content, model=TRIAGE_MODEL, temperature=0.1, max_tokens=256,
+                       response_format={"type": "json_object"})
+    result = parse_structured("triage", content, TRIAGE_SCHEMA, reask=reask, post_fix=triage_post_fix)
+    return result if result is not None else dict(TRIAGE_FALLBACK)
     
 def explain_prescription(diagnosis: str, meds: list, notes: str) -> str:
     """
@@ -88,10 +114,12 @@ def explain_prescription(diagnosis: str, meds: list, notes: str) -> str:
             temperature=0.2, 
             max_tokens=256
         )
-        return completion.choices[0].message.content
+        explanation = clean_text("explain_prescription", completion.choices[0].message.content)
+        if explanation:
+            return explanation
     except Exception as e:
         print(f"LLM Error: {e}")
-        return "Sorry, I cannot explain this right now. Please ask the nurse."
+    return "Sorry, I cannot explain this right now. Please ask the nurse."
     
 
 def analyze_operational_metrics(metrics: dict) -> list:
@@ -102,7 +130,7 @@ def analyze_operational_metrics(metrics: dict) -> list:
     You are an expert Hospital Operations Manager AI. 
     Analyze the provided clinic metrics and output 3 short, punchy insights.
     
-    FORMAT: JSON Array of objects: [{"type": "success"|"warning"|"critical"|"info", "text": "Insight..."}]
+    FORMAT: JSON object: {"insights": [{"type": "success"|"warning"|"critical"|"info", "text": "Insight..."}]}
     
     RULES:
     1. Look for bottlenecks (High wait times, low efficiency).
@@ -112,22 +140,23 @@ def analyze_operational_metrics(metrics: dict) -> list:
     """
     
     user_content = f"Current Metrics: {json.dumps(metrics)}"
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_content}
+    ]
+    create_kwargs = dict(model="llama-3.1-8b-instant", temperature=0.4, max_tokens=256,
+                         response_format={"type": "json_object"})
 
     try:
-        completion = client.chat.completions.create(
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_content}
-            ],
-            model="llama-3.1-8b-instant",
-            temperature=0.4,
-            max_tokens=256,
-            response_format={"type": "json_object"}
-        )
-        return json.loads(completion.choices[0].message.content).get("insights", [])
+        completion = client.chat.completions.create(messages=messages, **create_kwargs)
+        content = completion.choices[0].message.content
+        insights = parse_structured_list("operational_insights", content, "insights", INSIGHT_SCHEMA,
+                                         reask=make_reask(messages, content, **create_kwargs))
+        if insights:
+            return insights
     except Exception as e:
         print(f"LLM Error: {e}")
-        return [{"type": "info", "text": "AI Analysis unavailable. Using standard protocols."}]
+    return [{"type": "info", "text": "AI Analysis unavailable. Using standard protocols."}]
     
 
 def analyze_patient_health(records: list) -> dict:
@@ -149,22 +178,30 @@ def analyze_patient_health(records: list) -> dict:
     for r in records[:5]: 
         history_text += f"- {r.get('date')}: {r.get('diagnosis')} (Doc: {r.get('doctor')})\n"
 
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": f"Patient History:\n{history_text}"}
+    ]
+    create_kwargs = dict(model="llama-3.1-8b-instant", temperature=0.3, max_tokens=200,
+                         response_format={"type": "json_object"})
+
     try:
-        completion = client.chat.completions.create(
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": f"Patient History:\n{history_text}"}
-            ],
-            model="llama-3.1-8b-instant",
-            temperature=0.3,
-            max_tokens=200,
-            response_format={"type": "json_object"}
-        )
-        return json.loads(completion.choices[0].message.content)
+        completion = client.chat.completions.create(messages=messages, **create_kwargs)
+        content = completion.choices[0].message.content
+        summary = parse_structured("health_summary", content, HEALTH_SUMMARY_SCHEMA,
+                                   reask=make_reask(messages, content, **create_kwargs))
+        if summary:
+            return summary
     except Exception as e:
         print(f"LLM Error: {e}")
-        return {
-            "status": "Unknown",
-            "summary": "I am having trouble reading your file right now.",
-            "tip": "Please see a doctor if you feel unwell."
-        }
\ No newline at end of file
+    return {
+        "status": "Unknown",
+        "summary": "I am having trouble reading your file right now.",
+        "tip": "Please see a doctor if you feel unwell."
+    }
+
+# Each Groq-backed helper records a span; the raw round trips are traced on the client above
+instrument_module(globals(), "llm", [
+    "run_triage_completion", "get_llama_chat_response", "explain_prescription",
+    "analyze_operational_metrics", "analyze_patient_health",
+])
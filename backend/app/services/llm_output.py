@@ -0,0 +1,390 @@
+import json
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Callable, List, Optional
+
+# --- STRUCTURED OUTPUT LAYER FOR LLM REPLIES ---
+# Every LLM helper passes its raw reply through here instead of trusting
+# json.loads. Order of escalation:
+#   1. parse as-is
+#   2. repair locally (code fences, stray prose, truncated JSON at max_tokens,
+#      trailing commas, wrong key names, wrong types, array vs object)
+#   3. re-ask the model once, as a last resort
+# Outcomes are counted per call site (see llm_output_stats()).
+
+@dataclass
+class OutputField:
+    type: type
+    required: bool = False
+    default: Any = None
+    aliases: List[str] = field(default_factory=list)
+    choices: Optional[List[str]] = None # Allowed values for str fields, in the casing the frontend expects
+    synonyms: dict = field(default_factory=dict) # Normalized phrase -> choice, for wordings we accept on purpose
+
+# --- Schemas for the four helpers ---
+
+TRIAGE_SCHEMA = {
+    "reply_message": OutputField(str, required=True, aliases=["reply", "message", "response", "text", "answer"]),
+    "show_booking": OutputField(bool, default=False, aliases=["showbooking", "booking", "book", "show_booking_button"]),
+    "urgency_score": OutputField(int, aliases=["urgency", "score", "urgencyscore", "triage_score"]),
+    "color_code": OutputField(str, aliases=["color", "colour", "colour_code", "colorcode"], choices=["red", "orange", "green"],
+                              synonyms={"amber": "orange"}),
+    "category": OutputField(str, aliases=["triage_category", "level"], choices=["Emergency", "Urgent", "Routine"],
+                            synonyms={"non urgent": "Routine", "not urgent": "Routine", "nonurgent": "Routine"}),
+    "recommended_action": OutputField(str, aliases=["action", "recommendation", "advice", "recommendedaction"]),
+}
+
+HEALTH_SUMMARY_SCHEMA = {
+    "status": OutputField(str, default="Stable", aliases=["health_status", "state"]),
+    "summary": OutputField(str, required=True, aliases=["message", "health_summary", "overview", "text"]),
+    "tip": OutputField(str, default="Drink water and stay active.", aliases=["advice", "lifestyle_tip", "health_tip", "tips"]),
+}
+
+INSIGHT_SCHEMA = {
+    "type": OutputField(str, default="info", aliases=["level", "severity", "kind"], choices=["success", "warning", "critical", "info"],
+                        synonyms={"warn": "warning", "positive": "success", "good": "success"}),
+    "text": OutputField(str, required=True, aliases=["insight", "message", "description", "content"]),
+}
+
+# --- Stats ---
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+def count(call_site: str, outcome: str):
+    with _stats_lock:
+        site = _stats.setdefault(call_site, {"calls": 0, "clean": 0, "repaired": 0, "reasked": 0, "failed": 0})
+        site[outcome] += 1
+
+def llm_output_stats() -> dict:
+    """Per call site: how often replies were clean, repaired locally, re-asked or unusable"""
+    with _stats_lock:
+        report = {}
+        for site, s in _stats.items():
+            calls = s["calls"] or 1
+            report[site] = {
+                **s,
+                "repair_rate": round(s["repaired"] / calls, 3),
+                "reask_rate": round(s["reasked"] / calls, 3),
+                "failure_rate": round(s["failed"] / calls, 3),
+            }
+        return report
+
+# --- Local JSON repair ---
+
+LITERAL_RE = re.compile(r'[^\s,:\]}"]+')
+
+def close_truncated_json(text: str) -> str:
+    """
+    Cuts a reply that hit max_tokens back to its last complete value and closes
+    whatever is still open. A dangling key ( {"a": 1, "b": ), a half-written
+    literal ( "show_booking": fal ) or a trailing comma is dropped; an unfinished
+    string value is kept and closed, since it is usually most of the reply text.
+    """
+    stack = [] # [closer, expecting] per open container; expecting: key/colon/value/comma
+    cut, cut_closers = 0, ""
+    in_string = string_is_key = escaped = False
+
+    def value_done(end: int):
+        nonlocal cut, cut_closers
+        if stack:
+            stack[-1][1] = "comma"
+        cut, cut_closers = end, "".join(frame[0] for frame in reversed(stack))
+
+    i = 0
+    while i < len(text):
+        ch = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+                if string_is_key:
+                    stack[-1][1] = "colon"
+                else:
+                    value_done(i + 1)
+        elif ch == '"':
+            in_string = True
+            string_is_key = bool(stack) and stack[-1][0] == "}" and stack[-1][1] == "key"
+        elif ch in "{[":
+            stack.append(["}", "key"] if ch == "{" else ["]", "value"])
+            cut, cut_closers = i + 1, "".join(frame[0] for frame in reversed(stack))
+        elif ch in "}]":
+            if stack:
+                stack.pop()
+            value_done(i + 1)
+            if not stack:
+                break
+        elif ch == ":":
+            if stack:
+                stack[-1][1] = "value"
+        elif ch == ",":
+            if stack:
+                stack[-1][1] = "key" if stack[-1][0] == "}" else "value"
+        elif not ch.isspace():
+            token = LITERAL_RE.match(text, i)
+            end = token.end() if token else i + 1
+            try:
+                json.loads(text[i:end]) # true/false/null or a number; "fal" is not
+                value_done(end)
+            except ValueError:
+                pass
+            i = end
+            continue
+        i += 1
+
+    if in_string and not string_is_key:
+        # Keep the partial value, minus an escape sequence the cut went through
+        partial = re.sub(r'\\(u[0-9a-fA-F]{0,3})?$', "", text)
+        return partial + '"' + "".join(frame[0] for frame in reversed(stack))
+    return text[:cut] + cut_closers
+
+def repair_json(text: str):
+    """Best-effort local parse; returns the decoded value or raises ValueError"""
+    if text is None:
+        raise ValueError("empty reply")
+    cleaned = text.strip()
+    # Markdown code fences
+    cleaned = re.sub(r"^```(?:json)?\s*|\s*```$", "", cleaned)
+    # Prose around the JSON: start at the first bracket
+    starts = [i for i in (cleaned.find("{"), cleaned.find("[")) if i != -1]
+    if not starts:
+        raise ValueError("no JSON object in reply")
+    cleaned = cleaned[min(starts):]
+    # Trailing commas before a closer
+    cleaned = re.sub(r",\s*([}\]])", r"\1", cleaned)
+    try:
+        return json.loads(cleaned)
+    except ValueError:
+        pass
+    # Prose after the JSON (which may itself contain brackets): try each closer from the end
+    for end in range(len(cleaned), 0, -1):
+        if cleaned[end - 1] in "}]":
+            try:
+                return json.loads(cleaned[:end])
+            except ValueError:
+                continue
+    return json.loads(close_truncated_json(cleaned))
+
+# --- Coercion against a schema ---
+
+def _key(name: str) -> str:
+    return re.sub(r"[^a-z]", "", name.lower())
+
+def normalize_phrase(value: str) -> str:
+    """'Non-Urgent!' -> 'non urgent'"""
+    return re.sub(r"[^a-z]+", " ", value.lower()).strip()
+
+def match_choice(value: str, spec: OutputField) -> str:
+    """
+    Whole-value match only: exact choice (any casing/punctuation) or a listed synonym.
+    Never substring - "Non-urgent" must not become "Urgent" in a triage result.
+    """
+    phrase = normalize_phrase(value)
+    for choice in spec.choices:
+        if phrase == normalize_phrase(choice):
+            return choice
+    if phrase in spec.synonyms:
+        return spec.synonyms[phrase]
+    raise ValueError(f"{value!r} not in {spec.choices}")
+
+def coerce_value(value, spec: OutputField):
+    if value is None:
+        return None
+    if spec.type is bool:
+        if isinstance(value, bool):
+            return value
+        if isinstance(value, (int, float)):
+            return value != 0
+        return str(value).strip().lower() in ["true", "yes", "y", "1"]
+    if spec.type is int:
+        if isinstance(value, bool):
+            raise ValueError("bool is not an int")
+        if isinstance(value, (int, float)):
+            return int(round(value))
+        match = re.search(r"-?\d+(?:\.\d+)?", str(value)) # "8", "8/10", "High (8/10)"
+        if not match:
+            raise ValueError(f"no number in {value!r}")
+        return int(round(float(match.group(0))))
+    if spec.type is str:
+        if isinstance(value, (list, tuple)):
+            value = " ".join(str(v) for v in value)
+        value = str(value).strip()
+        if spec.choices:
+            return match_choice(value, spec)
+        return value
+    return value
+
+def coerce_object(data: dict, schema: dict) -> tuple:
+    """
+    Maps aliased keys, coerces types, fills defaults.
+    Returns (result or None, changed) - None when a required field can't be recovered.
+    """
+    if not isinstance(data, dict):
+        return None, True
+    changed = False
+    by_key = {_key(k): v for k, v in data.items()}
+    result = {}
+    for name, spec in schema.items():
+        if name in data:
+            raw = data[name]
+        else:
+            raw = None
+            for candidate in [name] + spec.aliases:
+                if _key(candidate) in by_key:
+                    raw = by_key[_key(candidate)]
+                    changed = True
+                    break
+        try:
+            value = coerce_value(raw, spec)
+        except ValueError:
+            value = None
+        if value is not None and value != raw:
+            changed = True
+        if value is None or value == "":
+            if spec.required:
+                return None, True
+            if name in data and data[name] is not None:
+                changed = True # Invalid value dropped
+            value = spec.default
+        result[name] = value
+    return result, changed
+
+def unwrap_object(data, schema: dict):
+    """Model returned [obj] or {"response": obj} instead of obj"""
+    if isinstance(data, list) and data and isinstance(data[0], dict):
+        return data[0]
+    # A schema key (or alias) holding a plain value means this is already the object;
+    # {"response": {...}} still unwraps even though "response" is an alias
+    known_keys = {_key(name) for field_name, spec in schema.items() for name in [field_name] + spec.aliases}
+    if isinstance(data, dict) and not any(_key(k) in known_keys and not isinstance(v, dict) for k, v in data.items()):
+        nested = [v for v in data.values() if isinstance(v, dict)]
+        if len(nested) == 1:
+            return nested[0]
+    return data
+
+def unwrap_list(data, list_key: str) -> list:
+    """Model returned {"insights": [...]}, {"data": [...]}, a bare array, or a single object"""
+    if isinstance(data, list):
+        return data
+    if isinstance(data, dict):
+        if isinstance(data.get(list_key), list):
+            return data[list_key]
+        lists = [v for v in data.values() if isinstance(v, list)]
+        if lists:
+            return lists[0]
+        return [data]
+    return []
+
+# --- Entry points used by the LLM helpers ---
+
+def parse_structured(call_site: str, content: str, schema: dict, reask: Callable[[str], str] = None, post_fix: Callable[[dict, dict], dict] = None):
+    """
+    Parses an object-shaped reply. `reask(hint)` should return a fresh raw reply.
+    `post_fix(raw, result)` can apply call-site rules to a coerced result.
+    Returns the validated dict, or None if nothing usable came back.
+    """
+    count(call_site, "calls")
+    attempts = [content]
+    for attempt_no in range(2):
+        raw_text = attempts[-1]
+        repaired = False
+        try:
+            data = json.loads(raw_text)
+        except (TypeError, ValueError):
+            try:
+                data = repair_json(raw_text)
+                repaired = True
+            except (TypeError, ValueError):
+                data = None
+
+        if data is not None:
+            unwrapped = unwrap_object(data, schema)
+            result, changed = coerce_object(unwrapped, schema)
+            if result is not None:
+                if post_fix:
+                    result = post_fix(unwrapped, result)
+                if attempt_no == 1:
+                    count(call_site, "reasked")
+                elif repaired or changed or unwrapped is not data:
+                    count(call_site, "repaired")
+                else:
+                    count(call_site, "clean")
+                return result
+
+        if attempt_no == 0 and reask is not None:
+            hint = ("Your previous reply was not valid for the required format. "
+                    f"Reply again with ONLY a JSON object with the keys: {', '.join(schema)}.")
+            try:
+                attempts.append(reask(hint))
+                continue
+            except Exception as e:
+                print(f"LLM re-ask failed ({call_site}): {e}")
+        break
+
+    count(call_site, "failed")
+    return None
+
+def parse_structured_list(call_site: str, content: str, list_key: str, item_schema: dict, reask: Callable[[str], str] = None):
+    """Same as parse_structured for list-shaped replies; invalid items are dropped"""
+    count(call_site, "calls")
+    attempts = [content]
+    for attempt_no in range(2):
+        raw_text = attempts[-1]
+        repaired = False
+        try:
+            data = json.loads(raw_text)
+        except (TypeError, ValueError):
+            try:
+                data = repair_json(raw_text)
+                repaired = True
+            except (TypeError, ValueError):
+                data = None
+
+        if data is not None:
+            items = unwrap_list(data, list_key)
+            wrapped_ok = isinstance(data, dict) and isinstance(data.get(list_key), list)
+            results = []
+            changed = False
+            for item in items:
+                result, item_changed = coerce_object(item if isinstance(item, dict) else {"text": item}, item_schema)
+                changed = changed or item_changed
+                if result is not None:
+                    results.append(result)
+            if results:
+                if attempt_no == 1:
+                    count(call_site, "reasked")
+                elif repaired or changed or not wrapped_ok or len(results) != len(items):
+                    count(call_site, "repaired")
+                else:
+                    count(call_site, "clean")
+                return results
+
+        if attempt_no == 0 and reask is not None:
+            hint = ("Your previous reply was not valid for the required format. "
+                    f'Reply again with ONLY a JSON object: {{"{list_key}": [{{{", ".join(f"{k!r}: ..." for k in item_schema)}}}]}}.')
+            try:
+                attempts.append(reask(hint))
+                continue
+            except Exception as e:
+                print(f"LLM re-ask failed ({call_site}): {e}")
+        break
+
+    count(call_site, "failed")
+    return None
+
+def clean_text(call_site: str, content: str, max_chars: int = 1200) -> Optional[str]:
+    """For plain-text helpers: trims wrappers and rejects empty replies"""
+    count(call_site, "calls")
+    text = (content or "").strip()
+    cleaned = re.sub(r'^(["\'])(.*)\1$', r"\2", text, flags=re.S).strip()
+    if not cleaned:
+        count(call_site, "failed")
+        return None
+    if len(cleaned) > max_chars:
+        cleaned = cleaned[:max_chars].rsplit(" ", 1)[0] + "..."
+    count(call_site, "repaired" if cleaned != text else "clean")
+    return cleaned
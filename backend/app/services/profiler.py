@@ -0,0 +1,267 @@
+import functools
+import inspect
+import itertools
+import os
+import random
+import sys
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from dataclasses import dataclass, field, asdict
+from datetime import datetime
+from typing import List, Optional
+
+# --- ON-DEMAND PROFILING & SLOW-REQUEST CAPTURE ---
+# Every request carries a cheap trace. Firestore and Groq helpers record a
+# span (name, start, duration, nesting) for each call they make.
+# A request can also be profiled. While any profiled request is running, a
+# background thread samples every thread's stack at a fixed wall-clock
+# interval. Those samples include time blocked inside Firestore/Groq I/O.
+# Requests are profiled either because they were sampled (sample_rate) or
+# because they matched a watched route prefix.
+# Captures are kept in a bounded ring buffer. A capture is stored for every
+# profiled request and for any request slower than slow_ms.
+# Samples are process-wide: requests running at the same time show up in
+# each other's profile, but spans are always per request.
+
+SPAN_LIMIT = 1000 # Spans kept per request; the rest are only counted
+SPAN_MIN_MS = 1.0 # Shorter spans still count in the breakdown but stay off the timeline
+STACK_DEPTH = 64
+MIN_INTERVAL_MS = 5.0 # Each sample walks every thread's stack under the GIL; finer than this slows the server itself
+TOP_STACKS = 200
+
+@dataclass
+class ProfilerSettings:
+    sample_rate: float = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+    routes: List[str] = field(default_factory=lambda: [r for r in os.getenv("PROFILE_ROUTES", "").split(",") if r])
+    slow_ms: float = float(os.getenv("SLOW_REQUEST_MS", "1500"))
+    interval_ms: float = max(float(os.getenv("PROFILE_INTERVAL_MS", "5")), MIN_INTERVAL_MS)
+
+settings = ProfilerSettings()
+
+_current_trace = ContextVar("profiler_trace", default=None)
+_span_depth = ContextVar("profiler_span_depth", default=0)
+
+_captures = deque(maxlen=int(os.getenv("PROFILE_BUFFER_SIZE", "50")))
+_capture_ids = itertools.count(1)
+_lock = threading.Lock()
+
+class RequestTrace:
+    def __init__(self, method: str, path: str, profiled: Optional[str]):
+        self.method = method
+        self.path = path
+        self.profiled = profiled # "sampled", "route" or None
+        self.started_at = datetime.now().isoformat()
+        self.started = time.perf_counter()
+        self.spans = []
+        self.dropped_spans = 0
+        self.stacks = {} # Collapsed stack "outer;...;inner" -> sample count
+        self.samples = 0
+
+    def add_span(self, name: str, started: float, ended: float, depth: int, error: bool):
+        if len(self.spans) >= SPAN_LIMIT:
+            self.dropped_spans += 1
+            return
+        self.spans.append({
+            "name": name,
+            "start_ms": round((started - self.started) * 1000, 2),
+            "duration_ms": round((ended - started) * 1000, 2),
+            "depth": depth,
+            "thread": threading.get_ident(),
+            "error": error,
+        })
+
+# --- Spans ---
+
+def traced(fn, kind: str):
+    """Wraps a service call so it records a span on the current request's trace"""
+    name = f"{kind}.{getattr(fn, '__name__', 'call')}"
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        trace = _current_trace.get()
+        if trace is None:
+            return fn(*args, **kwargs)
+        depth = _span_depth.get()
+        token = _span_depth.set(depth + 1)
+        started = time.perf_counter()
+        error = False
+        try:
+            return fn(*args, **kwargs)
+        except Exception:
+            error = True
+            raise
+        finally:
+            trace.add_span(name, started, time.perf_counter(), depth, error)
+            _span_depth.reset(token)
+    return wrapper
+
+def instrument_module(namespace: dict, kind: str, names: list):
+    """
+    Call at the bottom of a service module with globals() and the names of the
+    functions that do I/O. Replaces them with traced versions, so callers that
+    import them by name and calls inside the module both record spans.
+    Pure helpers (refs, formatting) stay off the list: a span per call would
+    crowd the breakdown and eat into SPAN_LIMIT without telling us anything.
+    Generators don't belong on it either, since their work happens after the call returns.
+    """
+    module_name = namespace["__name__"]
+    for name in names:
+        obj = namespace.get(name)
+        if not inspect.isfunction(obj) or obj.__module__ != module_name:
+            raise ValueError(f"{module_name}.{name} is not a function defined in that module")
+        if inspect.isgeneratorfunction(obj) or inspect.iscoroutinefunction(obj):
+            raise ValueError(f"{module_name}.{name} is a generator or coroutine and can't be traced as a call")
+        namespace[name] = traced(obj, kind)
+
+# --- Wall-clock stack sampler ---
+
+def fold_stack(frame) -> Optional[str]:
+    """Collapsed stack from the outermost app frame down to the leaf, or None if no app code is running"""
+    frames = []
+    while frame is not None and len(frames) < STACK_DEPTH:
+        code = frame.f_code
+        frames.append((code.co_filename, code.co_name, frame.f_lineno))
+        frame = frame.f_back
+    frames.reverse()
+    app_start = next((i for i, (filename, _, _) in enumerate(frames)
+                      if f"{os.sep}app{os.sep}" in filename and not filename.endswith("profiler.py")), None)
+    if app_start is None:
+        return None
+    return ";".join(f"{os.path.basename(filename)}:{func}:{line}" for filename, func, line in frames[app_start:])
+
+class StackSampler:
+    """One daemon thread, running only while at least one profiled request is open"""
+
+    def __init__(self):
+        self.active = set()
+        self.thread = None
+
+    def attach(self, trace: RequestTrace):
+        with _lock:
+            self.active.add(trace)
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, name="request-profiler", daemon=True)
+                self.thread.start()
+
+    def detach(self, trace: RequestTrace):
+        with _lock:
+            self.active.discard(trace)
+
+    def run(self):
+        own_id = threading.get_ident()
+        while True:
+            stacks = [fold_stack(frame) for thread_id, frame in sys._current_frames().items() if thread_id != own_id]
+            with _lock:
+                if not self.active:
+                    self.thread = None
+                    return
+                for trace in self.active:
+                    trace.samples += 1
+                    for stack in stacks:
+                        if stack is not None:
+                            trace.stacks[stack] = trace.stacks.get(stack, 0) + 1
+            time.sleep(settings.interval_ms / 1000)
+
+_sampler = StackSampler()
+
+# --- Request lifecycle (called from the middleware in main.py) ---
+
+def choose_profiling(path: str) -> Optional[str]:
+    if any(path.startswith(route) for route in settings.routes):
+        return "route"
+    if settings.sample_rate > 0 and random.random() < settings.sample_rate:
+        return "sampled"
+    return None
+
+def start_trace(method: str, path: str):
+    """Returns (trace, token) for finish_trace"""
+    trace = RequestTrace(method, path, choose_profiling(path))
+    if trace.profiled:
+        _sampler.attach(trace)
+    return trace, _current_trace.set(trace)
+
+def span_breakdown(spans: list) -> dict:
+    breakdown = {}
+    for span in spans:
+        row = breakdown.setdefault(span["name"], {"calls": 0, "total_ms": 0.0, "max_ms": 0.0, "errors": 0})
+        row["calls"] += 1
+        row["total_ms"] = round(row["total_ms"] + span["duration_ms"], 2)
+        row["max_ms"] = max(row["max_ms"], span["duration_ms"])
+        row["errors"] += 1 if span["error"] else 0
+    return dict(sorted(breakdown.items(), key=lambda item: -item[1]["total_ms"]))
+
+def finish_trace(trace: RequestTrace, token, status_code: int):
+    _current_trace.reset(token)
+    duration_ms = round((time.perf_counter() - trace.started) * 1000, 2)
+    if trace.profiled:
+        _sampler.detach(trace)
+    slow = duration_ms >= settings.slow_ms
+    if not trace.profiled and not slow:
+        return None
+
+    # Top-level spans only, so nested calls aren't counted twice. Concurrent
+    # spans (asyncio.gather) can add up to more than the request itself.
+    service_ms = round(sum(s["duration_ms"] for s in trace.spans if s["depth"] == 0), 2)
+    capture = {
+        "id": next(_capture_ids),
+        "method": trace.method,
+        "path": trace.path,
+        "status": status_code,
+        "started_at": trace.started_at,
+        "duration_ms": duration_ms,
+        "reason": "slow" if slow and not trace.profiled else trace.profiled,
+        "slow": slow,
+        "service_ms": service_ms,
+        "other_ms": round(max(duration_ms - service_ms, 0.0), 2),
+        "breakdown": span_breakdown(trace.spans),
+        "spans": [s for s in trace.spans if s["duration_ms"] >= SPAN_MIN_MS],
+        "dropped_spans": trace.dropped_spans,
+        "profile": None,
+    }
+    if trace.profiled:
+        with _lock:
+            stacks = list(trace.stacks.items())
+        top = sorted(stacks, key=lambda item: -item[1])[:TOP_STACKS]
+        capture["profile"] = {
+            "interval_ms": settings.interval_ms,
+            "samples": trace.samples,
+            "stacks": dict(top), # Collapsed-stack format, ready for flamegraph tools
+        }
+    with _lock:
+        _captures.append(capture)
+    if slow:
+        print(f"Slow request: {trace.method} {trace.path} took {duration_ms}ms (capture {capture['id']})")
+    return capture
+
+# --- Admin surface ---
+
+def get_settings() -> dict:
+    return asdict(settings)
+
+def update_settings(sample_rate: float = None, routes: List[str] = None, slow_ms: float = None, interval_ms: float = None) -> dict:
+    if sample_rate is not None:
+        settings.sample_rate = min(max(sample_rate, 0.0), 1.0)
+    if routes is not None:
+        settings.routes = [r for r in routes if r]
+    if slow_ms is not None:
+        settings.slow_ms = slow_ms
+    if interval_ms is not None:
+        settings.interval_ms = max(interval_ms, MIN_INTERVAL_MS)
+    return get_settings()
+
+def list_captures() -> list:
+    """Newest first, without the heavy span/profile payloads"""
+    with _lock:
+        captures = list(_captures)
+    keys = ["id", "method", "path", "status", "started_at", "duration_ms", "reason", "slow", "service_ms", "other_ms"]
+    return [{k: c[k] for k in keys} for c in reversed(captures)]
+
+def get_capture(capture_id: int) -> Optional[dict]:
+    with _lock:
+        return next((c for c in _captures if c["id"] == capture_id), None)
+
+def clear_captures():
+    with _lock:
+        _captures.clear()
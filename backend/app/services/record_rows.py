@@ -0,0 +1,112 @@
+import codecs
+import csv
+import json
+from datetime import datetime
+from pydantic import ValidationError
+from app.models.records import CreateRecordRequest, ImportRecordRow
+
+# --- RECORD ROW FORMATS ---
+# The pure half of bulk export/import (no Firestore): the exported row shape,
+# the stored record shape, and the incremental NDJSON/CSV decoder.
+# An exported row re-imports as-is (ImportRecordRow accepts 'doctor').
+
+EXPORT_FIELDS = ["id", "patient_id", "patient_name", "date", "created_at", "doctor", "diagnosis", "meds", "notes", "type"]
+MED_SEPARATOR = "; "
+
+def build_record_data(request: CreateRecordRequest, date: str = None, record_type: str = "Consultation", now: datetime = None,
+                      created_at: str = None) -> dict:
+    """The stored record shape, shared by /records/create and bulk import"""
+    now = now or datetime.now()
+    return {
+        "patient_id": request.patient_id,
+        "patient_name": request.patient_name,
+        # CRITICAL: Use ISO format (YYYY-MM-DD) so 2025 > 2024
+        "date": date or now.strftime("%Y-%m-%d"),
+        "created_at": created_at or now.isoformat(),
+        "doctor": request.doctor_name,
+        "diagnosis": request.diagnosis,
+        "meds": request.meds,
+        "notes": request.notes,
+        "type": record_type
+    }
+
+def import_record_data(row: ImportRecordRow, now: datetime = None) -> dict:
+    """
+    Stored shape for an imported row. History is sorted by created_at, so an old
+    paper record must not look newer than today's visits: keep the row's own
+    created_at (exports carry it), else place it at the start of its visit date.
+    """
+    created_at = row.created_at or (f"{row.date}T00:00:00" if row.date else None)
+    return build_record_data(row, row.date, row.type, now, created_at)
+
+def export_row(record: dict) -> dict:
+    return {field: record.get(field) for field in EXPORT_FIELDS}
+
+def csv_row(record: dict) -> dict:
+    row = export_row(record)
+    row["meds"] = MED_SEPARATOR.join(row["meds"] or [])
+    return row
+
+class RowDecoder:
+    """
+    Turns an upload into rows as bytes arrive: feed() each chunk, then close().
+    Yields (line_no, row dict, error) tuples. CSV cells may span lines when quoted.
+    """
+
+    def __init__(self, fmt: str):
+        if fmt not in ["ndjson", "csv"]:
+            raise ValueError(f"Unsupported format '{fmt}' (use ndjson or csv)")
+        self.fmt = fmt
+        self.decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+        self.buffer = ""
+        self.line_no = 0
+        self.header = None
+        self.pending = "" # CSV record still inside a quoted cell
+        self.pending_line = 0
+
+    def feed(self, data: bytes) -> list:
+        self.buffer += self.decoder.decode(data)
+        *lines, self.buffer = self.buffer.split("\n")
+        return [row for line in lines for row in self.read_line(line.rstrip("\r"))]
+
+    def close(self) -> list:
+        self.buffer += self.decoder.decode(b"", final=True)
+        rows = self.read_line(self.buffer.rstrip("\r")) if self.buffer else []
+        self.buffer = ""
+        if self.pending:
+            rows.append((self.pending_line, None, "Unterminated quoted CSV cell"))
+            self.pending = ""
+        return rows
+
+    def read_line(self, line: str) -> list:
+        self.line_no += 1
+        if self.fmt == "ndjson":
+            if not line.strip():
+                return []
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                return [(self.line_no, None, f"Invalid JSON: {e}")]
+            if not isinstance(row, dict):
+                return [(self.line_no, None, "Expected a JSON object")]
+            return [(self.line_no, row, None)]
+
+        if not self.pending:
+            self.pending_line = self.line_no
+        self.pending += line
+        if self.pending.count('"') % 2 == 1:
+            self.pending += "\n"
+            return []
+        text, self.pending = self.pending, ""
+        if not text.strip():
+            return []
+        values = next(csv.reader([text]))
+        if self.header is None:
+            self.header = [name.strip() for name in values]
+            return []
+        if len(values) != len(self.header):
+            return [(self.pending_line, None, f"Expected {len(self.header)} columns, got {len(values)}")]
+        return [(self.pending_line, dict(zip(self.header, values)), None)]
+
+def describe_validation_error(error: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(str(part) for part in e['loc'])}: {e['msg']}" for e in error.errors())
@@ -0,0 +1,100 @@
+import csv
+import io
+import orjson
+from pydantic import ValidationError
+from app.models.records import ImportRecordRow
+from app.services.firebase import iter_records, import_records_batch, IMPORT_BATCH_SIZE, DEFAULT_CLINIC_ID
+from app.services.record_rows import EXPORT_FIELDS, import_record_data, export_row, csv_row, describe_validation_error
+
+# --- BULK EXPORT / IMPORT OF MEDICAL RECORDS ---
+# Export pages through the clinic's records with a generator. Memory stays
+# constant and every row carries its ID, which doubles as the resume cursor.
+# Import decodes NDJSON or CSV incrementally (RowDecoder, app/services/record_rows.py)
+# and validates each row against CreateRecordRequest. Rows are written in
+# IMPORT_BATCH_SIZE chunks. Callers flush a full chunk before reading more input,
+# so a slow Firestore slows the upload down instead of piling rows up in memory.
+
+MAX_REPORTED_ERRORS = 100
+
+# --- Export ---
+
+def export_ndjson(clinic_id: str = DEFAULT_CLINIC_ID, after: str = None):
+    for record in iter_records(clinic_id, after):
+        yield orjson.dumps(export_row(record)) + b"\n"
+
+def export_csv(clinic_id: str = DEFAULT_CLINIC_ID, after: str = None):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+
+    def take() -> str:
+        text = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return text
+
+    writer.writeheader()
+    yield take()
+    for record in iter_records(clinic_id, after):
+        writer.writerow(csv_row(record))
+        yield take()
+
+# --- Import ---
+
+class RecordImporter:
+    """
+    Collects validated rows and writes them one chunk at a time.
+    Call flush() whenever full() is true, before reading more input.
+    Rows before start_line are skipped, so a failed import can be resumed
+    from committed_through_line + 1.
+    """
+
+    def __init__(self, clinic_id: str = DEFAULT_CLINIC_ID, chunk_size: int = IMPORT_BATCH_SIZE, start_line: int = 1):
+        self.clinic_id = clinic_id
+        self.start_line = start_line
+        self.chunk_size = min(chunk_size, IMPORT_BATCH_SIZE)
+        self.chunk = [] # (line_no, record data)
+        self.imported = 0
+        self.failed = 0
+        self.errors = []
+        self.patients = set()
+        self.committed_through_line = start_line - 1
+
+    def add(self, line_no: int, row: dict, error: str = None):
+        if line_no < self.start_line:
+            return
+        if error is None:
+            try:
+                parsed = ImportRecordRow(**row)
+            except ValidationError as e:
+                error = describe_validation_error(e)
+        if error is not None:
+            self.failed += 1
+            if len(self.errors) < MAX_REPORTED_ERRORS:
+                self.errors.append({"line": line_no, "error": error})
+            return
+        self.chunk.append((line_no, import_record_data(parsed)))
+
+    def full(self) -> bool:
+        return len(self.chunk) >= self.chunk_size
+
+    def flush(self) -> list:
+        """Writes the pending chunk. Returns already-registered patients whose stored Health Pulse is now stale."""
+        if not self.chunk:
+            return []
+        chunk, self.chunk = self.chunk, []
+        ids, known_patients = import_records_batch([data for _, data in chunk], self.clinic_id)
+        self.imported += len(ids)
+        self.patients.update(data["patient_id"] for _, data in chunk)
+        self.committed_through_line = chunk[-1][0]
+        return known_patients
+
+    def report(self) -> dict:
+        return {
+            "imported": self.imported,
+            "failed": self.failed,
+            "patients": len(self.patients),
+            # If a write fails, re-send the file from the line after this one
+            "committed_through_line": self.committed_through_line,
+            "errors": self.errors,
+            "errors_truncated": self.failed > len(self.errors),
+        }
@@ -0,0 +1,252 @@
+import bisect
+import json
+import math
+import os
+import re
+import threading
+from collections import defaultdict
+from app.services.firebase import records_ref, record_listeners, DEFAULT_CLINIC_ID
+
+# --- LOCAL FULL-TEXT SEARCH OVER RECORDS ---
+# One in-memory inverted index per clinic over diagnosis, meds, notes and
+# patient_name. It's kept current by the add_patient_record hook and
+# snapshotted to disk, so a restart loads the snapshot and only fetches
+# records written since, instead of streaming the whole collection.
+
+SNAPSHOT_DIR = os.getenv("SEARCH_SNAPSHOT_DIR", ".search_index")
+SNAPSHOT_EVERY = 25 # Record writes between snapshots
+
+FIELD_WEIGHTS = {"patient_name": 3.0, "diagnosis": 3.0, "meds": 2.0, "notes": 1.0}
+
+# "500mg", "500 mg", "2.5ml", "1g" -> one dosage token; "150/95" kept whole (BP readings)
+# (Lookahead, not \b: \b after "%" needs a letter or digit next, so "1 % cream" never matched)
+DOSAGE_RE = re.compile(r"(\d+(?:\.\d+)?)\s*(mg|mcg|ug|g|kg|ml|l|iu|units?|%)(?=\W|$)")
+TOKEN_RE = re.compile(r"\d+(?:\.\d+)?(?:mg|mcg|ug|g|kg|ml|l|iu|units?|%)|\d+/\d+|[a-z0-9]+(?:'[a-z]+)?")
+
+def tokenize(text: str) -> list:
+    """
+    Lowercases and splits text, keeping medication dosages together.
+    'Amoxicillin 500 mg (TDS)' -> ['amoxicillin', '500mg', '500', 'tds']
+    """
+    text = DOSAGE_RE.sub(lambda m: m.group(1) + m.group(2), str(text or "").lower())
+    tokens = []
+    for token in TOKEN_RE.findall(text):
+        tokens.append(token)
+        # Also index the bare number/parts so "500" or "150" find dosages and readings
+        if "/" in token:
+            tokens.extend(token.split("/"))
+            continue
+        number = re.match(r"\d+(?:\.\d+)?", token)
+        if number and number.group(0) != token:
+            tokens.append(number.group(0))
+    return tokens
+
+def record_fields(data: dict) -> dict:
+    return {
+        "patient_name": data.get("patient_name", ""),
+        "diagnosis": data.get("diagnosis", ""),
+        "meds": " ".join(data.get("meds") or []),
+        "notes": data.get("notes", ""),
+    }
+
+class RecordIndex:
+    """Inverted index for one clinic: token -> {record_id: weighted term frequency}"""
+
+    def __init__(self, clinic_id: str):
+        self.clinic_id = clinic_id
+        self.postings = defaultdict(dict)
+        self.vocab = [] # Sorted tokens, for prefix lookups
+        self.docs = {} # record_id -> summary returned with hits
+        self.doc_tokens = {} # record_id -> tokens, so re-adds can be removed cleanly
+        self.watermark = "" # Newest created_at seen, for catch-up after a restart
+        self.writes_since_snapshot = 0
+        self.lock = threading.Lock()
+
+    # --- Updates ---
+
+    def add(self, record_id: str, data: dict):
+        with self.lock:
+            self._remove(record_id)
+            weights = defaultdict(float)
+            for field_name, text in record_fields(data).items():
+                for token in tokenize(text):
+                    weights[token] += FIELD_WEIGHTS[field_name]
+            for token, weight in weights.items():
+                if token not in self.postings:
+                    bisect.insort(self.vocab, token)
+                self.postings[token][record_id] = weight
+            self.doc_tokens[record_id] = list(weights)
+            self.docs[record_id] = {
+                "record_id": record_id,
+                "patient_id": data.get("patient_id"),
+                "patient_name": data.get("patient_name", "Unknown"),
+                "diagnosis": data.get("diagnosis"),
+                "meds": list(data.get("meds") or []),
+                "date": data.get("date"),
+            }
+            created_at = str(data.get("created_at") or "")
+            if created_at > self.watermark:
+                self.watermark = created_at
+            self.writes_since_snapshot += 1
+
+    def _remove(self, record_id: str):
+        for token in self.doc_tokens.pop(record_id, []):
+            postings = self.postings.get(token)
+            if postings is None:
+                continue
+            postings.pop(record_id, None)
+            if not postings:
+                del self.postings[token]
+                i = bisect.bisect_left(self.vocab, token)
+                if i < len(self.vocab) and self.vocab[i] == token:
+                    self.vocab.pop(i)
+        self.docs.pop(record_id, None)
+
+    # --- Queries ---
+
+    def expand_prefix(self, prefix: str, limit: int = 50) -> list:
+        """All indexed tokens starting with `prefix` (capped)"""
+        i = bisect.bisect_left(self.vocab, prefix)
+        matches = []
+        while i < len(self.vocab) and self.vocab[i].startswith(prefix) and len(matches) < limit:
+            matches.append(self.vocab[i])
+            i += 1
+        return matches
+
+    def search(self, query: str, limit: int = 20) -> list:
+        """
+        Ranked search. Every query term must match (AND) and is matched as a
+        prefix, so search-as-you-type works; exact token hits rank higher.
+        """
+        raw_terms = DOSAGE_RE.sub(lambda m: m.group(1) + m.group(2), query.lower()).split()
+        if not raw_terms:
+            return []
+        with self.lock:
+            total_docs = max(len(self.docs), 1)
+            scores = None
+            for raw in raw_terms:
+                term_tokens = tokenize(raw.rstrip("*"))
+                if not term_tokens:
+                    continue
+                candidates = self.expand_prefix(term_tokens[0])
+
+                term_scores = defaultdict(float)
+                for token in candidates:
+                    postings = self.postings.get(token, {})
+                    if not postings:
+                        continue
+                    idf = math.log(1 + total_docs / len(postings))
+                    exact = 1.0 if token == term_tokens[0] else 0.7 # Exact hits outrank prefix hits
+                    for record_id, weight in postings.items():
+                        term_scores[record_id] = max(term_scores[record_id], weight * idf * exact)
+
+                if scores is None:
+                    scores = dict(term_scores)
+                else:
+                    scores = {rid: s + term_scores[rid] for rid, s in scores.items() if rid in term_scores}
+                if not scores:
+                    return []
+
+            # Best score first; ties go to the most recent visit
+            ranked = sorted((scores or {}).items(), key=lambda kv: (kv[1], str(self.docs[kv[0]].get("date") or "")), reverse=True)
+            return [{**self.docs[rid], "score": round(score, 3)} for rid, score in ranked[:limit]]
+
+    # --- Persistence ---
+
+    def snapshot_path(self) -> str:
+        return os.path.join(SNAPSHOT_DIR, f"{self.clinic_id}.json")
+
+    def save_snapshot(self):
+        with self.lock:
+            state = {
+                "watermark": self.watermark,
+                "docs": self.docs,
+                "doc_tokens": self.doc_tokens,
+                "postings": self.postings,
+            }
+            os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+            tmp_path = self.snapshot_path() + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(state, f)
+            os.replace(tmp_path, self.snapshot_path()) # Atomic swap; never leaves a half-written snapshot
+            self.writes_since_snapshot = 0
+
+    def load_snapshot(self) -> bool:
+        try:
+            with open(self.snapshot_path()) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return False
+        with self.lock:
+            self.watermark = state.get("watermark", "")
+            self.docs = state.get("docs", {})
+            self.doc_tokens = state.get("doc_tokens", {})
+            self.postings = defaultdict(dict, state.get("postings", {}))
+            self.vocab = sorted(self.postings)
+        return True
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def build_index(clinic_id: str) -> RecordIndex:
+    """Full rebuild from Firestore (first run, or when the snapshot is missing)"""
+    index = RecordIndex(clinic_id)
+    for doc in records_ref(clinic_id).stream():
+        index.add(doc.id, doc.to_dict())
+    index.save_snapshot()
+    return index
+
+def load_index(clinic_id: str) -> RecordIndex:
+    """
+    Loads the snapshot and catches up on records written since it was taken.
+    Rebuilds instead when there is no watermark to catch up from, or when the
+    record count still disagrees afterwards (records without created_at).
+    """
+    index = RecordIndex(clinic_id)
+    if not index.load_snapshot() or not index.watermark:
+        return build_index(clinic_id)
+    for doc in records_ref(clinic_id).where('created_at', '>', index.watermark).stream():
+        index.add(doc.id, doc.to_dict())
+    total = records_ref(clinic_id).count().get()[0][0].value
+    if total != len(index.docs):
+        print(f"Search index for {clinic_id} has {len(index.docs)} of {total} records; rebuilding")
+        return build_index(clinic_id)
+    if index.writes_since_snapshot:
+        index.save_snapshot()
+    return index
+
+def get_index(clinic_id: str = DEFAULT_CLINIC_ID) -> RecordIndex:
+    with _indexes_lock:
+        if clinic_id not in _indexes:
+            _indexes[clinic_id] = load_index(clinic_id)
+        return _indexes[clinic_id]
+
+def index_record(record_id: str, data: dict, clinic_id: str = DEFAULT_CLINIC_ID):
+    """add_patient_record hook: keeps the clinic's index current"""
+    try:
+        index = get_index(clinic_id)
+        index.add(record_id, data)
+        if index.writes_since_snapshot >= SNAPSHOT_EVERY:
+            index.save_snapshot()
+    except Exception as e:
+        # Search is derived data; never fail the record write because of it
+        print(f"Search index error ({clinic_id}/{record_id}): {e}")
+
+def search_records(query: str, clinic_id: str = DEFAULT_CLINIC_ID, limit: int = 20) -> list:
+    return get_index(clinic_id).search(query, limit)
+
+def drop_index(clinic_id: str = DEFAULT_CLINIC_ID):
+    """Forgets a clinic's index and snapshot (e.g. after a demo reset); rebuilt on next use"""
+    with _indexes_lock:
+        index = _indexes.pop(clinic_id, None) or RecordIndex(clinic_id)
+        try:
+            os.remove(index.snapshot_path())
+        except OSError:
+            pass
+
+def save_all_snapshots():
+    for index in list(_indexes.values()):
+        if index.writes_since_snapshot:
+            index.save_snapshot()
+
+record_listeners.append(index_record)
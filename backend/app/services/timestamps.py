@@ -0,0 +1,85 @@
+from datetime import datetime, timedelta
+from typing import Optional
+
+# --- TYPED QUEUE TIMESTAMPS ---
+# Queue entries used to carry only strings:
+#   time        "HH:MM" / "--:--"  -> scheduled_at       (None while unscheduled)
+#   created_at  ISO string         -> created_ts
+#   (nothing)                      -> status_changed_at
+# The typed fields are native Firestore timestamps, so they sort and range-filter
+# server-side and a schedule past midnight stays after the one before it.
+# The legacy strings are still written alongside them for older clients.
+# Readers go through the shims below, which prefer the typed field and fall
+# back to parsing the string for entries written before the migration.
+#
+# Firestore treats naive datetimes as UTC, so everything here is made
+# timezone-aware in the server's local zone (the zone "HH:MM" was written in).
+
+UNSCHEDULED = "--:--"
+
+def now_local() -> datetime:
+    return datetime.now().astimezone()
+
+def as_local(value) -> Optional[datetime]:
+    """datetime (aware or naive-local) or ISO string -> aware local datetime"""
+    if value is None or value == "":
+        return None
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    if not isinstance(value, datetime):
+        return None
+    return value.astimezone() # Naive values are taken as local time
+
+def created_time(entry: dict) -> Optional[datetime]:
+    """When the booking was made"""
+    return as_local(entry.get("created_ts")) or as_local(entry.get("created_at"))
+
+def scheduled_time(entry: dict) -> Optional[datetime]:
+    """
+    Scheduled start, or None if the booking has no time yet.
+    Legacy "HH:MM" is placed on the booking's creation day; a time more than
+    12 hours before the booking was made is taken to mean the next day.
+    """
+    if entry.get("scheduled_at") is not None:
+        return as_local(entry["scheduled_at"])
+    try:
+        clock = datetime.strptime(str(entry.get("time") or ""), "%H:%M")
+    except ValueError:
+        return None
+    created = created_time(entry) or now_local()
+    scheduled = created.replace(hour=clock.hour, minute=clock.minute, second=0, microsecond=0)
+    if scheduled < created - timedelta(hours=12):
+        scheduled += timedelta(days=1)
+    return scheduled
+
+def status_changed_time(entry: dict) -> Optional[datetime]:
+    """When the booking last changed status, or None if that was never recorded (pre-migration entries)"""
+    return as_local(entry.get("status_changed_at"))
+
+def clock_label(moment: Optional[datetime]) -> str:
+    return moment.strftime("%H:%M") if moment else UNSCHEDULED
+
+def schedule_fields(moment: Optional[datetime]) -> dict:
+    """Typed scheduled_at plus the legacy "HH:MM" string, written together"""
+    return {"scheduled_at": moment, "time": clock_label(moment)}
+
+def typed_fields(entry: dict, new_booking: bool = False) -> dict:
+    """
+    The typed timestamps for an entry, derived from whatever it already has.
+    A new booking's status was set when it was created; for migrated entries the
+    last status change is unknown and stays None rather than being guessed.
+    """
+    created = created_time(entry) or now_local()
+    return {
+        "created_ts": created,
+        "scheduled_at": scheduled_time({**entry, "created_ts": created}),
+        "status_changed_at": as_local(entry.get("status_changed_at")) or (created if new_booking else None),
+    }
+
+def day_bounds(day: str) -> tuple:
+    """'YYYY-MM-DD' -> (start, end) as aware local datetimes, end exclusive"""
+    start = datetime.strptime(day, "%Y-%m-%d")
+    return start.astimezone(), (start + timedelta(days=1)).astimezone()
@@ -0,0 +1,185 @@
+import hashlib
+import os
+import re
+import threading
+import time
+import zlib
+import numpy as np
+
+# --- SEMANTIC CACHE FOR OPENING TRIAGE TURNS ---
+# Many chats open with near-identical messages ("Hello", "I have a headache").
+# Short conversations are embedded with a hashed character/word n-gram
+# vectorizer (NumPy only, no model download). A prior reply is reused when
+# its cosine similarity clears the threshold.
+# Red-flag symptoms always go to the model, and so does anything with a number
+# in it: "a fever of 40" or "vomiting for 3 days" is a different case from
+# "a fever", but the n-grams barely tell them apart.
+
+CACHE_DIM = 4096
+CACHE_CAPACITY = int(os.getenv("TRIAGE_CACHE_CAPACITY", "2048"))
+SIMILARITY_THRESHOLD = float(os.getenv("TRIAGE_CACHE_THRESHOLD", "0.85"))
+CACHE_TTL_SECONDS = int(os.getenv("TRIAGE_CACHE_TTL", str(6 * 3600)))
+MAX_CACHEABLE_MESSAGES = 3 # e.g. user / nurse greeting / user
+
+RED_FLAGS = [
+    "chest", "breath", "breathe", "bleed", "blood", "unconscious", "faint", "collapse",
+    "seizure", "convuls", "stroke", "drooping", "numb", "elephant", "crushing", "suicid",
+    "kill myself", "overdose", "poison", "pregnan", "labour", "labor", "snake", "burn",
+    "accident", "head injury", "stab", "shot", "choking", "swallowed", "severe",
+    # Children and fevers escalate quickly
+    "baby", "babies", "infant", "newborn", "toddler", "child", "kid", "rash", "stiff neck",
+    "floppy", "lethargic", "not drinking", "not feeding", "dehydrat", "fits", "high fever",
+    "temperature", "very hot", "won't wake", "wont wake"
+]
+
+# Temperatures, durations, doses, ages: digits or spelled-out numbers
+NUMBER_RE = re.compile(r"\d|\b(one|two|three|four|five|six|seven|eight|nine|ten|eleven|twelve|twenty|thirty|forty|hundred)\b")
+
+RED_FLAG_RE = re.compile(r"\b(" + "|".join(re.escape(flag) for flag in RED_FLAGS) + ")")
+
+NAME_PLACEHOLDER = "{patient_name}"
+
+def contains_red_flag(text: str) -> bool:
+    return RED_FLAG_RE.search(text) is not None
+
+def needs_model(text: str) -> bool:
+    """Openings that must never be answered from the cache"""
+    return contains_red_flag(text) or NUMBER_RE.search(text) is not None
+
+def normalize(text: str) -> str:
+    return re.sub(r"[^a-z0-9' ]+", " ", text.lower()).strip()
+
+def _bucket(feature: str) -> tuple:
+    h = zlib.crc32(feature.encode("utf-8"))
+    return h % CACHE_DIM, 1.0 if (h >> 31) & 1 else -1.0 # Signed hashing limits collision bias
+
+def embed(text: str) -> np.ndarray:
+    """Hashed n-gram embedding: word unigrams/bigrams + character 3-5 grams, L2-normalized"""
+    vec = np.zeros(CACHE_DIM, dtype=np.float32)
+    words = text.split()
+    features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    padded = f" {text} "
+    for n in (3, 4, 5):
+        features += [padded[i:i + n] for i in range(len(padded) - n + 1)]
+    for feature in features:
+        index, sign = _bucket(feature)
+        vec[index] += sign
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm else vec
+
+class TriageCache:
+    """Fixed-size ring buffer of embeddings + replies, searched with one matrix-vector product"""
+
+    def __init__(self, capacity: int = CACHE_CAPACITY):
+        self.capacity = capacity
+        self.vectors = np.zeros((capacity, CACHE_DIM), dtype=np.float32)
+        self.partitions = np.full(capacity, "", dtype=object)
+        self.expires = np.zeros(capacity, dtype=np.float64)
+        self.replies = [None] * capacity
+        self.size = 0
+        self.cursor = 0
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "bypassed": 0, "llm_seconds": 0.0, "hit_seconds": 0.0}
+
+    def lookup(self, partition: str, vector: np.ndarray):
+        with self.lock:
+            if self.size == 0:
+                return None
+            now = time.time()
+            sims = self.vectors[:self.size] @ vector
+            valid = (self.partitions[:self.size] == partition) & (self.expires[:self.size] > now)
+            sims = np.where(valid, sims, -1.0)
+            best = int(np.argmax(sims))
+            if sims[best] >= SIMILARITY_THRESHOLD:
+                return self.replies[best]
+            return None
+
+    def store(self, partition: str, vector: np.ndarray, reply: dict):
+        with self.lock:
+            slot = self.cursor
+            self.vectors[slot] = vector
+            self.partitions[slot] = partition
+            self.expires[slot] = time.time() + CACHE_TTL_SECONDS
+            self.replies[slot] = reply
+            self.cursor = (self.cursor + 1) % self.capacity
+            self.size = min(self.size + 1, self.capacity)
+
+    def record(self, outcome: str, seconds: float = 0.0):
+        with self.lock:
+            self.stats[outcome] += 1
+            if outcome == "misses":
+                self.stats["llm_seconds"] += seconds
+            elif outcome == "hits":
+                self.stats["hit_seconds"] += seconds
+
+    def report(self) -> dict:
+        with self.lock:
+            s = dict(self.stats)
+            entries = self.size
+        lookups = s["hits"] + s["misses"]
+        avg_llm = s["llm_seconds"] / s["misses"] if s["misses"] else 0.0
+        avg_hit = s["hit_seconds"] / s["hits"] if s["hits"] else 0.0
+        return {
+            "entries": entries,
+            "hits": s["hits"],
+            "misses": s["misses"],
+            "bypassed": s["bypassed"],
+            "hit_rate": round(s["hits"] / lookups, 3) if lookups else 0.0,
+            "avg_llm_ms": round(avg_llm * 1000, 1),
+            "avg_hit_ms": round(avg_hit * 1000, 2),
+            "estimated_seconds_saved": round(s["hits"] * max(avg_llm - avg_hit, 0.0), 1),
+        }
+
+_cache = TriageCache()
+
+def cache_key(history: list, age: int = None, gender: str = None):
+    """
+    Returns (partition, text) for a cacheable conversation, or None.
+    The partition pins the prompt version and the patient context that the
+    prompt depends on (child vs adult, gender), so replies never cross those lines.
+    """
+    if not history or len(history) > MAX_CACHEABLE_MESSAGES:
+        return None
+    text = normalize(" | ".join(f"{m.role}: {m.content}" for m in history))
+    if not text:
+        return None
+    from app.services.firebase import get_system_prompt # Deferred so the matching rules load without Firestore
+    prompt_version = hashlib.sha1(get_system_prompt("triage_nurse").encode("utf-8")).hexdigest()[:10]
+    age_band = "unknown" if age is None else ("child" if age < 18 else "adult")
+    return f"{prompt_version}|{age_band}|{(gender or '').lower()}", text
+
+def lookup_triage_reply(history: list, patient_name: str, age: int = None, gender: str = None):
+    """Cached reply for this opening, personalised for the current patient, or None"""
+    started = time.perf_counter()
+    key = cache_key(history, age, gender)
+    if key is None:
+        return None
+    partition, text = key
+    if needs_model(text):
+        _cache.record("bypassed")
+        return None
+    reply = _cache.lookup(partition, embed(text))
+    if reply is None:
+        return None
+    _cache.record("hits", time.perf_counter() - started)
+    return {**reply, "reply_message": reply["reply_message"].replace(NAME_PLACEHOLDER, patient_name or "")}
+
+def store_triage_reply(history: list, patient_name: str, reply: dict, llm_seconds: float, age: int = None, gender: str = None):
+    """Records a fresh model reply; cacheable openings are kept for reuse"""
+    key = cache_key(history, age, gender)
+    if key is None:
+        return
+    partition, text = key
+    if needs_model(text):
+        return
+    _cache.record("misses", llm_seconds)
+    # Don't cache connection-error fallbacks or replies that pushed a booking
+    if not reply.get("reply_message") or reply.get("show_booking") or "urgency_score" not in reply:
+        return
+    message = reply["reply_message"]
+    if patient_name and patient_name != "Patient":
+        message = message.replace(patient_name, NAME_PLACEHOLDER)
+    _cache.store(partition, embed(text), {**reply, "reply_message": message})
+
+def triage_cache_stats() -> dict:
+    return _cache.report()
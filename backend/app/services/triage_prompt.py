@@ -0,0 +1,30 @@
+# --- TRIAGE PROMPT RENDERING ---
+# Turns a triage_nurse prompt template plus the conversation into chat messages.
+# Kept free of Firestore/Groq so the replay harness can build messages offline;
+# llm.build_triage_messages fetches the live template and calls this.
+
+def format_triage_messages(template: str, patient_name: str, history: list, age: int = None, gender: str = None) -> list:
+    # 1. Construct context variables
+    context_str = f"You are speaking to {patient_name}"
+    if age:
+        context_str += f", who is {age} years old"
+    else:
+        context_str += " (Age unknown)"
+
+    if gender:
+        context_str += f" ({gender})"
+    context_str += "."
+
+    # 2. Inject variables into the template
+    try:
+        # We replace the placeholder in the Firestore string with actual data
+        system_prompt = template.replace("{context_str}", context_str)
+    except Exception as e:
+        print(f"Prompt formatting error: {e}")
+        system_prompt = template
+
+    # 3. Build messages
+    messages = [{"role": "system", "content": system_prompt}]
+    for msg in history:
+        messages.append({"role": msg.role, "content": msg.content})
+    return messages
@@ -0,0 +1,21 @@
+import sys
+import os
+
+# Add the backend directory to sys.path so we can import the app module
+# This assumes the script is located in backend/scripts/
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.firebase import db, archive_terminal_bookings, DEFAULT_CLINIC_ID
+
+def archive_all(clinic_ids):
+    for clinic_id in clinic_ids:
+        archived = archive_terminal_bookings(clinic_id)
+        print(f"✅ clinics/{clinic_id}: archived {archived} finished bookings.")
+
+if __name__ == "__main__":
+    # No args: sweep every clinic. Otherwise sweep the clinic IDs given.
+    if len(sys.argv) > 1:
+        clinic_ids = sys.argv[1:]
+    else:
+        clinic_ids = [doc.id for doc in db.collection('clinics').list_documents()] or [DEFAULT_CLINIC_ID]
+    archive_all(clinic_ids)
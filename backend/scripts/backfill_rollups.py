@@ -0,0 +1,22 @@
+import sys
+import os
+from datetime import datetime, timedelta
+
+# Add the backend directory to sys.path so we can import the app module
+# This assumes the script is located in backend/scripts/
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.firebase import rebuild_rollup, DEFAULT_CLINIC_ID
+
+def backfill(days: int, clinic_id: str = DEFAULT_CLINIC_ID):
+    print(f"⏳ Rebuilding {days} days of rollups for clinics/{clinic_id}...")
+    today = datetime.now()
+    for offset in range(days):
+        day = (today - timedelta(days=offset)).strftime("%Y-%m-%d")
+        bookings = rebuild_rollup(day, clinic_id)
+        print(f"✅ {day}: {bookings} bookings")
+
+if __name__ == "__main__":
+    days = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    clinic_id = sys.argv[2] if len(sys.argv) > 2 else DEFAULT_CLINIC_ID
+    backfill(days, clinic_id)
@@ -0,0 +1,51 @@
+import sys
+import os
+import json
+import timeit
+from datetime import datetime
+
+# Add the backend directory to sys.path so we can import the app module
+# This assumes the script is located in backend/scripts/
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+from app.models.queue import queue_payload
+
+# Micro-benchmark: cost of serializing 1k queue entries per poll.
+#   before: list of dicts -> jsonable_encoder -> JSONResponse (json.dumps)
+#   after:  slotted QueueEntry rows minus null fields -> ORJSONResponse (orjson.dumps)
+# Both time and payload size are reported, since every open Dashboard polls this.
+# No Firestore needed; the entries are synthetic.
+
+ENTRIES = 1000
+REPEAT = 200
+
+def fake_queue(n: int):
+    return [{
+        "id": f"doc{i:05d}",
+        "patient_id": f"patient_{i}",
+        "patient_name": f"Patient {i}",
+        "score": "High (8/10)" if i % 5 == 0 else "Low (3/10)",
+        "status": "Waiting for Doctor",
+        "urgent": i % 5 == 0,
+        "symptoms": "Persistent cough and mild fever for three days",
+        "created_at": datetime.now().isoformat(),
+        "time": "09:45",
+        "clinic_id": "main",
+    } for i in range(n)]
+
+def current_path(docs):
+    return JSONResponse(jsonable_encoder(docs)).body
+
+def typed_path(docs):
+    return ORJSONResponse(queue_payload(docs)).body
+
+if __name__ == "__main__":
+    docs = fake_queue(ENTRIES)
+    assert json.loads(current_path(docs))[0]["patient_id"] == json.loads(typed_path(docs))[0]["patient_id"]
+
+    for label, fn in [("dicts + jsonable_encoder + json", current_path), ("QueueEntry + orjson", typed_path)]:
+        best = min(timeit.repeat(lambda: fn(docs), number=REPEAT, repeat=5)) / REPEAT
+        size = len(fn(docs))
+        print(f"{label:<34} {best * 1000:8.3f} ms  {size:>8} bytes ({size / ENTRIES:.0f} per entry) per {ENTRIES} entries")
@@ -0,0 +1,66 @@
+import sys
+import os
+import random
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+# Add the backend directory to sys.path so we can import the app module
+# This assumes the script is located in backend/scripts/
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.firebase import add_to_queue, apply_booking_action, reset_clinic
+from app.services.booking_state import InvalidTransition, TERMINAL_STATUSES
+
+# Concurrency check for the booking state machine.
+# Fires conflicting actions at ONE booking from many threads and verifies that
+# every successful transaction saw an allowed status, and that at most one
+# action moved the booking into a terminal state.
+# Runs against a scratch clinic so it never touches real data.
+
+SCRATCH_CLINIC = "hammer_test"
+ACTIONS = ["assign", "assign", "delay", "cancel", "complete"]
+
+def attempt(doc_id, action):
+    payload = {"doctor_id": "dr_test", "doctor_name": "Dr. Test"} if action == "assign" else {"minutes": 5}
+    try:
+        result = apply_booking_action(doc_id, action, payload, SCRATCH_CLINIC)
+        if result is None:
+            return action, "missing", None
+        before, updates = result
+        return action, "ok", before.get("status")
+    except InvalidTransition:
+        return action, "rejected", None
+
+def hammer(rounds: int = 5, workers: int = 16, attempts: int = 64):
+    failures = 0
+    for round_no in range(1, rounds + 1):
+        booking = add_to_queue({
+            "patient_name": "Hammer Test",
+            "patient_id": f"hammer_{round_no}",
+            "score": "Low (3/10)",
+            "status": "Pending Approval",
+            "urgent": False,
+            "symptoms": "Concurrency test",
+            "created_at": datetime.now().isoformat(),
+            "time": "--:--"
+        }, SCRATCH_CLINIC)
+
+        actions = [random.choice(ACTIONS) for _ in range(attempts)]
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(lambda a: attempt(booking["id"], a), actions))
+
+        successes = [r for r in results if r[1] == "ok"]
+        into_terminal = [r for r in successes if r[0] in ["cancel", "complete"]]
+        from_terminal = [r for r in successes if r[2] in TERMINAL_STATUSES]
+
+        ok = len(into_terminal) <= 1 and not from_terminal
+        failures += 0 if ok else 1
+        print(f"{'✅' if ok else '❌'} Round {round_no}: {len(successes)} applied, "
+              f"{len(results) - len(successes)} rejected, {len(into_terminal)} terminal, "
+              f"{len(from_terminal)} applied after terminal")
+
+    reset_clinic(SCRATCH_CLINIC)
+    return failures
+
+if __name__ == "__main__":
+    sys.exit(1 if hammer() else 0)
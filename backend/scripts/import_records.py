@@ -0,0 +1,71 @@
+import sys
+import os
+import argparse
+
+# Add the backend directory to sys.path so we can import the app module
+# This assumes the script is located in backend/scripts/
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Bulk-loads medical records (e.g. a digitised paper backlog) into a clinic.
+# Same validation and batched writes as POST /records/import.
+#
+# Usage:
+#   python scripts/import_records.py backlog.csv --clinic main
+#   python scripts/import_records.py backlog.ndjson --start-line 4501   # resume after a failure
+
+parser = argparse.ArgumentParser(description="Import medical records from NDJSON or CSV")
+parser.add_argument("path", help="File with CreateRecordRequest fields per row (+ optional date, type)")
+parser.add_argument("--clinic", default=None, help="Target clinic ID (default: DEFAULT_CLINIC_ID)")
+parser.add_argument("--format", choices=["ndjson", "csv"], default=None, help="Defaults to the file extension")
+parser.add_argument("--start-line", type=int, default=1, help="Skip rows before this line (resume)")
+args = parser.parse_args()
+
+from app.services.firebase import DEFAULT_CLINIC_ID
+from app.services.record_rows import RowDecoder
+from app.services.record_transfer import RecordImporter
+from app.services.jobs import enqueue_job
+
+READ_SIZE = 64 * 1024
+
+def import_file(path: str, clinic_id: str, fmt: str, start_line: int):
+    decoder = RowDecoder(fmt)
+    importer = RecordImporter(clinic_id, start_line=start_line)
+    stale_pulses = set()
+    print(f"⏳ Importing {path} ({fmt}) into clinics/{clinic_id} ...")
+
+    def handle(rows):
+        for line_no, row, error in rows:
+            importer.add(line_no, row, error)
+            if importer.full():
+                stale_pulses.update(importer.flush())
+                print(f"   {importer.imported} imported, {importer.failed} rejected (through line {importer.committed_through_line})")
+
+    try:
+        with open(path, "rb") as f:
+            while True:
+                data = f.read(READ_SIZE)
+                if not data:
+                    break
+                handle(decoder.feed(data))
+        handle(decoder.close())
+        stale_pulses.update(importer.flush())
+    except Exception as e:
+        report = importer.report()
+        print(f"❌ Import stopped: {e}")
+        print(f"   Re-run with --start-line {report['committed_through_line'] + 1} to continue.")
+        sys.exit(1)
+
+    # Picked up by the job workers on the next server start
+    for patient_id in stale_pulses:
+        enqueue_job("health_pulse", f"{clinic_id}__{patient_id}", {"patient_id": patient_id, "clinic_id": clinic_id})
+
+    report = importer.report()
+    for error in report["errors"]:
+        print(f"   line {error['line']}: {error['error']}")
+    if report["errors_truncated"]:
+        print(f"   ... and {report['failed'] - len(report['errors'])} more rejected rows")
+    print(f"✅ Imported {report['imported']} records for {report['patients']} patients ({report['failed']} rejected).")
+
+if __name__ == "__main__":
+    fmt = args.format or ("csv" if args.path.lower().endswith(".csv") else "ndjson")
+    import_file(args.path, args.clinic or DEFAULT_CLINIC_ID, fmt, args.start_line)
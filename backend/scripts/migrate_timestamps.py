@@ -0,0 +1,25 @@
+import sys
+import os
+
+# Add the backend directory to sys.path so we can import the app module
+# This assumes the script is located in backend/scripts/
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.firebase import db, migrate_queue_timestamps, DEFAULT_CLINIC_ID
+
+# Backfills the typed queue timestamps (created_ts, scheduled_at, status_changed_at)
+# from the legacy "HH:MM" time / ISO created_at strings. Safe to re-run.
+
+def migrate_all(clinic_ids):
+    for clinic_id in clinic_ids:
+        print(f"⏳ clinics/{clinic_id}: backfilling queue timestamps...")
+        migrated = migrate_queue_timestamps(clinic_id)
+        print(f"✅ clinics/{clinic_id}: {migrated} queue entries migrated.")
+
+if __name__ == "__main__":
+    # No args: every clinic. Otherwise the clinic IDs given.
+    if len(sys.argv) > 1:
+        clinic_ids = sys.argv[1:]
+    else:
+        clinic_ids = [doc.id for doc in db.collection('clinics').list_documents()] or [DEFAULT_CLINIC_ID]
+    migrate_all(clinic_ids)
@@ -0,0 +1,44 @@
+import sys
+import os
+
+# Add the backend directory to sys.path so we can import the app module
+# This assumes the script is located in backend/scripts/
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.firebase import db, queue_ref, records_ref, rebuild_patient_registry, DEFAULT_CLINIC_ID
+
+BATCH_SIZE = 400 # Firestore caps a batch at 500 writes
+
+def copy_collection(source, target_ref, clinic_id):
+    """Copies every doc from a legacy top-level collection into a clinic partition (keeps doc IDs)"""
+    batch = db.batch()
+    pending = 0
+    copied = 0
+    for doc in source.stream():
+        data = doc.to_dict()
+        batch.set(target_ref.document(doc.id), {**data, "clinic_id": data.get("clinic_id", clinic_id)})
+        pending += 1
+        copied += 1
+        if pending == BATCH_SIZE:
+            batch.commit()
+            batch = db.batch()
+            pending = 0
+    if pending:
+        batch.commit()
+    return copied
+
+def migrate(clinic_id: str = DEFAULT_CLINIC_ID):
+    print(f"⏳ Migrating global 'queue' and 'records' into clinics/{clinic_id}...")
+
+    queue_count = copy_collection(db.collection('queue'), queue_ref(clinic_id), clinic_id)
+    print(f"✅ Copied {queue_count} queue entries.")
+
+    record_count = copy_collection(db.collection('records'), records_ref(clinic_id), clinic_id)
+    print(f"✅ Copied {record_count} records.")
+
+    patient_count = rebuild_patient_registry(clinic_id)
+    print(f"✅ Patient registry rebuilt ({patient_count} patients).")
+    print("ℹ️  Legacy collections were left in place. Delete them once the clinic dashboards look right.")
+
+if __name__ == "__main__":
+    migrate(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_CLINIC_ID)
@@ -0,0 +1,246 @@
+import sys
+import os
+import argparse
+import json
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+# Add the backend directory to sys.path so we can import the app module
+# This assumes the script is located in backend/scripts/
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Triage replay harness: runs a corpus of recorded conversations through the
+# same message-building/completion path as /triage/assess, once per prompt version.
+#
+# Corpus: JSONL, one conversation per line:
+#   {"id": "c1", "request": {<TriageRequest fields>}, "label": {"color_code": "red", "category": "Emergency", "urgency_score": 9}}
+# ("label" is optional.)
+#
+# Usage:
+#   python scripts/replay_triage.py corpus.jsonl --prompt current --prompt v2=prompts/triage_v2.txt
+#   python scripts/replay_triage.py corpus.jsonl --backend stub --prompt v2=prompts/triage_v2.txt
+#
+# Per-conversation results are appended to --out as they finish; only the
+# running summary is kept in memory, with latencies held in a fixed-size
+# reservoir sample so percentiles stay cheap on any corpus size.
+# The stub backend with file prompts needs neither Groq nor Firestore credentials.
+
+parser = argparse.ArgumentParser(description="Replay recorded triage conversations against prompt versions")
+parser.add_argument("corpus", help="JSONL file of recorded TriageRequest conversations")
+parser.add_argument("--prompt", action="append", default=[],
+                    help="'current' (Firestore triage_nurse) or name=path/to/prompt.txt; repeatable")
+parser.add_argument("--backend", choices=["groq", "stub"], default="groq",
+                    help="groq = real model, stub = local keyword triage (no network)")
+parser.add_argument("--concurrency", type=int, default=4, help="Max completions in flight")
+parser.add_argument("--out", default="replay_results.jsonl", help="Where per-conversation results are streamed")
+parser.add_argument("--limit", type=int, default=None, help="Only replay the first N conversations")
+args = parser.parse_args()
+
+from app.models.triage import TriageRequest, TriageResponse
+from app.services.triage_prompt import format_triage_messages
+from app.services.mock_service import mock_triage_assessment
+
+LATENCY_RESERVOIR_SIZE = 10000 # Latency samples kept per prompt version
+
+# --- BACKENDS: messages -> (raw content, usage) ---
+
+def stub_completion(messages: list) -> tuple:
+    """Deterministic local stand-in with a little simulated latency"""
+    user_text = " ".join(m["content"] for m in messages if m["role"] == "user")
+    time.sleep(random.uniform(0.01, 0.05))
+    content = mock_triage_assessment(user_text).model_dump_json()
+    prompt_chars = sum(len(m["content"]) for m in messages)
+    return content, {"prompt_tokens": prompt_chars // 4, "completion_tokens": len(content) // 4}
+
+def groq_backend():
+    # Imported here so the stub never builds a Groq client or connects to Firestore
+    from app.services.llm import run_triage_completion
+    return run_triage_completion
+
+BACKENDS = {"groq": groq_backend, "stub": lambda: stub_completion}
+
+# --- CORPUS & PROMPTS ---
+
+def iter_corpus(path: str, limit: int = None):
+    """Streams conversations from disk instead of loading the whole corpus"""
+    with open(path) as f:
+        count = 0
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            yield item.get("id", f"line{line_no}"), TriageRequest(**item["request"]), item.get("label") or {}
+            count += 1
+            if limit and count >= limit:
+                return
+
+def load_prompts(specs: list) -> dict:
+    prompts = {}
+    for spec in specs or ["current"]:
+        if spec == "current":
+            # The live Firestore prompt, read once for the whole run
+            from app.services.firebase import get_system_prompt
+            prompts["current"] = get_system_prompt("triage_nurse")
+            continue
+        name, _, path = spec.partition("=")
+        with open(path) as f:
+            prompts[name] = f.read()
+    return prompts
+
+# --- ONE REPLAY ---
+
+def replay_one(conv_id: str, request: TriageRequest, label: dict, version: str, template, complete) -> dict:
+    messages = format_triage_messages(template, request.patient_name, request.history, request.age, request.gender)
+    result = {"id": conv_id, "prompt": version, "latency_ms": None, "json_ok": False,
+              "schema_ok": False, "error": None, "prompt_tokens": None, "completion_tokens": None}
+    started = time.perf_counter()
+    try:
+        content, usage = complete(messages)
+    except Exception as e:
+        result["error"] = f"completion: {e}"
+        return result
+    result["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    result.update(usage)
+
+    try:
+        data = json.loads(content)
+        result["json_ok"] = True
+    except (TypeError, ValueError) as e:
+        result["error"] = f"json: {e}"
+        result["raw"] = content
+        return result
+    try:
+        TriageResponse(**data)
+        result["schema_ok"] = True
+    except Exception as e:
+        result["error"] = f"schema: {e}"
+
+    result["color_code"] = data.get("color_code")
+    result["category"] = data.get("category")
+    result["urgency_score"] = data.get("urgency_score")
+    if label:
+        result["label"] = label
+        if "color_code" in label:
+            result["color_match"] = str(data.get("color_code") or "").lower() == str(label["color_code"] or "").lower()
+        if "category" in label:
+            result["category_match"] = str(data.get("category") or "").lower() == str(label["category"] or "").lower()
+        if label.get("urgency_score") is not None:
+            try:
+                result["urgency_error"] = abs(int(data.get("urgency_score")) - int(label["urgency_score"]))
+            except (TypeError, ValueError):
+                result["urgency_error"] = None
+    return result
+
+# --- SUMMARY ---
+
+class Reservoir:
+    """Uniform random sample of at most `size` values (Algorithm R), plus the exact count and max"""
+
+    def __init__(self, size: int = LATENCY_RESERVOIR_SIZE):
+        self.size = size
+        self.values = []
+        self.count = 0
+        self.max = None
+
+    def add(self, value: float):
+        self.count += 1
+        self.max = value if self.max is None else max(self.max, value)
+        if len(self.values) < self.size:
+            self.values.append(value)
+            return
+        slot = random.randrange(self.count)
+        if slot < self.size:
+            self.values[slot] = value
+
+class Summary:
+    def __init__(self):
+        self.rows = {}
+
+    def add(self, result: dict):
+        s = self.rows.setdefault(result["prompt"], {
+            "runs": 0, "errors": 0, "json_failures": 0, "schema_failures": 0, "latencies": Reservoir(),
+            "prompt_tokens": 0, "completion_tokens": 0, "color": [0, 0], "category": [0, 0],
+            "urgency": [0, 0, 0] # labelled runs, summed absolute error, runs within ±1
+        })
+        s["runs"] += 1
+        if result["latency_ms"] is None:
+            s["errors"] += 1
+            return
+        s["latencies"].add(result["latency_ms"])
+        s["json_failures"] += 0 if result["json_ok"] else 1
+        s["schema_failures"] += 0 if (result["schema_ok"] or not result["json_ok"]) else 1
+        s["prompt_tokens"] += result.get("prompt_tokens") or 0
+        s["completion_tokens"] += result.get("completion_tokens") or 0
+        for key, field in (("color", "color_match"), ("category", "category_match")):
+            if field in result:
+                s[key][0] += 1 if result[field] else 0
+                s[key][1] += 1
+        if result.get("urgency_error") is not None:
+            s["urgency"][0] += 1
+            s["urgency"][1] += result["urgency_error"]
+            s["urgency"][2] += 1 if result["urgency_error"] <= 1 else 0
+
+    @staticmethod
+    def percentile(values: list, pct: float):
+        if not values:
+            return None
+        ordered = sorted(values)
+        return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+    def print_report(self):
+        print("\n📊 Replay summary")
+        for version, s in self.rows.items():
+            lat = s["latencies"]
+            completed = lat.count
+            print(f"\n[{version}] {s['runs']} runs, {s['errors']} completion errors")
+            if completed:
+                print(f"  latency ms   p50={self.percentile(lat.values, 50)}  p90={self.percentile(lat.values, 90)}  "
+                      f"p99={self.percentile(lat.values, 99)}  max={lat.max}")
+                print(f"  tokens       prompt avg={s['prompt_tokens'] / completed:.0f}  "
+                      f"completion avg={s['completion_tokens'] / completed:.0f}")
+                print(f"  json         parse failures={s['json_failures']}  schema failures={s['schema_failures']}")
+            for key in ("color", "category"):
+                hits, total = s[key]
+                if total:
+                    print(f"  {key:<12} agreement {hits}/{total} ({hits / total:.0%})")
+            labelled, total_error, within_one = s["urgency"]
+            if labelled:
+                print(f"  urgency      MAE={total_error / labelled:.2f}  within±1={within_one / labelled:.0%}")
+
+# --- DRIVER ---
+
+def replay():
+    prompts = load_prompts(args.prompt)
+    complete = BACKENDS[args.backend]()
+    summary = Summary()
+    print(f"⏳ Replaying {args.corpus} against {list(prompts)} via '{args.backend}' (concurrency {args.concurrency})")
+
+    def jobs():
+        for conv_id, request, label in iter_corpus(args.corpus, args.limit):
+            for version, template in prompts.items():
+                yield conv_id, request, label, version, template
+
+    with open(args.out, "w") as out, ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        in_flight = set()
+
+        def drain(block_until_below: int):
+            nonlocal in_flight
+            while len(in_flight) >= block_until_below:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    result = future.result()
+                    summary.add(result)
+                    out.write(json.dumps(result) + "\n")
+
+        for conv_id, request, label, version, template in jobs():
+            # Backpressure: never read further ahead than the pool can work on
+            drain(args.concurrency * 2)
+            in_flight.add(pool.submit(replay_one, conv_id, request, label, version, template, complete))
+        drain(1)
+
+    summary.print_report()
+    print(f"\n✅ Per-conversation results written to {args.out}")
+
+if __name__ == "__main__":
+    replay()
@@ -0,0 +1,5 @@
+import sys
+import os
+
+# Make the backend's `app` package importable when running `python -m pytest` from backend/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
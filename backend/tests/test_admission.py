@@ -0,0 +1,74 @@
+import asyncio
+import pytest
+from app.services import admission
+from app.services.admission import controller, AdmissionSlot, AdmissionRejected
+
+def hold(route_key: str) -> AdmissionSlot:
+    controller.enter("priority", route_key, "tester", ("tester", route_key))
+    return AdmissionSlot("priority", route_key)
+
+def test_streaming_slot_is_held_until_the_body_is_sent():
+    slot = hold("/export")
+    seen = []
+
+    def rows():
+        for i in range(3):
+            seen.append(controller.route_in_flight["/export"])
+            yield f"{i}\n"
+
+    async def send():
+        return [chunk async for chunk in slot.stream(rows())]
+
+    assert asyncio.run(send()) == ["0\n", "1\n", "2\n"]
+    assert seen == [1, 1, 1]
+    assert controller.route_in_flight["/export"] == 0
+
+def test_slot_is_released_when_the_client_goes_away():
+    slot = hold("/export")
+
+    def rows():
+        while True:
+            yield "row\n"
+
+    async def read_one_then_disconnect():
+        body = slot.stream(rows())
+        await body.__anext__()
+        assert controller.route_in_flight["/export"] == 1
+        await body.aclose()
+
+    asyncio.run(read_one_then_disconnect())
+    assert controller.route_in_flight["/export"] == 0
+
+def test_release_is_idempotent():
+    slot = hold("/export")
+    slot.release()
+    slot.release()
+    assert controller.route_in_flight["/export"] == 0
+
+def test_priority_lane_keeps_its_reserve_when_shared_lanes_are_full():
+    admitted = []
+    try:
+        with pytest.raises(AdmissionRejected):
+            for i in range(admission.SHARED_INFLIGHT + 1):
+                route_key = f"/chat/{i}" # Separate routes, so only the shared cap applies
+                controller.enter("write", route_key, f"user{i}", (f"user{i}", route_key))
+                admitted.append(("write", route_key))
+        assert len(admitted) == admission.SHARED_INFLIGHT
+        controller.enter("priority", "/booking/create", "urgent", ("urgent", "/booking/create"))
+        admitted.append(("priority", "/booking/create"))
+    finally:
+        for lane, route_key in admitted:
+            controller.leave(lane, route_key)
+    assert controller.shared_in_flight == 0
+
+def test_stale_cache_is_bounded_by_bytes(monkeypatch):
+    monkeypatch.setattr(admission, "STALE_CACHE_MAX_BYTES", 1000)
+    cache = admission.AdmissionController()
+    for i in range(10):
+        cache.remember(("u", f"/queue?{i}"), b"x" * 300, "application/json")
+    assert cache.stale_bytes <= 1000
+    assert len(cache.stale) == 3
+    assert cache.recall("poll", ("u", "/queue?9")) is not None
+
+    cache.remember(("u", "/big"), b"x" * (admission.STALE_MAX_BODY_BYTES + 1), "application/json")
+    assert ("u", "/big") not in cache.stale
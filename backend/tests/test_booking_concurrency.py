@@ -0,0 +1,119 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import pytest
+from app.services.booking_state import apply_transition, InvalidTransition, TERMINAL_STATUSES
+
+# In-memory stand-in for a Firestore transaction: reads record the document's
+# version, writes are buffered, and commit fails if anything read has changed
+# since, in which case the whole function is re-run (like @firestore.transactional).
+
+class Contention(Exception):
+    pass
+
+class FakeSnapshot:
+    def __init__(self, data):
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data)
+
+class FakeStore:
+    def __init__(self, docs: dict):
+        self.lock = threading.Lock()
+        self.docs = docs
+        self.versions = {doc_id: 0 for doc_id in docs}
+        self.commits = 0
+
+    def document(self, doc_id: str):
+        return FakeDocRef(self, doc_id)
+
+    def run_transactional(self, fn, max_attempts: int = 200):
+        for _ in range(max_attempts):
+            transaction = FakeTransaction(self)
+            result = fn(transaction)
+            try:
+                return result, transaction.commit()
+            except Contention:
+                continue
+        raise RuntimeError("transaction never committed")
+
+class FakeDocRef:
+    def __init__(self, store: FakeStore, doc_id: str):
+        self.store = store
+        self.id = doc_id
+
+    def get(self, transaction=None):
+        with self.store.lock:
+            data = self.store.docs.get(self.id)
+            transaction.reads[self.id] = self.store.versions.get(self.id, 0)
+        time.sleep(random.uniform(0, 0.002)) # Widen the window between read and commit
+        return FakeSnapshot(data)
+
+class FakeTransaction:
+    def __init__(self, store: FakeStore):
+        self.store = store
+        self.reads = {}
+        self.writes = []
+
+    def update(self, doc_ref, updates):
+        self.writes.append((doc_ref.id, lambda data: {**data, **updates}))
+
+    def delete(self, doc_ref):
+        self.writes.append((doc_ref.id, lambda data: None))
+
+    def commit(self) -> int:
+        with self.store.lock:
+            if any(self.store.versions.get(doc_id, 0) != version for doc_id, version in self.reads.items()):
+                raise Contention()
+            for doc_id, write in self.writes:
+                self.store.docs[doc_id] = write(self.store.docs.get(doc_id))
+                self.store.versions[doc_id] = self.store.versions.get(doc_id, 0) + 1
+            self.store.commits += 1
+            return self.store.commits
+
+def hammer(actions: list, attempts: int = 48, workers: int = 16):
+    store = FakeStore({"b1": {"status": "Booked", "scheduled_at": datetime(2025, 3, 14, 10, 0).astimezone()}})
+    start = threading.Barrier(workers)
+
+    def attempt(i):
+        action = actions[i % len(actions)]
+        payload = {"doctor_id": "d1", "doctor_name": "Dr. Test"} if action == "assign" else {"minutes": 5}
+        if i < workers:
+            start.wait()
+        try:
+            result, seq = store.run_transactional(
+                lambda transaction: apply_transition(transaction, store.document("b1"), action, payload))
+        except InvalidTransition:
+            return None
+        if result is None:
+            return None
+        before, updates = result
+        return seq, action, before["status"], updates.get("status")
+
+    order = list(range(attempts))
+    random.shuffle(order)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        applied = sorted(r for r in pool.map(attempt, order) if r is not None)
+    return store, applied
+
+@pytest.mark.parametrize("round_no", range(10))
+def test_at_most_one_terminal_action_and_nothing_after_it(round_no):
+    store, applied = hammer(["assign", "delay", "cancel", "complete", "assign", "delay"])
+    terminal = [a for a in applied if a[3] in TERMINAL_STATUSES]
+    assert len(terminal) <= 1
+    assert all(before not in TERMINAL_STATUSES for _, _, before, _ in applied)
+    if terminal:
+        assert applied[-1] == terminal[0] # Nothing applied after the booking finished
+        assert store.docs["b1"]["status"] == terminal[0][3]
+
+@pytest.mark.parametrize("round_no", range(5))
+def test_only_one_delete_wins(round_no):
+    store, applied = hammer(["delete", "cancel", "delete", "assign"])
+    deletes = [a for a in applied if a[1] == "delete"]
+    assert len(deletes) == 1
+    assert applied[-1] == deletes[0]
+    assert store.docs["b1"] is None
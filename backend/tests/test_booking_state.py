@@ -0,0 +1,78 @@
+from datetime import datetime
+import pytest
+from app.services.booking_state import (
+    plan_transition, InvalidTransition, ACTIVE_STATUSES, MAX_DELAY_MINUTES
+)
+
+NOW = datetime(2025, 3, 14, 10, 0).astimezone()
+
+def booking(status: str, scheduled: datetime = None, **extra) -> dict:
+    return {"status": status, "scheduled_at": scheduled, **extra}
+
+@pytest.mark.parametrize("action, status, expected", [
+    ("assign", "Pending Approval", "Waiting for Doctor"),
+    ("assign", "Emergency En Route", "Waiting for Doctor"),
+    ("complete", "Delayed", "Done"),
+    ("cancel", "Waiting for Doctor", "Cancelled"),
+])
+def test_valid_transitions(action, status, expected):
+    updates = plan_transition(booking(status, NOW), action, {}, NOW)
+    assert updates["status"] == expected
+    assert updates["status_changed_at"] == NOW
+
+def test_assign_schedules_fifteen_minutes_out():
+    updates = plan_transition(booking("Pending Approval"), "assign", {"doctor_id": "d1", "doctor_name": "Dr. Nkosi"}, NOW)
+    assert updates["scheduled_at"] == datetime(2025, 3, 14, 10, 15).astimezone()
+    assert updates["time"] == "10:15"
+    assert updates["doctor_name"] == "Dr. Nkosi"
+
+def test_cancel_clears_the_schedule():
+    updates = plan_transition(booking("Booked", NOW), "cancel", {}, NOW)
+    assert updates["scheduled_at"] is None
+    assert updates["time"] == "--:--"
+
+def test_delete_is_allowed_from_any_status():
+    for status in ACTIVE_STATUSES + ["Cancelled", "Done"]:
+        assert plan_transition(booking(status), "delete", {}, NOW) == {}
+
+@pytest.mark.parametrize("action, status", [
+    ("assign", "Done"),
+    ("complete", "Cancelled"),
+    ("delay", "Pending Approval"),
+    ("delay", "Emergency En Route"),
+    ("cancel", "Done"),
+    ("teleport", "Booked"),
+])
+def test_invalid_transitions(action, status):
+    with pytest.raises(InvalidTransition):
+        plan_transition(booking(status, NOW), action, {}, NOW)
+
+def test_delay_adds_minutes():
+    updates = plan_transition(booking("Booked", NOW), "delay", {"minutes": 20}, NOW)
+    assert updates["status"] == "Delayed"
+    assert updates["scheduled_at"] == datetime(2025, 3, 14, 10, 20).astimezone()
+    assert updates["time"] == "10:20"
+
+def test_delay_defaults_to_fifteen_minutes():
+    updates = plan_transition(booking("Booked", NOW), "delay", {}, NOW)
+    assert updates["time"] == "10:15"
+
+def test_delay_past_midnight_lands_on_the_next_day():
+    late = datetime(2025, 3, 14, 23, 50).astimezone()
+    updates = plan_transition(booking("Booked", late), "delay", {"minutes": 15}, NOW)
+    assert updates["scheduled_at"] == datetime(2025, 3, 15, 0, 5).astimezone()
+    assert updates["time"] == "00:05"
+
+def test_delay_reads_legacy_clock_strings():
+    legacy = {"status": "Booked", "time": "09:30", "created_at": "2025-03-14T08:00:00"}
+    updates = plan_transition(legacy, "delay", {"minutes": "45"}, NOW)
+    assert updates["scheduled_at"] == datetime(2025, 3, 14, 10, 15).astimezone()
+
+def test_delay_without_a_scheduled_time_is_rejected():
+    with pytest.raises(InvalidTransition):
+        plan_transition(booking("Booked"), "delay", {"minutes": 15}, NOW)
+
+@pytest.mark.parametrize("minutes", ["soon", "15.5", "", True, 0, -10, MAX_DELAY_MINUTES + 1, [15]])
+def test_bad_delay_minutes_are_rejected(minutes):
+    with pytest.raises(InvalidTransition):
+        plan_transition(booking("Booked", NOW), "delay", {"minutes": minutes}, NOW)
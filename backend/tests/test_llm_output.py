@@ -0,0 +1,66 @@
+import json
+import pytest
+from app.services.llm_output import parse_structured, coerce_object, unwrap_object, repair_json, TRIAGE_SCHEMA, INSIGHT_SCHEMA
+
+def triage(**fields):
+    return parse_structured("test", json.dumps({"reply_message": "Hi", **fields}), TRIAGE_SCHEMA)
+
+def test_exact_choices_keep_output_casing():
+    result = triage(category="urgent", color_code="RED")
+    assert result["category"] == "Urgent"
+    assert result["color_code"] == "red"
+
+def test_negated_category_is_not_flipped():
+    assert triage(category="Non-urgent")["category"] == "Routine"
+    assert triage(category="not urgent")["category"] == "Routine"
+    # Ambiguous negation: dropped rather than guessed
+    assert triage(category="Not an emergency")["category"] is None
+
+def test_choice_inside_longer_text_is_dropped():
+    assert triage(category="Urgent but could be Emergency")["category"] is None
+    assert triage(color_code="not red")["color_code"] is None
+
+def test_synonyms():
+    assert triage(color_code="Amber")["color_code"] == "orange"
+    result, _ = coerce_object({"type": "warn", "text": "Queue is long"}, INSIGHT_SCHEMA)
+    assert result["type"] == "warning"
+
+def test_unwrap_keeps_object_with_aliased_keys():
+    data = {"reply": "Please come in", "meta": {"model": "x"}}
+    assert unwrap_object(data, TRIAGE_SCHEMA) is data
+    assert triage_from(data)["reply_message"] == "Please come in"
+
+def test_unwrap_nested_response():
+    data = {"response": {"reply_message": "Hi", "show_booking": True}}
+    assert unwrap_object(data, TRIAGE_SCHEMA) == data["response"]
+
+def triage_from(data):
+    return parse_structured("test", json.dumps(data), TRIAGE_SCHEMA)
+
+@pytest.mark.parametrize("reply, expected", [
+    # Cut off by max_tokens
+    ('{"reply_message": "Hi", "show_booking": ', {"reply_message": "Hi"}),
+    ('{"reply_message": "Hi", "show_booking": fal', {"reply_message": "Hi"}),
+    ('{"a": ', {}),
+    ('{"a": 1, "b', {"a": 1}),
+    ('{"a": 1,', {"a": 1}),
+    ('{"reply_message": "Please come in, we', {"reply_message": "Please come in, we"}),
+    ('{"insights": [{"type": "info"}, {"ty', {"insights": [{"type": "info"}, {}]}),
+    ('["a", "b', ["a", "b"]),
+    # Formatting noise
+    ('```json\n{"a": 1}\n```', {"a": 1}),
+    ('{"a": [1, 2,], "b": 3,}', {"a": [1, 2], "b": 3}),
+    ('Sure! Here you go: {"a": 1}', {"a": 1}),
+    ('{"a": {"b": 1}} see note }', {"a": {"b": 1}}),
+    ('{"a": "b}"} and then } more', {"a": "b}"}),
+])
+def test_repair_json(reply, expected):
+    assert repair_json(reply) == expected
+
+def test_truncated_triage_reply_is_repaired_without_a_reask():
+    def reask(hint):
+        raise AssertionError("should have been repaired locally")
+    content = '{"reply_message": "Please come to the clinic today.", "show_booking": true, "color_code": "oran'
+    result = parse_structured("test", content, TRIAGE_SCHEMA, reask=reask)
+    assert result["reply_message"] == "Please come to the clinic today."
+    assert result["show_booking"] is True
@@ -0,0 +1,42 @@
+import pytest
+from app.services import profiler
+
+def fetch(x):
+    return x * 2
+
+def helper_ref(x):
+    return x
+
+def stream_rows():
+    yield 1
+
+def make_namespace() -> dict:
+    return {"__name__": __name__, "fetch": fetch, "helper_ref": helper_ref, "stream_rows": stream_rows}
+
+def test_only_listed_functions_are_traced():
+    namespace = make_namespace()
+    profiler.instrument_module(namespace, "test", ["fetch"])
+    assert namespace["fetch"] is not fetch
+    assert namespace["helper_ref"] is helper_ref
+
+    trace, token = profiler.start_trace("GET", "/x")
+    try:
+        assert namespace["fetch"](2) == 4
+        namespace["helper_ref"](1)
+    finally:
+        profiler._current_trace.reset(token)
+    assert [span["name"] for span in trace.spans] == ["test.fetch"]
+
+def test_unknown_or_generator_names_are_rejected():
+    with pytest.raises(ValueError):
+        profiler.instrument_module(make_namespace(), "test", ["missing"])
+    with pytest.raises(ValueError):
+        profiler.instrument_module(make_namespace(), "test", ["stream_rows"])
+
+def test_sampling_interval_has_a_floor():
+    before = profiler.get_settings()
+    try:
+        assert profiler.update_settings(interval_ms=1)["interval_ms"] == profiler.MIN_INTERVAL_MS
+        assert profiler.update_settings(interval_ms=20)["interval_ms"] == 20
+    finally:
+        profiler.update_settings(interval_ms=before["interval_ms"])
@@ -0,0 +1,15 @@
+from datetime import datetime
+from app.models.queue import queue_payload
+
+def test_queue_payload_drops_null_fields():
+    [row] = queue_payload([{"id": "b1", "patient_id": "p1", "patient_name": "Thandi", "status": "Booked", "clinic_id": "main"}])
+    assert row == {"id": "b1", "patient_id": "p1", "status": "Booked", "score": "Standard", "urgent": False,
+                   "symptoms": "", "time": "--:--", "patient_name": "Thandi"}
+
+def test_queue_payload_folds_seed_name_and_keeps_set_fields():
+    scheduled = datetime(2025, 3, 14, 10, 0).astimezone()
+    [row] = queue_payload([{"id": "b1", "patient_id": "p1", "name": "Sipho", "status": "Confirmed",
+                            "scheduled_at": scheduled, "doctor_id": "d1", "doctor_name": "Dr. Zulu"}])
+    assert row["patient_name"] == "Sipho" and "name" not in row
+    assert row["scheduled_at"] == scheduled.isoformat()
+    assert (row["doctor_id"], row["doctor_name"]) == ("d1", "Dr. Zulu")
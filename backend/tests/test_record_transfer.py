@@ -0,0 +1,62 @@
+import csv
+import io
+import json
+from datetime import datetime
+from app.models.records import ImportRecordRow
+from app.services.record_rows import EXPORT_FIELDS, RowDecoder, import_record_data, csv_row, export_row
+
+STORED = {
+    "id": "rec_1",
+    "patient_id": "p1",
+    "patient_name": "Asha Rao",
+    "date": "2025-03-14",
+    "created_at": "2025-03-14T10:00:00",
+    "doctor": "Dr. Mehta",
+    "diagnosis": "Hypertension",
+    "meds": ["Amlodipine 5mg (Daily)", "Paracetamol 500mg (PRN)"],
+    "notes": "Review in 4 weeks",
+    "type": "Consultation",
+}
+
+def reimport(fmt: str, body: bytes) -> dict:
+    decoder = RowDecoder(fmt)
+    rows = decoder.feed(body) + decoder.close()
+    assert len(rows) == 1
+    _, row, error = rows[0]
+    assert error is None
+    return import_record_data(ImportRecordRow(**row), now=datetime(2025, 6, 1))
+
+def assert_same_record(data: dict):
+    for field in ["patient_id", "patient_name", "date", "created_at", "doctor", "diagnosis", "meds", "notes", "type"]:
+        assert data[field] == STORED[field], field
+
+def test_ndjson_export_reimports():
+    body = (json.dumps(export_row(STORED)) + "\n").encode()
+    assert_same_record(reimport("ndjson", body))
+
+def test_csv_export_reimports():
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+    writer.writeheader()
+    writer.writerow(csv_row(STORED))
+    assert_same_record(reimport("csv", buffer.getvalue().encode()))
+
+def test_doctor_name_wins_over_doctor():
+    row = {**export_row(STORED), "doctor_name": "Dr. Iyer"}
+    assert ImportRecordRow(**row).doctor_name == "Dr. Iyer"
+
+def test_backlog_rows_sort_by_their_visit_date():
+    row = {k: v for k, v in export_row(STORED).items() if k != "created_at"}
+    data = import_record_data(ImportRecordRow(**{**row, "date": "2018-02-03"}), now=datetime(2025, 6, 1))
+    assert data["created_at"] == "2018-02-03T00:00:00"
+
+def test_unparseable_created_at_falls_back_to_the_date():
+    row = {**export_row(STORED), "created_at": "last tuesday"}
+    data = import_record_data(ImportRecordRow(**row), now=datetime(2025, 6, 1))
+    assert data["created_at"] == "2025-03-14T00:00:00"
+
+def test_undated_rows_are_stamped_with_the_import_time():
+    row = {**export_row(STORED), "created_at": "", "date": ""}
+    data = import_record_data(ImportRecordRow(**row), now=datetime(2025, 6, 1, 9, 30))
+    assert data["created_at"] == "2025-06-01T09:30:00"
+    assert data["date"] == "2025-06-01"
@@ -0,0 +1,28 @@
+import pytest
+from app.services.triage_cache import TriageCache, embed, needs_model, normalize
+
+def opening(message: str) -> str:
+    return normalize(f"user: {message}")
+
+@pytest.mark.parametrize("message", [
+    "my baby has a fever of 40",
+    "my child has a fever and a rash",
+    "I've had a headache for 3 days",
+    "I've had a headache for three days",
+    "temperature is 39.5",
+    "chest feels tight",
+])
+def test_openings_that_always_go_to_the_model(message):
+    assert needs_model(opening(message))
+
+@pytest.mark.parametrize("message", ["Hello", "I have a headache", "my throat is sore"])
+def test_plain_openings_can_use_the_cache(message):
+    assert not needs_model(opening(message))
+
+def test_similar_opening_hits_only_within_its_partition():
+    cache = TriageCache(capacity=8)
+    reply = {"reply_message": "Sorry to hear that", "urgency_score": 3}
+    cache.store("v1|adult|", embed(opening("I have a headache")), reply)
+    assert cache.lookup("v1|adult|", embed(opening("i have a headache"))) == reply
+    assert cache.lookup("v1|child|", embed(opening("I have a headache"))) is None
+    assert cache.lookup("v1|adult|", embed(opening("my knee is swollen"))) is None
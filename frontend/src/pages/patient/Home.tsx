@@ -1,5 +1,5 @@
 import { Link, useNavigate } from 'react-router-dom';
-import { useRef } from 'react';
+import { useEffect, useRef, useState } from 'react';
 import { 
   Activity, Clock, Bot, MapPin, AlertTriangle, UserRound, CalendarClock, 
   Hourglass, Trash2, ChevronRight, ChevronLeft, ArrowRight, XCircle, LogOut, FileText, Sparkles, HeartPulse, BrainCircuit
@@ -29,19 +29,13 @@ export function MetaIcon({ size = 20, className = "" }) {
   );
 }
 
-// --- FETCHERS ---
-const fetchCarePath = async () => {
-  const response = await api.get('/navigator/status/demo_user');
-  return response.data;
-};
+// How long to show the loader while the server reports the Health Pulse as pending
+const PULSE_DEADLINE_MS = 20000;
 
-const fetchRecentRecord = async () => {
-  const response = await api.get('/records/list/demo_user');
-  return response.data && response.data.length > 0 ? response.data[0] : null;
-};
-
-const fetchHealthPulse = async () => {
-  const response = await api.get('/records/ai-summary/demo_user');
+// --- FETCHERS ---
+// One call for journey, records and Health Pulse (see backend /home/bundle)
+const fetchHomeBundle = async () => {
+  const response = await api.get('/home/bundle/demo_user');
   return response.data;
 };
 
@@ -56,35 +50,39 @@ export default function PatientHome() {
     navigate('/login');
   };
 
-  const { data: appointments, isLoading } = useQuery({
-    queryKey: ['carePath'],
-    queryFn: fetchCarePath,
+  const { data: bundle, isLoading, isError } = useQuery({
+    queryKey: ['homeBundle'],
+    queryFn: fetchHomeBundle,
     refetchInterval: 3000, 
   });
 
-  const { data: latestRecord } = useQuery({
-    queryKey: ['latestRecord'],
-    queryFn: fetchRecentRecord,
-    refetchInterval: 5000,
-  });
+  const appointments = bundle?.journey;
+  const latestRecord = bundle?.records?.length > 0 ? bundle.records[0] : null;
+  const aiPulse = bundle?.health_pulse;
 
-  const { data: aiPulse, isLoading: loadingAi } = useQuery({
-    queryKey: ['aiPulse'],
-    queryFn: fetchHealthPulse,
-  });
+  // The Health Pulse may still be generating on the server; keep the loader up for a
+  // while, then fall back instead of spinning forever
+  const pulsePending = !!bundle?.pending?.includes('health_pulse');
+  const [pendingSince, setPendingSince] = useState<number | null>(null);
+  useEffect(() => {
+    setPendingSince((since) => (pulsePending ? (since ?? Date.now()) : null));
+  }, [pulsePending]);
+  const pulseTimedOut = pendingSince !== null && Date.now() - pendingSince > PULSE_DEADLINE_MS;
+  const pulseUnavailable = !aiPulse && (isError || !!bundle?.failed?.includes('health_pulse') || pulseTimedOut);
+  const loadingAi = isLoading || (!aiPulse && !pulseUnavailable);
 
   const cancelMutation = useMutation({
     mutationFn: async (docId: string) => {
       await api.post('/booking/update', { doc_id: docId, action: "cancel" });
     },
-    onSuccess: () => queryClient.invalidateQueries({ queryKey: ['carePath'] })
+    onSuccess: () => queryClient.invalidateQueries({ queryKey: ['homeBundle'] })
   });
 
   const deleteMutation = useMutation({
     mutationFn: async (docId: string) => {
       await api.post('/booking/update', { doc_id: docId, action: "delete" });
     },
-    onSuccess: () => queryClient.invalidateQueries({ queryKey: ['carePath'] })
+    onSuccess: () => queryClient.invalidateQueries({ queryKey: ['homeBundle'] })
   });
 
   const scroll = (direction: 'left' | 'right') => {
@@ -275,6 +273,16 @@ export default function PatientHome() {
 
         {loadingAi ? (
           <ServerStatus />
+        ) : pulseUnavailable ? (
+          <div className="bg-white p-5 rounded-xl border shadow-sm flex items-start gap-3">
+            <div className="bg-slate-50 p-2 rounded-full">
+              <HeartPulse className="w-5 h-5 text-slate-400" />
+            </div>
+            <div>
+              <p className="text-sm font-medium text-slate-700">Health Pulse unavailable right now</p>
+              <p className="text-xs text-slate-500">We'll try again shortly. Your records are still up to date below.</p>
+            </div>
+          </div>
         ) : (
           <div className="bg-gradient-to-br from-indigo-600 to-violet-600 p-5 rounded-xl shadow-lg text-white relative overflow-hidden">
             <div className="absolute top-0 right-0 w-32 h-32 bg-white/10 rounded-full blur-2xl -mr-10 -mt-10" />
@@ -12,7 +12,7 @@ export interface Patient {
   
   // Triage Data
   score: string | number; // e.g. "High (8/10)" or 8
-  status: 'Waiting' | 'Pending Approval' | 'Confirmed' | 'Cancelled' | 'Delayed' | 'Emergency En Route' | 'Waiting for Doctor' | 'In Review' | string;
+  status: 'Waiting' | 'Pending Approval' | 'Confirmed' | 'Cancelled' | 'Done' | 'Delayed' | 'Emergency En Route' | 'Waiting for Doctor' | 'In Review' | string;
   urgent: boolean;
   symptoms: string;
   